@@ -0,0 +1,180 @@
+# bench/generate_trips.py
+"""
+Générateur de fichiers yellow_tripdata synthétiques mais réalistes, pour mesurer
+l'ingestion sans téléchargement : même schéma et mêmes types que les fichiers
+TLC, distributions plausibles (heures de pointe, zones populaires, montants
+cohérents avec la distance), lignes dupliquées, lignes à colonnes NULL
+(payment_type 0, comme dans les vrais fichiers) et dérive de schéma
+(cbd_congestion_fee à partir de janvier 2025).
+
+Usage :
+    python bench/generate_trips.py --months 2024-12,2025-01 --rows 500000 --out /tmp/nyc_bench
+"""
+import argparse
+import calendar
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Première période avec la colonne cbd_congestion_fee (péage urbain de Manhattan)
+CBD_FEE_FROM = (2025, 1)
+ZONE_COUNT = 265
+AIRPORT_ZONES = [1, 132, 138]
+# Profil horaire des prises en charge (creux à 5h, pointe en fin de journée)
+HOURLY_PROFILE = np.array([
+    3.0, 2.1, 1.5, 1.0, 0.7, 0.6, 1.2, 2.4, 3.4, 3.7, 3.8, 4.0,
+    4.3, 4.4, 4.7, 4.9, 5.0, 5.6, 6.2, 5.9, 5.3, 5.1, 4.6, 3.8,
+])
+ROW_GROUP_ROWS = 1_000_000
+
+# Schéma des fichiers TLC yellow 2024 (+ cbd_congestion_fee en 2025)
+BASE_SCHEMA = [
+    ("VendorID", pa.int32()),
+    ("tpep_pickup_datetime", pa.timestamp("us")),
+    ("tpep_dropoff_datetime", pa.timestamp("us")),
+    ("passenger_count", pa.int64()),
+    ("trip_distance", pa.float64()),
+    ("RatecodeID", pa.int64()),
+    ("store_and_fwd_flag", pa.string()),
+    ("PULocationID", pa.int32()),
+    ("DOLocationID", pa.int32()),
+    ("payment_type", pa.int64()),
+    ("fare_amount", pa.float64()),
+    ("extra", pa.float64()),
+    ("mta_tax", pa.float64()),
+    ("tip_amount", pa.float64()),
+    ("tolls_amount", pa.float64()),
+    ("improvement_surcharge", pa.float64()),
+    ("total_amount", pa.float64()),
+    ("congestion_surcharge", pa.float64()),
+    ("Airport_fee", pa.float64()),
+]
+CBD_FIELD = ("cbd_congestion_fee", pa.float64())
+
+
+def month_schema(year: int, month: int) -> pa.Schema:
+    fields = list(BASE_SCHEMA)
+    if (year, month) >= CBD_FEE_FROM:
+        fields.append(CBD_FIELD)
+    return pa.schema(fields)
+
+
+def zone_weights(rng: np.random.Generator) -> np.ndarray:
+    """Popularité des zones en loi de puissance (quelques zones concentrent l'essentiel des courses)."""
+    weights = 1.0 / np.arange(1, ZONE_COUNT + 1) ** 1.1
+    return rng.permutation(weights) / weights.sum()
+
+
+def generate_month(year: int, month: int, rows: int, duplicate_rate: float = 0.01,
+                   null_rate: float = 0.01, seed: int = 0) -> pa.Table:
+    """Table Arrow d'un mois : `rows` courses distinctes + duplicate_rate de doublons exacts."""
+    rng = np.random.default_rng([seed, year, month])
+    zones = zone_weights(np.random.default_rng(seed))
+
+    # Horodatages : jour uniforme, heure selon le profil, seconde uniforme
+    days = calendar.monthrange(year, month)[1]
+    start = np.datetime64(f"{year:04d}-{month:02d}-01T00:00:00", "us")
+    hours = rng.choice(24, size=rows, p=HOURLY_PROFILE / HOURLY_PROFILE.sum())
+    offsets = (rng.integers(0, days, rows) * 86_400 + hours * 3_600 + rng.integers(0, 3_600, rows)) * 1_000_000
+    pickup = start + offsets.astype("timedelta64[us]")
+
+    distance = np.round(np.clip(rng.lognormal(0.6, 0.9, rows), 0, 200), 2)
+    distance[rng.random(rows) < 0.01] = 0.0
+    speed_mph = np.clip(rng.lognormal(2.4, 0.35, rows), 2, 45)
+    duration_s = np.clip(distance / speed_mph * 3_600 + rng.normal(120, 60, rows), 30, 6 * 3_600)
+    dropoff = pickup + (duration_s * 1_000_000).astype("timedelta64[us]")
+
+    pu = rng.choice(ZONE_COUNT, size=rows, p=zones) + 1
+    do = rng.choice(ZONE_COUNT, size=rows, p=zones) + 1
+    payment = rng.choice([1, 2, 3, 4], size=rows, p=[0.75, 0.2, 0.02, 0.03])
+    ratecode = rng.choice([1, 2, 3, 4, 5, 99], size=rows, p=[0.94, 0.035, 0.005, 0.005, 0.01, 0.005])
+
+    fare = np.round(3.0 + 2.5 * distance + 0.7 * duration_s / 60, 2)
+    extra = rng.choice([0.0, 1.0, 2.5, 5.0], size=rows, p=[0.4, 0.3, 0.2, 0.1])
+    tolls = np.where(rng.random(rows) < 0.05, 6.94, 0.0)
+    tip = np.where(payment == 1, np.round(fare * rng.uniform(0.1, 0.3, rows), 2), 0.0)
+    congestion = np.where(rng.random(rows) < 0.8, 2.5, 0.0)
+    airport = np.where(np.isin(pu, AIRPORT_ZONES), 1.75, 0.0)
+    total = fare + extra + 0.5 + tip + tolls + 1.0 + congestion + airport
+
+    columns = {
+        "VendorID": rng.choice([1, 2, 6, 7], size=rows, p=[0.26, 0.73, 0.005, 0.005]),
+        "tpep_pickup_datetime": pickup,
+        "tpep_dropoff_datetime": dropoff,
+        "passenger_count": rng.choice([0, 1, 2, 3, 4, 5, 6], size=rows,
+                                      p=[0.01, 0.72, 0.15, 0.05, 0.03, 0.02, 0.02]),
+        "trip_distance": distance,
+        "RatecodeID": ratecode,
+        "store_and_fwd_flag": np.where(rng.random(rows) < 0.005, "Y", "N"),
+        "PULocationID": pu,
+        "DOLocationID": do,
+        "payment_type": payment,
+        "fare_amount": fare,
+        "extra": extra,
+        "mta_tax": np.full(rows, 0.5),
+        "tip_amount": tip,
+        "tolls_amount": tolls,
+        "improvement_surcharge": np.full(rows, 1.0),
+        "total_amount": np.round(total, 2),
+        "congestion_surcharge": congestion,
+        "Airport_fee": airport,
+    }
+    schema = month_schema(year, month)
+    if CBD_FIELD[0] in schema.names:
+        cbd = np.where(rng.random(rows) < 0.4, 0.75, 0.0)
+        columns[CBD_FIELD[0]] = cbd
+        columns["total_amount"] = np.round(columns["total_amount"] + cbd, 2)
+
+    # Remboursements : montants négatifs (rejetés par le staging)
+    refunds = rng.random(rows) < 0.005
+    for name in ("fare_amount", "extra", "mta_tax", "tip_amount", "improvement_surcharge", "total_amount"):
+        columns[name] = np.where(refunds, -columns[name], columns[name])
+
+    # Lignes sans informations de course (payment_type 0 et colonnes NULL, comme les fichiers TLC)
+    missing = rng.random(rows) < null_rate
+    columns["payment_type"] = np.where(missing, 0, columns["payment_type"])
+    arrays = []
+    for name, arrow_type in zip(schema.names, schema.types):
+        nullable = name in ("passenger_count", "RatecodeID", "store_and_fwd_flag",
+                            "congestion_surcharge", "Airport_fee")
+        arrays.append(pa.array(columns[name], arrow_type, mask=missing if nullable else None))
+    table = pa.Table.from_arrays(arrays, schema=schema)
+
+    # Doublons exacts, mélangés aux autres lignes
+    duplicates = int(rows * duplicate_rate)
+    if duplicates:
+        table = pa.concat_tables([table, table.take(rng.choice(rows, size=duplicates, replace=False))])
+        table = table.take(rng.permutation(table.num_rows))
+    return table
+
+
+def write_month(out_dir: Path, year: int, month: int, rows: int, duplicate_rate: float = 0.01,
+                null_rate: float = 0.01, seed: int = 0) -> Path:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"yellow_tripdata_{year:04d}-{month:02d}.parquet"
+    table = generate_month(year, month, rows, duplicate_rate, null_rate, seed)
+    pq.write_table(table, path, row_group_size=ROW_GROUP_ROWS, compression="zstd")
+    return path
+
+
+def parse_months(value: str) -> list:
+    """'2024-12,2025-01' -> [(2024, 12), (2025, 1)]"""
+    return [tuple(int(part) for part in item.strip().split("-")) for item in value.split(",") if item.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fichiers yellow_tripdata synthétiques")
+    parser.add_argument("--months", default="2024-12,2025-01", help="Mois générés, ex. 2024-12,2025-01")
+    parser.add_argument("--rows", type=int, default=500_000, help="Courses distinctes par mois")
+    parser.add_argument("--dup-rate", type=float, default=0.01, help="Part de doublons exacts ajoutés")
+    parser.add_argument("--null-rate", type=float, default=0.01, help="Part de lignes à colonnes NULL")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=Path("bench/data"), help="Dossier de sortie")
+    args = parser.parse_args()
+
+    for year, month in parse_months(args.months):
+        path = write_month(args.out, year, month, args.rows, args.dup_rate, args.null_rate, args.seed)
+        print(f"✅ {path} ({pq.ParquetFile(path).metadata.num_rows} lignes)")
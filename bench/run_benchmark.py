@@ -0,0 +1,267 @@
+# bench/run_benchmark.py
+"""
+Benchmark de l'ingestion (merge_dynamic.process_parquet_files) sur des fichiers
+synthétiques (generate_trips.py) et le backend DuckDB embarqué (load/backends.py) :
+durée par étape (spans de load/telemetry.py : lecture, dédoublonnage, synchro de
+schéma, upload, MERGE, contrôles post-ingestion), lignes/s et pic mémoire. Chaque mode tourne dans un
+processus neuf (pic mémoire propre) ; les résultats sont ajoutés à
+bench/results/benchmarks.jsonl pour comparaison entre versions.
+
+Usage :
+    python bench/run_benchmark.py --rows 500000 --months 2024-12,2025-01
+    python bench/run_benchmark.py --modes pandas,stream --compare --threshold 0.2
+    python bench/run_benchmark.py --compare --baseline a1b2c3d --fail-on-regression
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "load"))
+
+from generate_trips import parse_months, write_month
+
+SCHEMA = "RAW"
+RESULTS_FILE = Path(__file__).parent / "results" / "benchmarks.jsonl"
+DATA_CACHE_DIR = Path(__file__).parent / "data"
+STAGES = ["read", "dedup", "schema_sync", "upload", "merge", "post_checks"]
+# Modes d'ingestion mesurés -> arguments de process_parquet_files
+MODES = {
+    "pandas": {},
+    "stream": {"stream": True},
+    "stage": {"backend": "stage"},
+    "parallel": {"workers": 2},
+    # pandas + projection des colonnes sur le projet dbt (load/projection.py)
+    "projected": {"projected": True},
+}
+# En dessous de cette durée (s), un écart n'est pas significatif
+NOISE_FLOOR_SECONDS = 0.05
+
+
+def run_mode(mode: str, data_dir: Path, verbose: bool = False) -> dict:
+    """Une ingestion complète de data_dir dans une base DuckDB neuve (exécuté dans un processus dédié)."""
+    import merge_dynamic as md
+    from backends import DuckDBBackend, set_backend
+    from dq_stats import DQStatsStore, reconcile_query
+    from dedup import FingerprintIndex
+    from snowflake_utils import close_pool, configure_pool, execute_sql
+    from telemetry import peak_rss_mb, span, start_run
+
+    work_dir = Path(tempfile.mkdtemp(prefix="nyc_taxi_bench_"))
+    # Schéma de session RAW quel que soit le .env
+    set_backend(DuckDBBackend(path=":memory:", schema=SCHEMA))
+    configure_pool(max_size=4)
+    md.LOG_DIR = work_dir
+    telemetry = start_run("bench", out_dir=work_dir)
+    options = dict(MODES[mode])
+    if options.pop("projected", False):
+        options["projection"] = md.projection_plan()
+
+    files = sorted(Path(data_dir).glob("*.parquet"))
+    rows = sum(pq.ParquetFile(f).metadata.num_rows for f in files)
+    dq_store = DQStatsStore(work_dir / "dq_stats.json")
+    output = sys.stdout if verbose else open(os.devnull, "w")
+
+    start = time.perf_counter()
+    with redirect_stdout(output):
+        md.process_parquet_files(data_dir=data_dir, dedup_index=FingerprintIndex(work_dir / "dedup_index"),
+                                 dq_store=dq_store, **options)
+        # Mode parallel : seules les tables buffer par worker ont été créées
+        execute_sql(f"CREATE TABLE IF NOT EXISTS RAW.{md.TABLE_BUFFER} AS "
+                    f"SELECT * FROM RAW.{md.TABLE_FINAL} LIMIT 0")
+        with span("post_checks"):
+            md.post_ingestion_stats(dq_store, f"RAW.{md.TABLE_FINAL}")
+            execute_sql(reconcile_query(f"RAW.{md.TABLE_FINAL}", f"RAW.{md.TABLE_BUFFER}"))
+    wall = time.perf_counter() - start
+    loaded = execute_sql(f"SELECT COUNT(*) FROM RAW.{md.TABLE_FINAL}")[0][0]
+    close_pool()
+
+    # Durées par étape : spans de télémétrie du pipeline (workers compris en mode parallel)
+    measured = telemetry.by_stage()
+    stages = {}
+    for stage in STAGES:
+        entry = measured.get(stage)
+        if entry is None:
+            continue
+        stages[stage] = {
+            "seconds": round(entry["seconds"], 4),
+            "calls": entry["calls"],
+            "bytes": entry["bytes"],
+            "rows_per_sec": round(rows / entry["seconds"]) if entry["seconds"] else None,
+        }
+    return {
+        "mode": mode,
+        "files": len(files),
+        "rows_source": rows,
+        "rows_loaded": int(loaded),
+        "wall_seconds": round(wall, 4),
+        "rows_per_sec": round(rows / wall) if wall else None,
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+        "arrow_peak_mb": round(pa.default_memory_pool().max_memory() / 1024 / 1024, 1),
+    }
+
+
+def prepare_data(args) -> Path:
+    """Fichiers synthétiques du scénario, générés une fois puis réutilisés (cache par paramètres)."""
+    if args.data_dir:
+        return args.data_dir
+    key = f"rows{args.rows}_dup{args.dup_rate}_null{args.null_rate}_seed{args.seed}"
+    data_dir = DATA_CACHE_DIR / key
+    for year, month in parse_months(args.months):
+        path = data_dir / f"yellow_tripdata_{year:04d}-{month:02d}.parquet"
+        if not path.exists():
+            write_month(data_dir, year, month, args.rows, args.dup_rate, args.null_rate, args.seed)
+            print(f"🧪 {path.name} généré ({args.rows} lignes)")
+    # Seuls les mois du scénario sont ingérés
+    wanted = {f"yellow_tripdata_{y:04d}-{m:02d}.parquet" for y, m in parse_months(args.months)}
+    scenario_dir = Path(tempfile.mkdtemp(prefix="nyc_taxi_bench_data_"))
+    for path in data_dir.glob("*.parquet"):
+        if path.name in wanted:
+            os.symlink(path.resolve(), scenario_dir / path.name)
+    return scenario_dir
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def scenario_of(args) -> dict:
+    if args.data_dir:
+        return {"data_dir": str(args.data_dir)}
+    return {"months": args.months, "rows": args.rows, "dup_rate": args.dup_rate,
+            "null_rate": args.null_rate, "seed": args.seed}
+
+
+def load_results(path: Path = RESULTS_FILE) -> list:
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_results(results: list, path: Path = RESULTS_FILE):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result, sort_keys=True) + "\n")
+
+
+def find_baseline(history: list, result: dict, commit: str = None) -> dict:
+    """Dernier résultat antérieur du même scénario et du même mode (d'un commit donné si précisé)."""
+    candidates = [
+        r for r in history
+        if r["scenario"] == result["scenario"] and r["mode"] == result["mode"]
+        and r["run_id"] != result["run_id"] and (commit is None or r.get("commit") == commit)
+    ]
+    return candidates[-1] if candidates else None
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list:
+    """Affiche les écarts avec la référence ; renvoie les régressions [(mesure, avant, après)]."""
+    rows = [("wall", baseline["wall_seconds"], result["wall_seconds"])]
+    for stage in STAGES:
+        if stage in result["stages"] and stage in baseline["stages"]:
+            rows.append((stage, baseline["stages"][stage]["seconds"], result["stages"][stage]["seconds"]))
+
+    regressions = []
+    print(f"   vs {baseline.get('commit') or '?'} ({baseline['timestamp']})")
+    for name, before, after in rows:
+        delta = (after - before) / before if before else 0.0
+        regressed = after > before * (1 + threshold) and after - before > NOISE_FLOOR_SECONDS
+        flag = " ⚠️" if regressed else ""
+        print(f"   {name:<12} {before:>9.3f}s -> {after:>9.3f}s  {delta:+.1%}{flag}")
+        if regressed:
+            regressions.append((name, before, after))
+    return regressions
+
+
+def print_result(result: dict):
+    print(f"\n⏱️ {result['mode']} : {result['rows_source']} lignes en {result['wall_seconds']:.2f}s "
+          f"({result['rows_per_sec']} lignes/s), {result['rows_loaded']} chargées, "
+          f"pic RSS {result['peak_rss_mb']} Mo, pic Arrow {result['arrow_peak_mb']} Mo")
+    for stage, entry in result["stages"].items():
+        volume = f", {entry['bytes'] / 1024 / 1024:.1f} Mo" if entry.get("bytes") else ""
+        print(f"   {stage:<12} {entry['seconds']:>9.3f}s  {entry['rows_per_sec'] or '-':>10} lignes/s"
+              f"  ({entry['calls']} appel(s){volume})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de l'ingestion sur le backend DuckDB")
+    parser.add_argument("--months", default="2024-12,2025-01",
+                        help="Mois générés (la dérive de schéma cbd_congestion_fee apparaît en 2025-01)")
+    parser.add_argument("--rows", type=int, default=200_000, help="Courses distinctes par mois")
+    parser.add_argument("--dup-rate", type=float, default=0.02)
+    parser.add_argument("--null-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", type=Path, default=None,
+                        help="Fichiers parquet existants à la place des fichiers synthétiques")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"Modes mesurés parmi {', '.join(MODES)}")
+    parser.add_argument("--results", type=Path, default=RESULTS_FILE, help="Historique JSONL des résultats")
+    parser.add_argument("--compare", action="store_true", help="Compare avec le dernier résultat du même scénario")
+    parser.add_argument("--baseline", default=None, help="Commit de référence pour --compare")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Régression au-delà de +20 %% par défaut")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Code retour 1 si régression")
+    parser.add_argument("--verbose", action="store_true", help="Affiche la sortie du pipeline")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"modes inconnus : {', '.join(unknown)}")
+
+    data_dir = prepare_data(args)
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    common = {
+        "run_id": run_id,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "scenario": scenario_of(args),
+    }
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for mode in modes:
+        # Processus neuf par mode : base, imports et pic mémoire indépendants
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = {**common, **pool.submit(run_mode, mode, data_dir, args.verbose).result()}
+        print_result(result)
+        results.append(result)
+
+    history = load_results(args.results)
+    append_results(results, args.results)
+    print(f"\n📊 {len(results)} résultat(s) ajouté(s) à {args.results}")
+
+    regressions = []
+    if args.compare:
+        for result in results:
+            baseline = find_baseline(history, result, args.baseline)
+            print(f"\n🔁 {result['mode']}")
+            if baseline is None:
+                print("   aucune référence pour ce scénario")
+                continue
+            regressions += compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"\n⚠️ {len(regressions)} régression(s) au-delà de {args.threshold:.0%}")
+    sys.exit(1 if regressions and args.fail_on_regression else 0)
@@ -0,0 +1,99 @@
+# bench/startup_time.py
+"""
+Temps de démarrage de la commande nyc-taxi (nyc_taxi.py) : chaque invocation
+--help tourne dans un processus Python neuf, plusieurs fois, et la meilleure
+durée est comparée à un budget. Les modules importés sont relevés avec
+`python -X importtime` : une commande légère qui importe pandas, pyarrow ou le
+connecteur Snowflake est signalée même si elle reste sous son budget.
+
+`ingest` importe sa pile de données (pandas, pyarrow) dès le chargement du
+module, --help compris : budget distinct. Le connecteur Snowflake, openpyxl et
+DuckDB ne sont importés qu'au moment où ils servent.
+
+Usage :
+    python bench/startup_time.py
+    python bench/startup_time.py --runs 10 --fail-over-target
+    STARTUP_TARGET_SECONDS=0.3 python bench/startup_time.py --fail-over-target
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+CLI = ROOT / "nyc_taxi.py"
+
+TARGET_SECONDS = float(os.getenv("STARTUP_TARGET_SECONDS", "0.5"))
+INGEST_TARGET_SECONDS = float(os.getenv("STARTUP_INGEST_TARGET_SECONDS", "2.0"))
+HEAVY_MODULES = ["pandas", "pyarrow", "snowflake.connector", "openpyxl", "requests", "duckdb"]
+# Importés à la demande par ingest : jamais pour --help
+INGEST_FORBIDDEN = ["snowflake.connector", "openpyxl", "duckdb", "requests"]
+
+# libellé -> (arguments, budget en secondes, modules interdits)
+INVOCATIONS = {
+    "--help": (["--help"], TARGET_SECONDS, HEAVY_MODULES),
+    "download --help": (["download", "--help"], TARGET_SECONDS, HEAVY_MODULES),
+    "preflight --help": (["preflight", "--help"], TARGET_SECONDS, HEAVY_MODULES),
+    "report --help": (["report", "--help"], TARGET_SECONDS, HEAVY_MODULES),
+    "ingest --help": (["ingest", "--help"], INGEST_TARGET_SECONDS, INGEST_FORBIDDEN),
+}
+
+
+def time_invocation(args: list, runs: int) -> list:
+    """Durées (s) de `runs` lancements dans des processus neufs."""
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(CLI), *args], cwd=ROOT, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=True)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def imported_modules(args: list) -> set:
+    """Modules importés par une invocation (sortie de -X importtime sur stderr)."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", str(CLI), *args], cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    modules = set()
+    for line in completed.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+def forbidden_imports(modules: set, forbidden: list) -> list:
+    return [name for name in forbidden if name in modules]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Temps de démarrage de la commande nyc-taxi")
+    parser.add_argument("--runs", type=int, default=5, help="Lancements par invocation (meilleure durée retenue)")
+    parser.add_argument("--fail-over-target", action="store_true",
+                        help="Code retour 1 si une invocation dépasse son budget ou importe un module interdit")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"⏱️ Démarrage de nyc-taxi ({args.runs} lancement(s), Python {sys.version.split()[0]})")
+    for label, (cli_args, target, forbidden) in INVOCATIONS.items():
+        durations = time_invocation(cli_args, args.runs)
+        best, median = min(durations), statistics.median(durations)
+        heavy = forbidden_imports(imported_modules(cli_args), forbidden)
+        over = best > target
+        flag = " ⚠️" if over or heavy else ""
+        print(f"   {label:<18} {best:>7.3f}s (médiane {median:.3f}s, budget {target:.1f}s){flag}")
+        if heavy:
+            print(f"      modules importés : {', '.join(heavy)}")
+            failures.append((label, f"importe {', '.join(heavy)}"))
+        if over:
+            failures.append((label, f"{best:.3f}s > {target:.1f}s"))
+
+    if failures:
+        print(f"\n⚠️ {len(failures)} dépassement(s) :")
+        for label, reason in failures:
+            print(f"   {label} : {reason}")
+    else:
+        print("\n✅ Toutes les invocations sous leur budget")
+    sys.exit(1 if failures and args.fail_over_target else 0)
@@ -0,0 +1,83 @@
+# checks/incremental_predicates_check.py
+"""
+Checks that the incremental trip models prune their MERGE target.
+
+dbt writes the SQL it executed to target/run/. For every model built with the
+`trip_merge` strategy (macros/incremental_lookback.sql), a MERGE must carry the
+lookback predicate `DBT_INTERNAL_DEST.<date column> >= 'YYYY-MM-DD'`. A first build or
+a full refresh runs a CREATE instead of a MERGE and is skipped.
+
+CLI (after `dbt run`):
+    python checks/incremental_predicates_check.py
+    python checks/incremental_predicates_check.py --project-dir nyc_taxi_dbt_snowflake
+"""
+import argparse
+import re
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parents[1] / "nyc_taxi_dbt_snowflake"
+STRATEGY = "trip_merge"
+DEFAULT_DATE_COLUMN = "trip_date"
+
+_STRATEGY_PATTERN = re.compile(rf"incremental_strategy\s*=\s*['\"]{STRATEGY}['\"]")
+_DATE_COLUMN_PATTERN = re.compile(r"['\"]trip_date_column['\"]\s*:\s*['\"](\w+)['\"]")
+_MERGE_PATTERN = re.compile(r"\bmerge\s+into\b", re.IGNORECASE)
+
+
+def log(msg):
+    print(f"[CHECK] {msg}")
+
+
+def trip_merge_models(project_dir: Path = PROJECT_DIR) -> dict:
+    """{model name: target date column} of the models using the trip_merge strategy."""
+    models = {}
+    for path in sorted((Path(project_dir) / "models").rglob("*.sql")):
+        sql = path.read_text(encoding="utf-8")
+        if _STRATEGY_PATTERN.search(sql):
+            match = _DATE_COLUMN_PATTERN.search(sql)
+            models[path.stem] = match.group(1) if match else DEFAULT_DATE_COLUMN
+    return models
+
+
+def predicate_pattern(date_column: str):
+    return re.compile(rf"DBT_INTERNAL_DEST\.{date_column}\s*>=\s*'\d{{4}}-\d{{2}}-\d{{2}}'", re.IGNORECASE)
+
+
+def check_model(run_sql, date_column: str):
+    """(ok, message) for the SQL executed for one model (None: model not built)."""
+    if run_sql is None:
+        return False, "no executed SQL in target/run (run dbt first)"
+    if not _MERGE_PATTERN.search(run_sql):
+        return True, "no MERGE (first build or full refresh), skipped"
+    match = predicate_pattern(date_column).search(run_sql)
+    if match is None:
+        return False, f"MERGE without the lookback predicate on {date_column}"
+    return True, f"MERGE pruned by {match.group(0)}"
+
+
+def executed_sql(project_dir: Path, model: str):
+    paths = sorted((Path(project_dir) / "target" / "run").rglob(f"{model}.sql"))
+    return paths[0].read_text(encoding="utf-8") if paths else None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Lookback predicate of the incremental trip MERGEs")
+    parser.add_argument("--project-dir", type=Path, default=PROJECT_DIR)
+    args = parser.parse_args(argv)
+
+    models = trip_merge_models(args.project_dir)
+    if not models:
+        log(f"❌ No model uses the {STRATEGY} strategy in {args.project_dir}")
+        return 1
+
+    failures = 0
+    for model, date_column in models.items():
+        ok, message = check_model(executed_sql(args.project_dir, model), date_column)
+        log(f"{'✅' if ok else '❌'} {model}: {message}")
+        failures += not ok
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,13 @@
 # verifications/pre_ingestion_check.py
+import argparse
+import hashlib
+import json
 import os
 import sys
-import snowflake.connector
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
 
 # Récupération des variables sensibles depuis les secrets / env
 SNOWFLAKE_USER = os.getenv("SNOWFLAKE_USER")
@@ -16,12 +22,160 @@ RAW_TABLES = ["BUFFER_YELLOW_TAXI_TRIPS_V2", "YELLOW_TAXI_TRIPS_V2"]
 RAW_SCHEMA = "RAW"
 STAGING_SCHEMA = "STAGING"
 FINAL_SCHEMA = "FINAL"
+SCHEMAS = [RAW_SCHEMA, STAGING_SCHEMA, FINAL_SCHEMA]
+
+# Cache d'un preflight réussi : les jobs CI suivants le sautent pendant PREFLIGHT_CACHE_TTL secondes
+CACHE_FILE = Path(os.getenv("PREFLIGHT_CACHE_FILE", Path(__file__).parent / ".preflight_cache.json"))
+DEFAULT_CACHE_TTL = int(os.getenv("PREFLIGHT_CACHE_TTL", "3600"))
+
 
 def log(msg):
     print(f"[CHECK] {msg}")
 
-def main():
+
+@dataclass
+class CheckResult:
+    name: str
+    ok: bool
+    message: str
+    seconds: float
+    blocking: bool = True
+
+
+# 1️⃣ Requêtes de métadonnées : 3 au lieu de 8, exécutées en parallèle
+def metadata_queries() -> dict:
+    """
+    - catalog    : base (la requête échoue si elle n'existe pas), schémas et tables RAW en une requête
+    - warehouses : SHOW WAREHOUSES (pas d'équivalent INFORMATION_SCHEMA)
+    - grants     : SHOW GRANTS TO ROLE
+    """
+    schemas = ", ".join(f"'{schema}'" for schema in SCHEMAS)
+    tables = ", ".join(f"'{table}'" for table in RAW_TABLES)
+    catalog = f"""
+        SELECT 'SCHEMA' AS KIND, SCHEMA_NAME AS SCHEMA_NAME, NULL AS TABLE_NAME
+        FROM {SNOWFLAKE_DATABASE}.INFORMATION_SCHEMA.SCHEMATA
+        WHERE SCHEMA_NAME IN ({schemas})
+        UNION ALL
+        SELECT 'TABLE', TABLE_SCHEMA, TABLE_NAME
+        FROM {SNOWFLAKE_DATABASE}.INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = '{RAW_SCHEMA}' AND TABLE_NAME IN ({tables})
+    """
+    return {
+        "catalog": catalog,
+        "warehouses": f"SHOW WAREHOUSES LIKE '{SNOWFLAKE_WAREHOUSE}'",
+        "grants": f"SHOW GRANTS TO ROLE {SNOWFLAKE_ROLE}",
+    }
+
+
+def run_queries(conn, queries: dict) -> dict:
+    """Exécute les requêtes en parallèle (un curseur par thread) : {clé: (lignes | exception, durée)}."""
+    def run(sql):
+        start = time.perf_counter()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql)
+            return cursor.fetchall(), time.perf_counter() - start
+        except Exception as e:
+            return e, time.perf_counter() - start
+        finally:
+            cursor.close()
+
+    with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+        futures = {key: pool.submit(run, sql) for key, sql in queries.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+
+# 2️⃣ Évaluation : tous les contrôles sont évalués, aucun arrêt au premier échec
+def evaluate(results: dict) -> list:
+    checks = []
+
+    rows, seconds = results["warehouses"]
+    if isinstance(rows, Exception):
+        checks.append(CheckResult(f"warehouse {SNOWFLAKE_WAREHOUSE}", False, str(rows), seconds))
+    else:
+        checks.append(CheckResult(f"warehouse {SNOWFLAKE_WAREHOUSE}", bool(rows),
+                                  "exists" if rows else "does not exist", seconds))
+
+    rows, seconds = results["catalog"]
+    if isinstance(rows, Exception):
+        # Base absente ou inaccessible : schémas et tables ne peuvent pas être vérifiés
+        checks.append(CheckResult(f"database {SNOWFLAKE_DATABASE}", False, str(rows), seconds))
+    else:
+        checks.append(CheckResult(f"database {SNOWFLAKE_DATABASE}", True, "exists", seconds))
+        found_schemas = {r[1].upper() for r in rows if r[0] == "SCHEMA"}
+        found_tables = {r[2].upper() for r in rows if r[0] == "TABLE"}
+        for schema in SCHEMAS:
+            ok = schema in found_schemas
+            checks.append(CheckResult(f"schema {schema}", ok, "exists" if ok else "does not exist", seconds))
+        for table in RAW_TABLES:
+            ok = table in found_tables
+            checks.append(CheckResult(f"table {RAW_SCHEMA}.{table}", ok,
+                                      "exists" if ok else f"does not exist in {RAW_SCHEMA}", seconds))
+
+    rows, seconds = results["grants"]
+    if isinstance(rows, Exception):
+        checks.append(CheckResult(f"grants of {SNOWFLAKE_ROLE}", False, str(rows), seconds, blocking=False))
+    else:
+        # SHOW GRANTS TO ROLE: created_on, privilege, granted_on, name, ...
+        ok = any(g[2] == "WAREHOUSE" and str(g[3]).upper() == SNOWFLAKE_WAREHOUSE.upper() for g in rows)
+        checks.append(CheckResult(f"grants of {SNOWFLAKE_ROLE}", ok,
+                                  "has grants on warehouse" if ok else f"no grants on warehouse {SNOWFLAKE_WAREHOUSE}",
+                                  seconds, blocking=False))
+    return checks
+
+
+# 3️⃣ Cache d'un résultat positif
+def cache_key() -> str:
+    """Le cache n'est valable que pour la même cible (compte, rôle, warehouse, base, objets attendus)."""
+    target = "|".join([
+        str(SNOWFLAKE_ACCOUNT), SNOWFLAKE_ROLE, SNOWFLAKE_WAREHOUSE, SNOWFLAKE_DATABASE,
+        ",".join(SCHEMAS), ",".join(RAW_TABLES),
+    ])
+    return hashlib.sha1(target.encode("utf-8")).hexdigest()
+
+
+def cached_success(ttl: int) -> bool:
+    if ttl <= 0 or not CACHE_FILE.exists():
+        return False
+    try:
+        passed_at = json.loads(CACHE_FILE.read_text(encoding="utf-8")).get(cache_key())
+    except (OSError, ValueError):
+        return False
+    return passed_at is not None and time.time() - passed_at < ttl
+
+
+def store_success():
+    try:
+        cache = json.loads(CACHE_FILE.read_text(encoding="utf-8")) if CACHE_FILE.exists() else {}
+    except (OSError, ValueError):
+        cache = {}
+    cache[cache_key()] = time.time()
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    CACHE_FILE.write_text(json.dumps(cache), encoding="utf-8")
+
+
+def report(checks: list):
+    for check in checks:
+        icon = "✅" if check.ok else ("❌" if check.blocking else "⚠️")
+        log(f"{icon} {check.name}: {check.message} ({check.seconds * 1000:.0f} ms)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-ingestion Snowflake preflight")
+    parser.add_argument("--ttl", type=int, default=DEFAULT_CACHE_TTL,
+                        help="Durée de validité (s) d'un preflight réussi ; 0 désactive le cache")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore le cache et revérifie")
+    args = parser.parse_args(argv)
+
+    if not args.no_cache and cached_success(args.ttl):
+        log(f"✅ Preflight passed less than {args.ttl}s ago (cache {CACHE_FILE.name}), skipped.")
+        return 0
+
     log("Connecting to Snowflake...")
+    start = time.perf_counter()
+    # Connector imported only when the queries run: a cached preflight skips it
+    import snowflake.connector
+
     try:
         conn = snowflake.connector.connect(
             user=SNOWFLAKE_USER,
@@ -31,52 +185,26 @@ def main():
             warehouse=SNOWFLAKE_WAREHOUSE,
             database=SNOWFLAKE_DATABASE
         )
-        cs = conn.cursor()
     except Exception as e:
         log(f"❌ Connection failed: {e}")
-        sys.exit(1)
-    
-    # Vérifier warehouse
-    log(f"Checking warehouse {SNOWFLAKE_WAREHOUSE}...")
-    cs.execute(f"SHOW WAREHOUSES LIKE '{SNOWFLAKE_WAREHOUSE}'")
-    if not cs.fetchall():
-        log(f"❌ Warehouse {SNOWFLAKE_WAREHOUSE} does not exist!")
-        sys.exit(1)
-
-    # Vérifier database
-    log(f"Checking database {SNOWFLAKE_DATABASE}...")
-    cs.execute(f"SHOW DATABASES LIKE '{SNOWFLAKE_DATABASE}'")
-    if not cs.fetchall():
-        log(f"❌ Database {SNOWFLAKE_DATABASE} does not exist!")
-        sys.exit(1)
-    
-    # Vérifier schemas
-    for schema in [RAW_SCHEMA, STAGING_SCHEMA, FINAL_SCHEMA]:
-        log(f"Checking schema {schema}...")
-        cs.execute(f"SHOW SCHEMAS LIKE '{schema}' IN DATABASE {SNOWFLAKE_DATABASE}")
-        if not cs.fetchall():
-            log(f"❌ Schema {schema} does not exist!")
-            sys.exit(1)
-
-    # Vérifier tables RAW
-    for table in RAW_TABLES:
-        log(f"Checking RAW table {table}...")
-        cs.execute(f"SHOW TABLES LIKE '{table}' IN SCHEMA {SNOWFLAKE_DATABASE}.{RAW_SCHEMA}")
-        if not cs.fetchall():
-            log(f"❌ Table {table} does not exist in {RAW_SCHEMA}!")
-            sys.exit(1)
-
-    # Vérifier droits (simple check)
-    log("Checking role privileges on warehouse...")
-    cs.execute(f"SHOW GRANTS TO ROLE {SNOWFLAKE_ROLE}")
-    grants = cs.fetchall()
-    warehouse_grants = [g for g in grants if g[2] == SNOWFLAKE_WAREHOUSE]
-    if not warehouse_grants:
-        log(f"❌ Role {SNOWFLAKE_ROLE} has no grants on warehouse {SNOWFLAKE_WAREHOUSE}!")
-
-    log("✅ Pre-ingestion checks passed! Environment ready for ingestion.")
-    cs.close()
-    conn.close()
+        return 1
+    log(f"Connected ({(time.perf_counter() - start) * 1000:.0f} ms)")
+
+    try:
+        checks = evaluate(run_queries(conn, metadata_queries()))
+    finally:
+        conn.close()
+
+    report(checks)
+    failures = [c for c in checks if not c.ok and c.blocking]
+    if failures:
+        log(f"❌ {len(failures)} blocking check(s) failed: {', '.join(c.name for c in failures)}")
+        return 1
+
+    store_success()
+    log(f"✅ Pre-ingestion checks passed in {(time.perf_counter() - start):.2f}s! Environment ready for ingestion.")
+    return 0
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,194 @@
+# checks/run_history.py
+"""
+Append-only run history (SQLite) for post-ingestion metrics.
+
+- record_run()     : one INSERT per run, O(1) whatever the history size
+- apply_retention(): drops runs older than the retention window, compacts when needed
+- export_report()  : builds the xlsx / csv report on demand from the history
+
+CLI:
+    python checks/run_history.py export --format xlsx
+    python checks/run_history.py export --format csv --last 30
+    python checks/run_history.py prune --keep-days 365
+    python checks/run_history.py import-xlsx checks/post_ingestion_report.xlsx
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# --- allow root-level imports when executed as a script ---
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+HISTORY_FILE = Path(__file__).parent / "run_history.sqlite"
+REPORT_DIR = Path(__file__).parent
+DEFAULT_RETENTION_DAYS = int(os.getenv("RUN_HISTORY_RETENTION_DAYS", "730"))
+# Compaction (VACUUM) when free pages exceed this share of the file
+COMPACT_FREE_RATIO = 0.25
+
+# Report column -> key in the stats dict produced by the pipeline
+METRICS = {
+    "total_rows": "TOTAL_ROWS",
+    "duplicate_groups": "DUPLICATE_GROUPS",
+    "buffer_rows": "BUFFER_ROWS",
+    "min_distance": "MIN_DISTANCE",
+    "max_distance": "MAX_DISTANCE",
+    "avg_distance": "AVG_DISTANCE",
+    "duplicates_removed": "DUPLICATES_REMOVED",
+}
+HEADERS = ["run_id", "timestamp", *METRICS]
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    columns = ", ".join(f"{name} REAL" for name in METRICS)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            {columns},
+            details TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp)")
+    return conn
+
+
+def _number(value):
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def record_run(stats: dict, db_path: Path = HISTORY_FILE, timestamp: str = None) -> int:
+    """Appends one run (known metrics as columns, everything else as JSON details)."""
+    timestamp = timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    values = [_number(stats.get(key)) for key in METRICS.values()]
+    details = {key: value for key, value in stats.items() if key not in METRICS.values()}
+    with closing(_connect(db_path)) as conn, conn:
+        cursor = conn.execute(
+            f"INSERT INTO runs (timestamp, {', '.join(METRICS)}, details) "
+            f"VALUES (?, {', '.join('?' for _ in METRICS)}, ?)",
+            [timestamp, *values, json.dumps(details, default=str) if details else None],
+        )
+        run_id = cursor.lastrowid
+    print(f"📊 Run #{run_id} recorded in {db_path}")
+    return run_id
+
+
+def apply_retention(db_path: Path = HISTORY_FILE, keep_days: int = DEFAULT_RETENTION_DAYS) -> int:
+    """Deletes runs older than keep_days; compacts the file if enough pages were freed."""
+    cutoff = (datetime.now() - timedelta(days=keep_days)).strftime("%Y-%m-%d %H:%M:%S")
+    with closing(_connect(db_path)) as conn:
+        with conn:
+            deleted = conn.execute("DELETE FROM runs WHERE timestamp < ?", [cutoff]).rowcount
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        total_pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        if total_pages and free_pages / total_pages > COMPACT_FREE_RATIO:
+            conn.execute("VACUUM")
+            print(f"🧹 Run history compacted ({free_pages} free pages)")
+    if deleted:
+        print(f"🧹 {deleted} run(s) older than {keep_days} days removed")
+    return deleted
+
+
+def load_runs(db_path: Path = HISTORY_FILE, last: int = None, since: str = None) -> list:
+    """Runs as lists in HEADERS order, oldest first."""
+    if not Path(db_path).exists():
+        return []
+    sql = f"SELECT {', '.join(HEADERS)} FROM runs"
+    params = []
+    if since:
+        sql += " WHERE timestamp >= ?"
+        params.append(since)
+    sql += " ORDER BY run_id DESC"
+    if last:
+        sql += " LIMIT ?"
+        params.append(last)
+    with closing(_connect(db_path)) as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [list(row) for row in reversed(rows)]
+
+
+def export_report(fmt: str = "xlsx", output: Path = None, db_path: Path = HISTORY_FILE,
+                  last: int = None, since: str = None) -> Path:
+    """Writes the report (one Summary sheet / one csv) from the history."""
+    runs = load_runs(db_path, last=last, since=since)
+    output = Path(output or REPORT_DIR / f"post_ingestion_report.{fmt}")
+    if fmt == "csv":
+        with open(output, mode="w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADERS)
+            writer.writerows(runs)
+    else:
+        # openpyxl is only imported for an xlsx export, not by every ingestion run
+        from checks.writer_report_xlsx import write_report_xlsx
+
+        write_report_xlsx(HEADERS, runs, output)
+    print(f"📊 Report with {len(runs)} run(s) saved: {output}")
+    return output
+
+
+def import_xlsx(report_file: Path, db_path: Path = HISTORY_FILE) -> int:
+    """One-off import of the Summary sheet of a legacy post_ingestion_report.xlsx."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(report_file, read_only=True)
+    if "Summary" not in wb.sheetnames:
+        print(f"⚠️ No Summary sheet in {report_file}")
+        return 0
+    rows = wb["Summary"].iter_rows(values_only=True)
+    headers = [str(h) for h in next(rows)]
+    imported = 0
+    for row in rows:
+        record = dict(zip(headers, row))
+        timestamp = record.pop("timestamp", None)
+        if not timestamp:
+            continue
+        stats = {METRICS[name]: value for name, value in record.items() if name in METRICS}
+        record_run(stats, db_path, timestamp=str(timestamp))
+        imported += 1
+    wb.close()
+    return imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Post-ingestion run history")
+    parser.add_argument("--db", type=Path, default=HISTORY_FILE, help="SQLite history file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Build the report from the history")
+    export.add_argument("--format", choices=["xlsx", "csv"], default="xlsx")
+    export.add_argument("--output", type=Path, default=None)
+    export.add_argument("--last", type=int, default=None, help="Only the last N runs")
+    export.add_argument("--since", default=None, help="Only runs since YYYY-MM-DD")
+
+    prune = commands.add_parser("prune", help="Apply retention and compact")
+    prune.add_argument("--keep-days", type=int, default=DEFAULT_RETENTION_DAYS)
+
+    legacy = commands.add_parser("import-xlsx", help="Import a legacy xlsx report")
+    legacy.add_argument("report", type=Path)
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        export_report(args.format, args.output, args.db, last=args.last, since=args.since)
+    elif args.command == "prune":
+        apply_retention(args.db, args.keep_days)
+    else:
+        print(f"✅ {import_xlsx(args.report, args.db)} run(s) imported")
+
+
+if __name__ == "__main__":
+    main()
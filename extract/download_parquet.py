@@ -1,47 +1,339 @@
+import argparse
+import hashlib
+import json
 import os
-from datetime import date
-import requests
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+
+# --- télémétrie et catalogue partagés avec l'ingestion (load/telemetry.py, load/parquet_catalog.py) ---
+# requests et le catalogue (pandas, pyarrow) sont importés au lancement du téléchargement :
+# --help et l'import de ce module restent instantanés.
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "load"))
+from telemetry import span, start_run
 
 # 📁 Dossier local pour stocker les fichiers téléchargés
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
-os.makedirs(DATA_DIR, exist_ok=True)
 
-# 📅 Dates de janvier 2024 jusqu'au mois précédent
-start = date(2024, 1, 1)
-today = date.today()
+# 🌐 URL de base
+BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data"
 
-# On ne télécharge que jusqu'au mois précédent
-end_year = today.year
-end_month = today.month - 1 if today.day < 28 else today.month
+# 🧾 Manifest des fichiers vérifiés (taille, ETag, checksum...)
+MANIFEST_NAME = "_manifest.json"
 
-total_months = (end_year - start.year) * 12 + end_month - start.month + 1
+CHUNK_SIZE = 1024 * 1024
+PARQUET_MAGIC = b"PAR1"
 
-# 🌐 URL de base
-BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data"
 
-# 📥 Téléchargement de chaque fichier .parquet
-for month_offset in range(total_months):
-    year = start.year + (start.month + month_offset - 1) // 12
-    mon = (start.month + month_offset - 1) % 12 + 1
+# 📅 Mois à télécharger
+def default_end_month(today: date = None) -> tuple:
+    """
+    Dernier mois à télécharger : le mois précédent, ou le mois courant
+    à partir du 28 (même règle que l'ancien script).
+    """
+    today = today or date.today()
+    year = today.year
+    month = today.month - 1 if today.day < 28 else today.month
+    if month == 0:
+        year, month = year - 1, 12
+    return year, month
+
+
+def parse_month(value: str) -> tuple:
+    """Convertit 'YYYY-MM' en (année, mois)."""
+    parsed = datetime.strptime(value, "%Y-%m")
+    return parsed.year, parsed.month
+
+
+def month_range(start: tuple, end: tuple) -> list:
+    """Liste des (année, mois) de start à end inclus."""
+    total_months = (end[0] - start[0]) * 12 + end[1] - start[1] + 1
+    months = []
+    for month_offset in range(total_months):
+        year = start[0] + (start[1] + month_offset - 1) // 12
+        mon = (start[1] + month_offset - 1) % 12 + 1
+        months.append((year, mon))
+    return months
+
+
+# 🧾 Manifest
+class DownloadManifest:
+    """
+    Manifest JSON des fichiers téléchargés (une entrée par fichier).
+    Permet de sauter un fichier déjà vérifié sans le relire : on compare
+    seulement la taille et la date de modification au manifest.
+    Thread-safe : chaque mise à jour réécrit le fichier de manière atomique.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[⚠️] Manifest illisible ({e}), il sera reconstruit")
+
+    def get(self, filename: str) -> dict:
+        with self._lock:
+            return dict(self.entries.get(filename, {}))
+
+    def update(self, filename: str, entry: dict):
+        with self._lock:
+            self.entries[filename] = entry
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def is_verified(self, filename: str, local_path: str) -> bool:
+        """Fichier présent, vérifié, et inchangé depuis (taille + mtime)."""
+        entry = self.get(filename)
+        if entry.get("status") != "ok" or not os.path.exists(local_path):
+            return False
+        stat = os.stat(local_path)
+        return entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime_ns
+
+
+def is_parquet_file(path: str) -> bool:
+    """
+    Vérifie l'en-tête et le footer parquet ('PAR1' + longueur du footer)
+    sans lire le contenu du fichier.
+    """
+    try:
+        size = os.path.getsize(path)
+        if size < 12:
+            return False
+        with open(path, "rb") as f:
+            head = f.read(4)
+            f.seek(-8, os.SEEK_END)
+            footer = f.read(8)
+    except OSError:
+        return False
+    footer_len = int.from_bytes(footer[:4], "little")
+    return head == PARQUET_MAGIC and footer[4:] == PARQUET_MAGIC and footer_len <= size - 12
+
+
+def file_md5(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _manifest_entry(local_path: str, md5: str, etag=None, last_modified=None) -> dict:
+    stat = os.stat(local_path)
+    return {
+        "status": "ok",
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "md5": md5,
+        "etag": etag,
+        "last_modified": last_modified,
+        "verified_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+# 📥 Téléchargement d'un fichier
+def download_file(session, url: str, local_path: str, manifest: DownloadManifest,
+                  chunk_size: int = CHUNK_SIZE, timeout: float = 60) -> str:
+    """
+    Télécharge url vers local_path en streaming dans un fichier '.part',
+    reprend un '.part' existant via un header Range, puis renomme
+    atomiquement une fois le footer parquet vérifié.
+    Retourne 'downloaded' ou 'missing' (403/404 : fichier pas encore publié).
+    """
+    filename = os.path.basename(local_path)
+    part_path = f"{local_path}.part"
+    previous = manifest.get(filename)
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        # If-Range : si le fichier distant a changé, le serveur renvoie 200 complet
+        validator = previous.get("etag") or previous.get("last_modified")
+        if validator:
+            headers["If-Range"] = validator
+
+    with session.get(url, stream=True, headers=headers, timeout=timeout) as response:
+        if response.status_code in (403, 404):
+            return "missing"
+        if response.status_code == 416:
+            # Range invalide (.part corrompu ou plus long que la source) : on repart de zéro
+            os.remove(part_path)
+            raise RuntimeError("Range non satisfiable, reprise annulée")
+        response.raise_for_status()
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        md5 = hashlib.md5()
+
+        if response.status_code == 206:
+            # Reprise : le checksum doit couvrir la partie déjà écrite
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    md5.update(chunk)
+            mode = "ab"
+            expected = _content_range_total(response.headers.get("Content-Range"))
+        else:
+            offset = 0
+            mode = "wb"
+            length = response.headers.get("Content-Length")
+            expected = int(length) if length is not None else None
+
+        manifest.update(filename, {"status": "partial", "etag": etag, "last_modified": last_modified})
+
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+                    md5.update(chunk)
+
+    size = os.path.getsize(part_path)
+    if expected is not None and size != expected:
+        raise RuntimeError(f"taille incomplète ({size}/{expected} octets)")
+    if not is_parquet_file(part_path):
+        os.remove(part_path)
+        raise RuntimeError("footer parquet invalide, fichier supprimé")
+
+    os.replace(part_path, local_path)
+    manifest.update(filename, _manifest_entry(local_path, md5.hexdigest(), etag, last_modified))
+    return "downloaded"
+
+
+def _content_range_total(content_range):
+    """'bytes 100-199/200' -> 200 (None si inconnu)."""
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+def fetch_month(session, year: int, mon: int, data_dir: str, base_url: str,
+                manifest: DownloadManifest, retries: int = 3, catalog=None) -> str:
+    """Télécharge un mois avec reprise automatique sur erreur."""
     filename = f"yellow_tripdata_{year}-{mon:02}.parquet"
-    url = f"{BASE_URL}/{filename}"
-    local_path = os.path.join(DATA_DIR, filename)
+    url = f"{base_url}/{filename}"
+    local_path = os.path.join(data_dir, filename)
 
-    if os.path.exists(local_path):
+    if manifest.is_verified(filename, local_path):
         print(f"[✔️] {filename} déjà téléchargé")
-        continue
+        return "skipped"
+    # Fichier vérifié puis réécrit dans le catalogue partitionné (source à plat supprimée)
+    if catalog is not None and manifest.get(filename).get("status") == "ok" and catalog.contains(filename):
+        print(f"[✔️] {filename} déjà téléchargé (catalogué)")
+        return "skipped"
+
+    # Fichier présent mais absent du manifest (ancien téléchargement) : vérification unique
+    if os.path.exists(local_path):
+        if is_parquet_file(local_path):
+            manifest.update(filename, _manifest_entry(local_path, file_md5(local_path)))
+            print(f"[✔️] {filename} déjà téléchargé (vérifié et ajouté au manifest)")
+            return "skipped"
+        print(f"[⚠️] {filename} tronqué ou corrompu, nouveau téléchargement")
+        os.remove(local_path)
 
     print(f"[⬇️] Téléchargement de : {filename}")
-    try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            with open(local_path, "wb") as f:
-                f.write(response.content)
-            print(f"[✅] Sauvegardé dans {local_path}")
-        elif response.status_code == 403:
-            print(f"[⚠️] {filename} n'existe pas encore, on passe")
-            continue
-        else:
-            print(f"[❌] Erreur {response.status_code} pour {filename}")
-    except Exception as e:
-        print(f"[❌] Erreur lors du téléchargement de {filename}: {e}")
+    for attempt in range(1, retries + 1):
+        try:
+            status = download_file(session, url, local_path, manifest)
+            if status == "missing":
+                print(f"[⚠️] {filename} n'existe pas encore, on passe")
+            else:
+                print(f"[✅] Sauvegardé dans {local_path}")
+            return status
+        except Exception as e:
+            print(f"[❌] Erreur lors du téléchargement de {filename} (tentative {attempt}/{retries}): {e}")
+            if attempt < retries:
+                time.sleep(2 ** attempt)
+    return "failed"
+
+
+def fetch_month_traced(session, year: int, mon: int, data_dir: str, base_url: str,
+                       manifest: DownloadManifest, retries: int = 3, catalog=None) -> str:
+    """fetch_month dans un span "download" (statut, octets téléchargés)."""
+    filename = f"yellow_tripdata_{year}-{mon:02}.parquet"
+    with span("download", file=filename) as current:
+        status = fetch_month(session, year, mon, data_dir, base_url, manifest, retries, catalog)
+        current.attrs["status"] = status
+        if status == "downloaded":
+            current.bytes = os.path.getsize(os.path.join(data_dir, filename))
+    return status
+
+
+def download_months(months: list, data_dir: str = DATA_DIR, base_url: str = BASE_URL,
+                    workers: int = 4, retries: int = 3) -> dict:
+    """
+    Télécharge les mois demandés avec un pool borné de workers.
+    Retourne {nom_fichier: statut}.
+    """
+    import requests
+    from parquet_catalog import ParquetCatalog
+
+    os.makedirs(data_dir, exist_ok=True)
+    manifest = DownloadManifest(os.path.join(data_dir, MANIFEST_NAME))
+    catalog = ParquetCatalog(data_dir)
+    results = {}
+
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(workers, 1))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            futures = {
+                executor.submit(fetch_month_traced, session, year, mon, data_dir, base_url, manifest, retries,
+                                catalog):
+                    f"yellow_tripdata_{year}-{mon:02}.parquet"
+                for year, mon in months
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Téléchargement des fichiers NYC yellow taxi (.parquet)")
+    parser.add_argument("--start", default="2024-01", help="Premier mois (YYYY-MM)")
+    parser.add_argument("--end", default=None, help="Dernier mois (YYYY-MM), par défaut le mois précédent")
+    parser.add_argument("--workers", type=int, default=4, help="Téléchargements simultanés")
+    parser.add_argument("--retries", type=int, default=3, help="Tentatives par fichier")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--no-catalog", action="store_true",
+                        help="Laisse les fichiers à plat (pas de catalogue partitionné ni d'index des footers)")
+    parser.add_argument("--keep-source", action="store_true",
+                        help="Conserve les fichiers à plat après leur réécriture dans le catalogue")
+    parser.add_argument("--profile", nargs="?", const="all", default=None,
+                        help="Profilage cProfile du run (load/logs/profiles)")
+    args = parser.parse_args(argv)
+    telemetry = start_run("download", profile=args.profile)
+
+    end = parse_month(args.end) if args.end else default_end_month()
+    months = month_range(parse_month(args.start), end)
+
+    results = download_months(months, data_dir=args.data_dir, base_url=args.base_url,
+                              workers=args.workers, retries=args.retries)
+
+    summary = {}
+    for status in results.values():
+        summary[status] = summary.get(status, 0) + 1
+    print(f"[📊] Bilan : {summary}")
+    if not args.no_catalog:
+        from parquet_catalog import build_catalog
+
+        with span("catalog"):
+            build_catalog(args.data_dir, keep_source=args.keep_source)
+    telemetry.finish(success=not summary.get("failed"))
+    return 1 if summary.get("failed") else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,378 @@
+# load/backends.py
+"""
+Entrepôts cibles du pipeline, interchangeables :
+  - SnowflakeBackend : production (connecteur Snowflake, write_pandas, PUT / COPY INTO)
+  - DuckDBBackend    : moteur embarqué, fichier local ; tout le pipeline tourne sans
+                       réseau ni crédits, en quelques secondes (boucle de dev, débit)
+
+Un backend couvre la connexion, le chargement d'un DataFrame, le moteur de stage,
+les écarts de dialecte du DDL (types, ALTER multi-colonnes, TRUNCATE IF EXISTS)
+et l'introspection. Les DML (MERGE, DELETE/INSERT par fenêtre) sont communs.
+
+Sélection : WAREHOUSE_BACKEND=snowflake|duckdb (défaut snowflake), DUCKDB_PATH,
+ou set_backend() / merge_dynamic --warehouse duckdb.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+SNOWFLAKE = "snowflake"
+DUCKDB = "duckdb"
+BACKENDS = [SNOWFLAKE, DUCKDB]
+
+DEFAULT_DUCKDB_PATH = Path(__file__).parent / "local_warehouse.duckdb"
+# Schémas créés dans la base DuckDB (mêmes noms que dans Snowflake)
+DUCKDB_SCHEMAS = ["RAW", "STAGING", "FINAL"]
+# Types Snowflake cités tels quels dans le SQL du pipeline (ledger, migrations...)
+DUCKDB_TYPE_ALIASES = {"NUMBER": "BIGINT", "TIMESTAMP_NTZ": "TIMESTAMP"}
+# Types du DDL généré à traduire (FLOAT Snowflake = 64 bits, FLOAT DuckDB = 32 bits)
+DUCKDB_COLUMN_TYPES = {"FLOAT": "DOUBLE", "NUMBER": "BIGINT", "TIMESTAMP_NTZ": "TIMESTAMP"}
+
+
+class WarehouseBackend(ABC):
+    """Interface commune ; les méthodes de dialecte ont l'implémentation Snowflake par défaut."""
+
+    name = None
+    # Compressions des fichiers intermédiaires d'upload, comparées par chunked_upload.py
+    upload_compressions = (None,)
+
+    @property
+    def default_schema(self) -> str:
+        return (os.getenv("SNOWFLAKE_SCHEMA") or "").upper()
+
+    @abstractmethod
+    def connect(self):
+        """Nouvelle connexion DB-API (utilisée par le pool de snowflake_utils)."""
+
+    @abstractmethod
+    def write_frame(self, conn, df, table_name: str, compression: str = None):
+        """Charge un DataFrame dans une table existante, renvoie (succès, nb lignes)."""
+
+    @abstractmethod
+    def stage_engine(self, execute):
+        """Moteur de chargement par stage (backend stage de merge_dynamic)."""
+
+    # 🧩 Dialecte du DDL
+    def column_type(self, sf_type: str) -> str:
+        return sf_type
+
+    def create_table_sql(self, table_name: str, columns: dict) -> str:
+        definition = ", ".join(f'"{col}" {self.column_type(sf_type)}' for col, sf_type in columns.items())
+        return f"CREATE TABLE IF NOT EXISTS {table_name} ({definition})"
+
+    def add_columns_sql(self, table_name: str, columns: list) -> list:
+        """Un seul ALTER multi-colonnes."""
+        additions = ", ".join(f'"{col}" {self.column_type(sf_type)}' for col, sf_type in columns)
+        return [f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {additions}"]
+
+    def truncate_if_exists(self, execute, table_name: str):
+        execute(f"TRUNCATE TABLE IF EXISTS {table_name}")
+
+    # 📥 Lecture des résultats
+    def arrow_batches(self, cursor, batch_rows: int):
+        """
+        Résultat d'une requête exécutée en pyarrow.RecordBatch successifs.
+        Par défaut : fetchmany DB-API converti en Arrow (les backends ont une voie native).
+        """
+        import pyarrow as pa
+
+        names = [column[0] for column in cursor.description or []]
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows:
+                return
+            yield pa.RecordBatch.from_pydict({name: [row[i] for row in rows] for i, name in enumerate(names)})
+
+    # 🔎 Introspection
+    def table_exists(self, execute, table_name: str) -> bool:
+        parts = table_name.upper().split(".")
+        schema, table = parts if len(parts) == 2 else (self.default_schema, parts[0])
+        rows = execute(f"""
+            SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+            WHERE TABLE_SCHEMA = '{schema}' AND TABLE_NAME = '{table}'
+        """)
+        return bool(rows and rows[0][0])
+
+    def last_altered(self, execute, tables: list) -> dict:
+        """
+        {TABLE: LAST_ALTERED} des tables (noms à 1, 2 ou 3 parties) ; None pour une
+        table introuvable ou une vue (dont LAST_ALTERED ignore les écritures des tables lues).
+        """
+        by_database = {}
+        for name in tables:
+            parts = name.upper().split(".")
+            database = parts[0] if len(parts) == 3 else None
+            schema = parts[-2] if len(parts) >= 2 else self.default_schema
+            by_database.setdefault(database, []).append((name, schema, parts[-1]))
+
+        versions = {name: None for name in tables}
+        for database, entries in by_database.items():
+            prefix = f"{database}." if database else ""
+            conditions = " OR ".join(
+                f"(TABLE_SCHEMA = '{schema}' AND TABLE_NAME = '{table}')" for _, schema, table in entries
+            )
+            rows = execute(f"""
+                SELECT TABLE_SCHEMA, TABLE_NAME, TABLE_TYPE, LAST_ALTERED
+                FROM {prefix}INFORMATION_SCHEMA.TABLES
+                WHERE {conditions}
+            """)
+            found = {(schema.upper(), table.upper()): (table_type, altered)
+                     for schema, table, table_type, altered in rows}
+            for name, schema, table in entries:
+                table_type, altered = found.get((schema, table), (None, None))
+                versions[name] = str(altered) if altered is not None and "VIEW" not in str(table_type) else None
+        return versions
+
+
+class SnowflakeBackend(WarehouseBackend):
+    """Snowflake : connexion depuis les variables d'environnement (.env)."""
+
+    name = SNOWFLAKE
+    # write_pandas : fichier parquet intermédiaire PUT en stage (gzip par défaut du connecteur)
+    upload_compressions = ("snappy", "gzip")
+
+    def connect(self):
+        import snowflake.connector
+
+        try:
+            return snowflake.connector.connect(
+                user=os.getenv("SNOWFLAKE_USER"),
+                password=os.getenv("SNOWFLAKE_PASSWORD"),
+                account=os.getenv("SNOWFLAKE_ACCOUNT"),
+                warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
+                database=os.getenv("SNOWFLAKE_DATABASE"),
+                schema=os.getenv("SNOWFLAKE_SCHEMA"),
+                role=os.getenv("SNOWFLAKE_ROLE"),
+            )
+        except Exception as e:
+            raise RuntimeError(f"❌ Erreur de connexion Snowflake : {e}")
+
+    def write_frame(self, conn, df, table_name: str, compression: str = None):
+        # use_logical_type : les timestamps parquet sont lus avec leur unité, pas comme des entiers
+        from snowflake.connector.pandas_tools import write_pandas
+
+        success, _, nrows, _ = write_pandas(conn, df, table_name, use_logical_type=True,
+                                            compression=compression or "gzip")
+        return success, nrows
+
+    def stage_engine(self, execute):
+        from stage_loader import SnowflakeStageEngine
+
+        return SnowflakeStageEngine(execute)
+
+    def arrow_batches(self, cursor, batch_rows: int):
+        # Chunks de résultat Arrow téléchargés directement (pas de conversion ligne à ligne)
+        from snowflake.connector.errors import NotSupportedError
+
+        try:
+            tables = cursor.fetch_arrow_batches()
+        except NotSupportedError:
+            # Résultat non Arrow (SHOW, DESCRIBE...) : voie DB-API
+            yield from super().arrow_batches(cursor, batch_rows)
+            return
+        import pyarrow as pa
+
+        for table in tables:
+            # Les entiers sont encodés sur la plus petite largeur suffisante, chunk par chunk :
+            # int64 partout pour un schéma identique d'un batch à l'autre
+            schema = pa.schema([
+                field.with_type(pa.int64()) if pa.types.is_integer(field.type) else field
+                for field in table.schema
+            ])
+            if schema != table.schema:
+                table = table.cast(schema)
+            yield from table.to_batches(max_chunksize=batch_rows)
+
+
+class DuckDBCursor:
+    """
+    Curseur sur la connexion DuckDB de la DuckDBConnection : tous les curseurs
+    d'une connexion partagent sa transaction (BEGIN / COMMIT), comme une session Snowflake.
+    """
+
+    def __init__(self, con):
+        self._con = con
+        self.description = None
+
+    def execute(self, sql, parameters=None):
+        self._con.execute(sql, parameters) if parameters is not None else self._con.execute(sql)
+        self.description = self._con.description
+        return self
+
+    def fetchall(self):
+        return self._con.fetchall()
+
+    def fetchone(self):
+        return self._con.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._con.fetchmany(size)
+
+    def fetch_arrow_table(self):
+        return self._con.to_arrow_table()
+
+    def fetch_record_batch(self, rows_per_batch: int):
+        return self._con.to_arrow_reader(rows_per_batch)
+
+    def close(self):
+        # La connexion sous-jacente reste ouverte pour les curseurs suivants
+        self.description = None
+
+
+class DuckDBConnection:
+    """
+    Connexion DB-API au-dessus d'une connexion DuckDB dédiée (une par emprunt
+    du pool, toutes sur la même base). Autocommit : les transactions explicites
+    passent par BEGIN / COMMIT / ROLLBACK (pool.transaction()).
+    """
+
+    def __init__(self, con, schema: str):
+        self._con = con
+        self._closed = False
+        con.execute(f"USE {schema}")
+
+    def cursor(self):
+        return DuckDBCursor(self._con)
+
+    def register(self, name: str, df):
+        self._con.register(name, df)
+
+    def unregister(self, name: str):
+        self._con.unregister(name)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def is_closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        if not self._closed:
+            self._con.close()
+            self._closed = True
+
+
+class DuckDBBackend(WarehouseBackend):
+    """
+    Base DuckDB embarquée (fichier, ou ":memory:"), créée à la première connexion
+    avec les schémas RAW / STAGING / FINAL et les alias de types Snowflake.
+    """
+
+    name = DUCKDB
+
+    def __init__(self, path=None, schema: str = None):
+        self.path = str(path or os.getenv("DUCKDB_PATH") or DEFAULT_DUCKDB_PATH)
+        self._schema = schema
+        self._database = None
+        self._lock = threading.Lock()
+        self._stage_dir = None
+
+    @property
+    def default_schema(self) -> str:
+        return (self._schema or os.getenv("SNOWFLAKE_SCHEMA") or "RAW").upper()
+
+    def database(self):
+        """Connexion racine, ouverte une fois ; les connexions du pool en dérivent."""
+        with self._lock:
+            if self._database is None:
+                try:
+                    import duckdb
+                except ImportError as e:
+                    raise RuntimeError("❌ Backend DuckDB indisponible : pip install -r requirements.txt") from e
+                if self.path != ":memory:":
+                    Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                database = duckdb.connect(self.path)
+                for schema in {*DUCKDB_SCHEMAS, self.default_schema}:
+                    database.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+                existing = {row[0].upper() for row in database.execute(
+                    "SELECT type_name FROM duckdb_types() WHERE NOT internal").fetchall()}
+                for alias, target in DUCKDB_TYPE_ALIASES.items():
+                    if alias not in existing:
+                        database.execute(f"CREATE TYPE {alias} AS {target}")
+                self._database = database
+            return self._database
+
+    def connect(self):
+        return DuckDBConnection(self.database().cursor(), self.default_schema)
+
+    def write_frame(self, conn, df, table_name: str, compression: str = None):
+        # Insertion directe du DataFrame : pas de fichier intermédiaire, compression sans objet
+        conn.register("_frame_to_load", df)
+        try:
+            conn.cursor().execute(f"INSERT INTO {table_name} BY NAME SELECT * FROM _frame_to_load")
+        finally:
+            conn.unregister("_frame_to_load")
+        return True, len(df)
+
+    def stage_engine(self, execute):
+        from stage_loader import DuckDBStageEngine
+
+        if self._stage_dir is None:
+            self._stage_dir = Path(tempfile.mkdtemp(prefix="nyc_taxi_duckdb_stage_"))
+        return DuckDBStageEngine(execute, self._stage_dir)
+
+    def column_type(self, sf_type: str) -> str:
+        return DUCKDB_COLUMN_TYPES.get(sf_type.upper(), sf_type)
+
+    def arrow_batches(self, cursor, batch_rows: int):
+        yield from cursor.fetch_record_batch(batch_rows)
+
+    def last_altered(self, execute, tables: list) -> dict:
+        # DuckDB n'expose pas de date de modification : résultats jamais mis en cache
+        return {name: None for name in tables}
+
+    def add_columns_sql(self, table_name: str, columns: list) -> list:
+        # DuckDB : une colonne par ALTER
+        return [
+            f'ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS "{col}" {self.column_type(sf_type)}'
+            for col, sf_type in columns
+        ]
+
+    def truncate_if_exists(self, execute, table_name: str):
+        if self.table_exists(execute, table_name):
+            execute(f"TRUNCATE TABLE {table_name}")
+
+    def close(self):
+        with self._lock:
+            if self._database is not None:
+                self._database.close()
+                self._database = None
+            if self._stage_dir is not None:
+                shutil.rmtree(self._stage_dir, ignore_errors=True)
+                self._stage_dir = None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def make_backend(name: str = None, **options) -> WarehouseBackend:
+    name = (name or os.getenv("WAREHOUSE_BACKEND") or SNOWFLAKE).lower()
+    if name == SNOWFLAKE:
+        return SnowflakeBackend()
+    if name == DUCKDB:
+        return DuckDBBackend(**options)
+    raise ValueError(f"❌ Backend inconnu : {name} (attendus : {', '.join(BACKENDS)})")
+
+
+def get_backend() -> WarehouseBackend:
+    """Backend actif, choisi par WAREHOUSE_BACKEND à la première utilisation."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = make_backend()
+        return _backend
+
+
+def set_backend(backend) -> WarehouseBackend:
+    """Change le backend actif (instance ou nom) ; à appeler avant d'ouvrir des connexions."""
+    global _backend
+    with _backend_lock:
+        _backend = make_backend(backend) if isinstance(backend, str) or backend is None else backend
+        return _backend
@@ -0,0 +1,131 @@
+# load/backfill_fingerprints.py
+"""
+Migration ponctuelle : calcul de ROW_FINGERPRINT pour les lignes chargées avant
+que l'ingestion ne persiste l'empreinte de la clé métier (dedup.py).
+
+L'empreinte est calculée en Python (même hachage que l'ingestion), mois par mois :
+les clés des lignes sans empreinte sont lues en batches Arrow, hachées, chargées
+dans une table de travail, puis reportées par un UPDATE joint sur les huit
+colonnes de la clé (comparaison NULL-safe), dans une transaction par mois.
+Seules les lignes sans empreinte sont touchées : le script peut être relancé sans effet.
+
+Usage :
+    python load/backfill_fingerprints.py --dry-run
+    python load/backfill_fingerprints.py
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from dedup import FINGERPRINT_COLUMN, first_occurrence_mask, row_fingerprints, with_fingerprints
+from load_strategy import PickupWindow
+from merge_dynamic import DEDUP_KEYS, TABLE_FINAL, schema_registry
+from snowflake_utils import close_pool, execute_in_transaction, execute_sql, get_pool, iter_sql_batches, write_frame
+from type_plan import snowflake_type
+
+TABLE = f"RAW.{TABLE_FINAL}"
+WORK_TABLE = "RAW.FINGERPRINT_BACKFILL"
+BATCH_ROWS = 500_000
+
+
+def missing_by_month(table: str) -> dict:
+    """{début de mois (None : date absente): lignes sans empreinte}, en une requête."""
+    rows = execute_sql(f"""
+        SELECT DATE_TRUNC('month', TPEP_PICKUP_DATETIME) AS month, COUNT(*)
+        FROM {table}
+        WHERE {FINGERPRINT_COLUMN} IS NULL
+        GROUP BY 1
+        ORDER BY 1
+    """)
+    return {month: count for month, count in rows}
+
+
+def month_predicate(month, alias: str = None) -> str:
+    if month is None:
+        column = f"{alias}.TPEP_PICKUP_DATETIME" if alias else "TPEP_PICKUP_DATETIME"
+        return f"{column} IS NULL"
+    start = pd.Timestamp(month)
+    return PickupWindow(start, start).predicate(alias)
+
+
+def month_label(month) -> str:
+    return pd.Timestamp(month).strftime("%Y-%m") if month is not None else "sans date"
+
+
+def build_update_sql(table: str, month) -> str:
+    """Report des empreintes de la table de travail, restreint au mois et aux lignes sans empreinte."""
+    conditions = [f"target.{col} IS NOT DISTINCT FROM work.{col}" for col in DEDUP_KEYS]
+    conditions += [f"target.{FINGERPRINT_COLUMN} IS NULL", month_predicate(month, "target")]
+    on_clause = "\n          AND ".join(conditions)
+    return f"""
+        UPDATE {table} AS target
+        SET {FINGERPRINT_COLUMN} = work.{FINGERPRINT_COLUMN}
+        FROM {WORK_TABLE} AS work
+        WHERE {on_clause}
+    """
+
+
+def backfill_month(table: str, month) -> int:
+    """Empreintes d'un mois : lecture des clés, hachage, chargement, UPDATE. Renvoie les clés distinctes."""
+    keys = ", ".join(DEDUP_KEYS)
+    seen = np.empty(0, dtype=np.uint64)
+    execute_sql(f"TRUNCATE TABLE {WORK_TABLE}")
+    batches = iter_sql_batches(
+        f"SELECT {keys} FROM {table} WHERE {FINGERPRINT_COLUMN} IS NULL AND {month_predicate(month)}",
+        batch_rows=BATCH_ROWS, frames=True, cache=False,
+    )
+    for df in batches:
+        df.columns = [col.upper() for col in df.columns]
+        fingerprints = row_fingerprints(df, DEDUP_KEYS)
+        # Une seule ligne par clé dans la table de travail (UPDATE déterministe)
+        keep = first_occurrence_mask(fingerprints) & ~np.isin(fingerprints, seen)
+        seen = np.union1d(seen, fingerprints[keep])
+        work = with_fingerprints(df[keep].reset_index(drop=True), fingerprints[keep])
+        with get_pool().connection() as conn:
+            success, _ = write_frame(conn, work, WORK_TABLE)
+        if not success:
+            raise RuntimeError(f"❌ Échec du chargement de {WORK_TABLE}")
+    execute_in_transaction([build_update_sql(table, month), f"TRUNCATE TABLE {WORK_TABLE}"])
+    return len(seen)
+
+
+def backfill(table: str = TABLE, dry_run: bool = False) -> dict:
+    # Colonne ajoutée si la table n'a jamais été rechargée depuis l'ingestion avec empreinte
+    schema_registry.ensure(table, {FINGERPRINT_COLUMN: snowflake_type(FINGERPRINT_COLUMN)}, verbose=True)
+    before = missing_by_month(table)
+    total = sum(before.values())
+    for month, count in before.items():
+        print(f"🔎 {month_label(month)} : {count} ligne(s) sans empreinte")
+    if dry_run or not total:
+        print("✔️ Aucune mise à jour effectuée" if not dry_run else "ℹ️ Dry-run : aucune mise à jour")
+        return before
+
+    # Mêmes types que la table (égalité exacte des FLOAT dans la jointure)
+    columns = ", ".join(DEDUP_KEYS + [FINGERPRINT_COLUMN])
+    execute_sql(f"CREATE TABLE IF NOT EXISTS {WORK_TABLE} AS SELECT {columns} FROM {table} LIMIT 0")
+    try:
+        for month in before:
+            distinct = backfill_month(table, month)
+            print(f"✅ {month_label(month)} : {distinct} clé(s) distincte(s) hachée(s)")
+    finally:
+        execute_sql(f"DROP TABLE IF EXISTS {WORK_TABLE}")
+
+    after = sum(missing_by_month(table).values())
+    if after:
+        raise RuntimeError(f"❌ {after} ligne(s) encore sans empreinte après migration")
+    print(f"✅ Empreintes de {table} calculées ({total} lignes)")
+    return before
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Calcul de ROW_FINGERPRINT pour les lignes déjà chargées")
+    parser.add_argument("--table", default=TABLE, help="Table RAW à compléter")
+    parser.add_argument("--dry-run", action="store_true", help="Compte les lignes sans les modifier")
+    args = parser.parse_args()
+    try:
+        backfill(args.table, dry_run=args.dry_run)
+    finally:
+        close_pool()
@@ -0,0 +1,202 @@
+# load/chunked_upload.py
+"""
+Upload d'un DataFrame dans une table buffer par chunks, piloté par le débit mesuré :
+  - taille de chunk ajustée après chaque chunk pour viser TARGET_CHUNK_SECONDS
+  - parallélisme ajusté par palier : augmenté tant que le débit global progresse,
+    réduit s'il baisse, divisé par deux après un échec
+  - compression des fichiers intermédiaires (write_pandas) choisie sur les premiers chunks
+  - seuls les chunks en échec sont relancés, avec backoff exponentiel et gigue
+Tout ou rien : si un chunk échoue après ses tentatives, aucun nouveau chunk n'est
+lancé, les chunks en cours sont attendus et l'échec est renvoyé ; l'appelant vide
+alors le buffer avant tout MERGE (merge_dynamic.upload_frame).
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+import pandas as pd
+
+from backends import get_backend
+from snowflake_utils import get_pool, write_frame
+
+TARGET_CHUNK_SECONDS = float(os.getenv("UPLOAD_TARGET_CHUNK_SECONDS", "5"))
+MAX_PARALLEL = int(os.getenv("UPLOAD_MAX_PARALLEL", "4"))
+MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "3"))
+# Premier chunk : ~32 Mo en mémoire pandas
+INITIAL_CHUNK_MB = 32
+MIN_CHUNK_ROWS = 10_000
+MAX_CHUNK_ROWS = 2_000_000
+BACKOFF_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+# Écart relatif de débit en deçà duquel le parallélisme n'est pas modifié
+THROUGHPUT_TOLERANCE = 0.1
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_SECONDS, ceiling: float = BACKOFF_MAX_SECONDS) -> float:
+    """Backoff exponentiel plafonné, gigue complète (les relances ne repartent pas ensemble)."""
+    return random.uniform(0, min(ceiling, base * 2 ** attempt))
+
+
+@dataclass
+class UploadResult:
+    success: bool
+    rows: int = 0
+    chunks: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+    # Réglages atteints en fin d'upload
+    chunk_rows: int = 0
+    parallel: int = 1
+    compression: str = None
+    error: str = None
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds else None
+
+    def summary(self) -> str:
+        rate = f", {self.rows_per_sec:,.0f} lignes/s" if self.rows_per_sec else ""
+        compression = f", compression {self.compression}" if self.compression else ""
+        return (f"📤 {self.rows} lignes en {self.chunks} chunk(s), {self.retries} relance(s) "
+                f"[chunk {self.chunk_rows} lignes, parallélisme {self.parallel}{compression}{rate}]")
+
+
+class UploadTuner:
+    """Réglages courants (taille de chunk, parallélisme, compression), ajustés au fil des chunks."""
+
+    def __init__(self, bytes_per_row: float, compressions: tuple, max_parallel: int = MAX_PARALLEL,
+                 target_seconds: float = TARGET_CHUNK_SECONDS):
+        self.chunk_rows = self._clamp(INITIAL_CHUNK_MB * 1024 * 1024 / max(bytes_per_row, 1))
+        self.max_parallel = max(max_parallel, 1)
+        self.parallel = min(2, self.max_parallel)
+        self.target_seconds = target_seconds
+        self.compressions = list(compressions) or [None]
+        self.compression = self.compressions[0]
+        self._untested = list(self.compressions)
+        self._by_compression = {}     # compression -> [lignes, secondes]
+        self._window_rows = 0
+        self._window_chunks = 0
+        self._window_start = time.perf_counter()
+        self._last_throughput = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _clamp(rows: float) -> int:
+        return int(min(max(rows, MIN_CHUNK_ROWS), MAX_CHUNK_ROWS))
+
+    def next_compression(self):
+        """Chaque compression candidate est essayée une fois, puis la plus rapide est retenue."""
+        with self._lock:
+            return self._untested.pop(0) if self._untested else self.compression
+
+    def observe(self, rows: int, seconds: float, compression):
+        with self._lock:
+            seconds = max(seconds, 1e-6)
+            # Taille de chunk : débit par flux x durée cible, lissé
+            self.chunk_rows = self._clamp(0.5 * self.chunk_rows + 0.5 * rows / seconds * self.target_seconds)
+
+            totals = self._by_compression.setdefault(compression, [0, 0.0])
+            totals[0] += rows
+            totals[1] += seconds
+            if not self._untested:
+                self.compression = max(self._by_compression,
+                                       key=lambda c: self._by_compression[c][0] / self._by_compression[c][1])
+
+            # Parallélisme : un palier = `parallel` chunks terminés, comparé au palier précédent
+            self._window_rows += rows
+            self._window_chunks += 1
+            if self._window_chunks < self.parallel:
+                return
+            throughput = self._window_rows / max(time.perf_counter() - self._window_start, 1e-6)
+            if self._last_throughput is None or throughput > self._last_throughput * (1 + THROUGHPUT_TOLERANCE):
+                self.parallel = min(self.parallel + 1, self.max_parallel)
+            elif throughput < self._last_throughput * (1 - THROUGHPUT_TOLERANCE):
+                self.parallel = max(self.parallel - 1, 1)
+            self._last_throughput = throughput
+            self._reset_window()
+
+    def failed(self):
+        with self._lock:
+            self.parallel = max(self.parallel // 2, 1)
+            self._last_throughput = None
+            self._reset_window()
+
+    def _reset_window(self):
+        self._window_rows = 0
+        self._window_chunks = 0
+        self._window_start = time.perf_counter()
+
+
+class ChunkedUploader:
+    """Upload par chunks d'un DataFrame, chaque chunk sur sa propre connexion du pool."""
+
+    def __init__(self, max_parallel: int = None, max_retries: int = MAX_RETRIES,
+                 target_seconds: float = TARGET_CHUNK_SECONDS):
+        # Pas plus de flux que de connexions dans le pool
+        self.max_parallel = min(max_parallel or MAX_PARALLEL, get_pool().max_size)
+        self.max_retries = max_retries
+        self.target_seconds = target_seconds
+
+    def _write(self, chunk: pd.DataFrame, table: str, compression, delay: float = 0.0) -> float:
+        if delay:
+            time.sleep(delay)
+        start = time.perf_counter()
+        with get_pool().connection() as conn:
+            success, nrows = write_frame(conn, chunk, table, compression=compression)
+        if not success or nrows != len(chunk):
+            raise RuntimeError(f"{nrows} ligne(s) chargée(s) sur {len(chunk)}")
+        return time.perf_counter() - start
+
+    def upload(self, df: pd.DataFrame, table: str) -> UploadResult:
+        start = time.perf_counter()
+        bytes_per_row = df.memory_usage(index=False, deep=False).sum() / max(len(df), 1)
+        tuner = UploadTuner(bytes_per_row, get_backend().upload_compressions, self.max_parallel,
+                            self.target_seconds)
+        result = UploadResult(success=True)
+        pending = {}   # future -> (n° de chunk, chunk, tentative, compression)
+        offset = 0
+        index = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="upload") as executor:
+            while True:
+                # Nouveaux chunks tant que le parallélisme courant le permet (aucun après un échec définitif)
+                while result.error is None and offset < len(df) and len(pending) < tuner.parallel:
+                    chunk = df.iloc[offset:offset + tuner.chunk_rows]
+                    offset += len(chunk)
+                    compression = tuner.next_compression()
+                    pending[executor.submit(self._write, chunk, table, compression)] = (index, chunk, 0, compression)
+                    index += 1
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    number, chunk, attempt, compression = pending.pop(future)
+                    try:
+                        seconds = future.result()
+                    except Exception as e:
+                        tuner.failed()
+                        if attempt < self.max_retries and result.error is None:
+                            delay = backoff_delay(attempt)
+                            result.retries += 1
+                            print(f"⚠️ Chunk {number} en échec ({e}) : tentative {attempt + 2} dans {delay:.1f}s")
+                            retry = executor.submit(self._write, chunk, table, compression, delay)
+                            pending[retry] = (number, chunk, attempt + 1, compression)
+                        elif result.error is None:
+                            result.error = f"chunk {number} en échec après {attempt + 1} tentative(s) : {e}"
+                        continue
+                    result.rows += len(chunk)
+                    result.chunks += 1
+                    tuner.observe(len(chunk), seconds, compression)
+
+        result.success = result.error is None
+        result.seconds = time.perf_counter() - start
+        result.chunk_rows, result.parallel, result.compression = tuner.chunk_rows, tuner.parallel, tuner.compression
+        return result
+
+
+def upload_chunked(df: pd.DataFrame, table: str, **options) -> UploadResult:
+    return ChunkedUploader(**options).upload(df, table)
@@ -0,0 +1,184 @@
+# load/dedup.py
+"""
+Dédoublonnage vectorisé par empreinte 64 bits de la clé métier, et index
+persistant des empreintes déjà chargées, partitionné par mois de prise en charge,
+pour écarter les doublons entre fichiers avant l'upload.
+L'empreinte est aussi persistée dans RAW (colonne ROW_FINGERPRINT) : clé du
+MERGE, du contrôle des doublons et du snapshot dbt, calculée une seule fois.
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from type_plan import to_frame
+
+PICKUP_COLUMN = "TPEP_PICKUP_DATETIME"
+# Empreinte persistée par ligne (uint64 stocké en BIGINT signé, même motif binaire)
+FINGERPRINT_COLUMN = "ROW_FINGERPRINT"
+
+
+def _normalised_column(series: pd.Series) -> np.ndarray:
+    """
+    Représentation stable d'une colonne clé, indépendante du dtype du fichier
+    (int32/int64/float64, datetime ns/us) : sinon deux fichiers donneraient
+    des empreintes différentes pour la même ligne.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy(dtype="datetime64[us]").view("int64")
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype="float64", na_value=np.nan)
+    return series.astype("string").to_numpy(dtype=object, na_value=None)
+
+
+def row_fingerprints(df: pd.DataFrame, keys: list) -> np.ndarray:
+    """Empreinte uint64 par ligne calculée sur les colonnes keys (hash vectorisé)."""
+    normalised = pd.DataFrame({col: _normalised_column(df[col]) for col in keys})
+    return pd.util.hash_pandas_object(normalised, index=False).to_numpy(dtype=np.uint64)
+
+
+def stored_fingerprints(fingerprints: np.ndarray) -> np.ndarray:
+    """Empreintes uint64 -> int64 (BIGINT entrepôt), sans copie ni perte."""
+    return fingerprints.view(np.int64)
+
+
+def with_fingerprints(df: pd.DataFrame, fingerprints: np.ndarray) -> pd.DataFrame:
+    """Ajoute (ou remplace) la colonne ROW_FINGERPRINT d'un DataFrame déjà filtré."""
+    df[FINGERPRINT_COLUMN] = stored_fingerprints(fingerprints)
+    return df
+
+
+def append_arrow_fingerprints(data, keys: list):
+    """
+    Table/RecordBatch typé + colonne ROW_FINGERPRINT (chargement par stage) :
+    mêmes valeurs que row_fingerprints sur le DataFrame équivalent.
+    """
+    fingerprints = row_fingerprints(to_frame(data.select(keys)), keys)
+    return data.append_column(pa.field(FINGERPRINT_COLUMN, pa.int64()),
+                              pa.array(stored_fingerprints(fingerprints)))
+
+
+def pickup_month_codes(df: pd.DataFrame, column: str = PICKUP_COLUMN) -> np.ndarray:
+    """Mois de prise en charge de chaque ligne (code numpy datetime64[M] en int64)."""
+    return df[column].to_numpy(dtype="datetime64[us]").astype("datetime64[M]").view("int64")
+
+
+def first_occurrence_mask(fingerprints: np.ndarray) -> np.ndarray:
+    """True pour la première occurrence de chaque empreinte (équivalent drop_duplicates keep='first')."""
+    return ~pd.Series(fingerprints).duplicated(keep="first").to_numpy()
+
+
+def month_label(code: int) -> str:
+    return str(np.datetime64(int(code), "M"))
+
+
+class FileFingerprints:
+    """
+    Empreintes déjà chargées d'un fichier (mode streaming) et leur mois, en runs triés :
+    un run est fusionné avec le précédent tant que celui-ci n'est pas plus grand, d'où au
+    plus log2(n) runs et O(log n) fusions par empreinte, au lieu d'un re-tri du tableau
+    accumulé à chaque batch. Mémoire : 16 octets par ligne chargée, croissante avec le fichier.
+    """
+
+    def __init__(self):
+        self._runs = []     # [(empreintes triées, mois alignés)], tailles décroissantes
+
+    def __len__(self) -> int:
+        return sum(len(fingerprints) for fingerprints, _ in self._runs)
+
+    def contains(self, fingerprints: np.ndarray) -> np.ndarray:
+        """Masque booléen : empreinte déjà chargée depuis ce fichier."""
+        found = np.zeros(len(fingerprints), dtype=bool)
+        for run, _ in self._runs:
+            positions = np.searchsorted(run, fingerprints)
+            positions[positions == len(run)] = 0
+            found |= run[positions] == fingerprints
+        return found
+
+    def add(self, fingerprints: np.ndarray, months: np.ndarray):
+        """Ajoute des empreintes distinctes et absentes (sortie de deduplicate)."""
+        if not len(fingerprints):
+            return
+        while self._runs and len(self._runs[-1][0]) <= len(fingerprints):
+            previous_fingerprints, previous_months = self._runs.pop()
+            fingerprints = np.concatenate([previous_fingerprints, fingerprints])
+            months = np.concatenate([previous_months, months])
+        # Tri stable (timsort) : les runs déjà triés sont fusionnés en temps linéaire
+        order = np.argsort(fingerprints, kind="stable")
+        self._runs.append((fingerprints[order], months[order]))
+
+    def arrays(self) -> tuple:
+        """(empreintes, mois) de toutes les lignes chargées, pour commit_fingerprints."""
+        if not self._runs:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+        return (np.concatenate([fingerprints for fingerprints, _ in self._runs]),
+                np.concatenate([months for _, months in self._runs]))
+
+
+class FingerprintIndex:
+    """
+    Index persistant des empreintes chargées : un tableau uint64 trié par mois
+    (fichier <root>/<YYYY-MM>.npy), chargé à la demande et interrogé par
+    recherche dichotomique vectorisée. Les ajouts restent en mémoire jusqu'à save().
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._partitions = {}
+        self._dirty = set()
+
+    def _path(self, code: int) -> Path:
+        return self.root / f"{month_label(code)}.npy"
+
+    def _partition(self, code: int) -> np.ndarray:
+        if code not in self._partitions:
+            path = self._path(code)
+            self._partitions[code] = np.load(path) if path.exists() else np.empty(0, dtype=np.uint64)
+        return self._partitions[code]
+
+    def contains(self, fingerprints: np.ndarray, months: np.ndarray) -> np.ndarray:
+        """Masque booléen : empreinte déjà présente dans l'index."""
+        found = np.zeros(len(fingerprints), dtype=bool)
+        for code in np.unique(months):
+            partition = self._partition(int(code))
+            if not len(partition):
+                continue
+            rows = np.flatnonzero(months == code)
+            positions = np.searchsorted(partition, fingerprints[rows])
+            positions[positions == len(partition)] = 0
+            found[rows] = partition[positions] == fingerprints[rows]
+        return found
+
+    def add(self, fingerprints: np.ndarray, months: np.ndarray):
+        for code in np.unique(months):
+            code = int(code)
+            new = fingerprints[months == code]
+            self._partitions[code] = np.union1d(self._partition(code), new)
+            self._dirty.add(code)
+
+    def replace(self, fingerprints: np.ndarray, months: np.ndarray):
+        """Remplace entièrement les partitions des mois présents (rechargement d'un mois)."""
+        for code in np.unique(months):
+            code = int(code)
+            self._partitions[code] = np.unique(fingerprints[months == code])
+            self._dirty.add(code)
+
+    def save(self):
+        """Écrit les partitions modifiées (écriture atomique)."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        for code in sorted(self._dirty):
+            path = self._path(code)
+            tmp_path = path.with_suffix(".tmp.npy")
+            np.save(tmp_path, self._partitions[code])
+            os.replace(tmp_path, path)
+        self._dirty.clear()
+
+    def reset(self):
+        """Supprime l'index (ex. après un vidage manuel de la table finale)."""
+        self._partitions.clear()
+        self._dirty.clear()
+        if self.root.exists():
+            for path in self.root.glob("*.npy"):
+                path.unlink()
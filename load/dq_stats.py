@@ -0,0 +1,247 @@
+# load/dq_stats.py
+"""
+Statistiques de qualité calculées pendant l'ingestion, sans relire la table :
+chaque fichier produit ses compteurs (lignes, doublons écartés, NULL par colonne)
+et des statistiques additives (n, somme, somme des carrés, min, max) sur
+quelques colonnes numériques. Elles sont conservées par fichier (et mois) dans
+un JSON, puis combinées en statistiques de table.
+Une requête unique côté entrepôt (reconcile_query) permet de les vérifier.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dedup import FINGERPRINT_COLUMN
+
+# Colonnes suivies (valeurs numériques ; les timestamps sont suivis en min/max)
+NUMERIC_COLUMNS = ["TRIP_DISTANCE", "TOTAL_AMOUNT", "FARE_AMOUNT", "TIP_AMOUNT", "PASSENGER_COUNT"]
+PICKUP_COLUMN = "TPEP_PICKUP_DATETIME"
+# Clé des groupes de doublons : empreinte persistée de la clé métier (même clé que le MERGE)
+DUPLICATE_GROUP_KEYS = [FINGERPRINT_COLUMN, "TPEP_PICKUP_DATETIME"]
+
+
+class ColumnStats:
+    """Statistiques additives d'une colonne numérique : combinables sans relire les données."""
+
+    def __init__(self, count=0, total=0.0, total_sq=0.0, minimum=None, maximum=None):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def observe(self, values: np.ndarray):
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.merge(ColumnStats(int(len(values)), float(values.sum()), float(np.square(values).sum()),
+                               float(values.min()), float(values.max())))
+
+    def merge(self, other: "ColumnStats"):
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        if other.minimum is not None:
+            self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+        if other.maximum is not None:
+            self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def stddev(self):
+        if not self.count:
+            return None
+        variance = max(self.total_sq / self.count - self.mean ** 2, 0.0)
+        return variance ** 0.5
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "sum": self.total, "sum_sq": self.total_sq,
+                "min": self.minimum, "max": self.maximum}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ColumnStats":
+        return cls(data["count"], data["sum"], data["sum_sq"], data["min"], data["max"])
+
+
+class FileStats:
+    """Statistiques d'un fichier source, alimentées lot par lot pendant l'ingestion."""
+
+    def __init__(self, source: str, month: str = None):
+        self.source = source
+        self.month = month
+        self.rows_read = 0
+        self.rows_loaded = 0
+        # Lignes écartées par la pré-validation (prevalidation.py), par règle
+        self.rejected = 0
+        self.rejects_by_rule = {}
+        self.in_file_duplicates = 0
+        self.cross_file_duplicates = 0
+        self.nulls = {}
+        self.columns = {col: ColumnStats() for col in NUMERIC_COLUMNS}
+        self.pickup_min = None
+        self.pickup_max = None
+
+    def observe_columns(self, columns: dict, rows: int):
+        """
+        Ajoute un lot chargé : columns = {COLONNE: tableau numpy} (NaN / NaT pour NULL),
+        commun aux DataFrames pandas et aux batches Arrow.
+        """
+        self.rows_loaded += rows
+        for name, values in columns.items():
+            missing = pd.isna(values)
+            self.nulls[name] = self.nulls.get(name, 0) + int(missing.sum())
+
+            if name in self.columns:
+                self.columns[name].observe(values.astype("float64"))
+            elif name == PICKUP_COLUMN and (~missing).any():
+                present = values[~missing]
+                first, last = str(present.min()), str(present.max())
+                self.pickup_min = first if self.pickup_min is None else min(self.pickup_min, first)
+                self.pickup_max = last if self.pickup_max is None else max(self.pickup_max, last)
+
+    def observe_frame(self, df):
+        """Lot pandas (colonnes en majuscules)."""
+        columns = {}
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+                columns[col] = series.to_numpy(dtype="float64", na_value=np.nan)
+            elif pd.api.types.is_datetime64_any_dtype(series):
+                columns[col] = series.to_numpy()
+            else:
+                columns[col] = series.to_numpy(dtype=object, na_value=None)
+        self.observe_columns(columns, len(df))
+
+    def observe_arrow(self, batch):
+        """Lot Arrow (RecordBatch typé) : conversion colonne par colonne, sans pandas."""
+        columns = {}
+        for name, array in zip(batch.schema.names, batch.columns):
+            values = array.to_numpy(zero_copy_only=False)
+            if values.dtype.kind in "iub":
+                values = values.astype("float64")
+            columns[name] = values
+        self.observe_columns(columns, batch.num_rows)
+
+    def to_dict(self) -> dict:
+        return {
+            "month": self.month,
+            "rows_read": self.rows_read,
+            "rows_loaded": self.rows_loaded,
+            "rejected": self.rejected,
+            "rejects_by_rule": self.rejects_by_rule,
+            "in_file_duplicates": self.in_file_duplicates,
+            "cross_file_duplicates": self.cross_file_duplicates,
+            "nulls": self.nulls,
+            "columns": {name: stats.to_dict() for name, stats in self.columns.items()},
+            "pickup_min": self.pickup_min,
+            "pickup_max": self.pickup_max,
+            "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+
+class DQStatsStore:
+    """
+    Statistiques par fichier dans un JSON {nom_fichier: FileStats.to_dict()}.
+    Un fichier rechargé remplace son entrée (pas de double comptage).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Statistiques DQ illisibles ({e}), reconstruites au fil des runs")
+
+    def record(self, stats: FileStats):
+        with self._lock:
+            self.entries[stats.source] = stats.to_dict()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self.entries, indent=2, sort_keys=True), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+
+    def by_month(self) -> dict:
+        """Lignes chargées par mois de fichier."""
+        months = {}
+        for entry in self.entries.values():
+            key = entry.get("month") or "?"
+            months[key] = months.get(key, 0) + entry["rows_loaded"]
+        return dict(sorted(months.items()))
+
+    def table_stats(self) -> dict:
+        """
+        Statistiques de table combinées (mêmes clés que le rapport post-ingestion).
+        ROWS_LOADED cumule les lignes chargées par fichier : une ligne mise à jour par le
+        MERGE (doublon entre fichiers) ou supprimée par un remplacement y reste comptée.
+        Le nombre de lignes de la table (TOTAL_ROWS) est lu dans l'entrepôt.
+        """
+        distance = ColumnStats()
+        nulls = {}
+        rows_loaded = duplicates = rejected = 0
+        for entry in self.entries.values():
+            rows_loaded += entry["rows_loaded"]
+            rejected += entry.get("rejected", 0)
+            duplicates += entry["in_file_duplicates"] + entry["cross_file_duplicates"]
+            distance.merge(ColumnStats.from_dict(entry["columns"]["TRIP_DISTANCE"]))
+            for col, count in entry["nulls"].items():
+                nulls[col] = nulls.get(col, 0) + count
+        return {
+            "ROWS_LOADED": rows_loaded,
+            "DUPLICATES_REMOVED": duplicates,
+            "REJECTED_ROWS": rejected,
+            "MIN_DISTANCE": distance.minimum,
+            "MAX_DISTANCE": distance.maximum,
+            "AVG_DISTANCE": distance.mean,
+            "NULL_COUNTS": nulls,
+        }
+
+
+def reconcile_query(table: str, buffer_table: str) -> str:
+    """
+    Contrôle de réconciliation en une seule lecture de la table : total, groupes
+    de doublons (agrégation sur l'empreinte, pas sur les colonnes de la clé),
+    statistiques de distance et taille du buffer. Les lignes sans empreinte
+    (chargées avant ROW_FINGERPRINT, cf. backfill_fingerprints.py) ne forment pas de groupe.
+    """
+    keys = ", ".join(DUPLICATE_GROUP_KEYS)
+    return f"""
+        WITH groups AS (
+            SELECT {FINGERPRINT_COLUMN}, COUNT(*) AS c, MIN(TRIP_DISTANCE) AS min_d, MAX(TRIP_DISTANCE) AS max_d,
+                   SUM(TRIP_DISTANCE) AS sum_d, COUNT(TRIP_DISTANCE) AS n_d
+            FROM {table}
+            GROUP BY {keys}
+        )
+        SELECT SUM(c) AS TOTAL_ROWS,
+               COUNT_IF(c > 1 AND {FINGERPRINT_COLUMN} IS NOT NULL) AS DUPLICATE_GROUPS,
+               (SELECT COUNT(*) FROM {buffer_table}) AS BUFFER_ROWS,
+               MIN(min_d) AS MIN_DISTANCE,
+               MAX(max_d) AS MAX_DISTANCE,
+               SUM(sum_d) / NULLIF(SUM(n_d), 0) AS AVG_DISTANCE
+        FROM groups
+    """
+
+
+RECONCILE_COLUMNS = ["TOTAL_ROWS", "DUPLICATE_GROUPS", "BUFFER_ROWS", "MIN_DISTANCE", "MAX_DISTANCE", "AVG_DISTANCE"]
+
+
+def compare(local: dict, warehouse: dict, tolerance: float = 1e-6) -> list:
+    """Écarts entre statistiques locales et entrepôt : [(clé, local, entrepôt)]."""
+    mismatches = []
+    for key in ("TOTAL_ROWS", "MIN_DISTANCE", "MAX_DISTANCE", "AVG_DISTANCE"):
+        left, right = local.get(key), warehouse.get(key)
+        if left is None or right is None:
+            continue
+        if abs(float(left) - float(right)) > tolerance * max(1.0, abs(float(right))):
+            mismatches.append((key, left, right))
+    return mismatches
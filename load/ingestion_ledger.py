@@ -0,0 +1,203 @@
+# load/ingestion_ledger.py
+"""
+Registre local des fichiers ingérés : un run ne traite que les fichiers
+nouveaux ou modifiés, reprend ceux restés en échec, et peut être forcé
+(--force) ou restreint à certains mois (--months).
+Clé d'un fichier : nom + hash du contenu + nombre de lignes + empreinte du schéma.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+PENDING = "pending"
+LOADED = "loaded"
+MERGED = "merged"
+FAILED = "failed"
+
+# Manifest écrit par extract/download_parquet.py (MD5 déjà calculé au téléchargement)
+DOWNLOAD_MANIFEST = "_manifest.json"
+MONTH_PATTERN = re.compile(r"(\d{4}-\d{2})")
+
+
+def file_md5(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def file_month(path: Path):
+    """yellow_tripdata_2024-01.parquet -> '2024-01' (None si absent du nom)."""
+    match = MONTH_PATTERN.search(Path(path).name)
+    return match.group(1) if match else None
+
+
+class IngestionLedger:
+    """
+    Registre JSON {nom_fichier: {content_hash, size, mtime, row_count,
+    schema_fingerprint, state, updated_at, error}}, écrit de manière atomique.
+    Le hash n'est recalculé que si la taille ou la date de modification change
+    (ou repris du manifest de téléchargement quand il correspond).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Ledger illisible ({e}), tous les fichiers seront retraités")
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.entries, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def _download_md5(self, path: Path, stat) -> str:
+        manifest_path = path.parent / DOWNLOAD_MANIFEST
+        if not manifest_path.exists():
+            return None
+        try:
+            entry = json.loads(manifest_path.read_text(encoding="utf-8")).get(path.name, {})
+        except (OSError, ValueError):
+            return None
+        if entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime_ns:
+            return entry.get("md5")
+        return None
+
+    def identify(self, path: Path) -> dict:
+        """Identité courante du fichier (hash, taille, lignes et schéma lus dans le footer)."""
+        path = Path(path)
+        stat = path.stat()
+        previous = self.entries.get(path.name, {})
+        if previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime_ns:
+            content_hash = previous.get("content_hash")
+        else:
+            content_hash = self._download_md5(path, stat) or file_md5(path)
+
+        metadata = pq.read_metadata(path)
+        schema = metadata.schema.to_arrow_schema()
+        schema_text = ",".join(f"{field.name.upper()}:{field.type}" for field in schema)
+        return {
+            "content_hash": content_hash,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "row_count": metadata.num_rows,
+            "schema_fingerprint": hashlib.sha1(schema_text.encode("utf-8")).hexdigest(),
+        }
+
+    def status(self, path: Path):
+        """(à traiter ?, raison)"""
+        path = Path(path)
+        previous = self.entries.get(path.name)
+        if previous is None:
+            return True, "nouveau"
+        if previous.get("state") != MERGED:
+            return True, f"reprise ({previous.get('state')})"
+        current = self.identify(path)
+        for key in ("content_hash", "row_count", "schema_fingerprint"):
+            if previous.get(key) != current[key]:
+                return True, f"modifié ({key})"
+        return False, "déjà fusionné"
+
+    def select(self, files: list, force: bool = False, months: list = None) -> list:
+        """Fichiers à traiter parmi files, selon le registre, --force et --months."""
+        selected = []
+        for f in files:
+            if months and file_month(f) not in months:
+                continue
+            todo, reason = (True, "forcé") if force else self.status(f)
+            print(f"   - {Path(f).name} : {reason}")
+            if todo:
+                selected.append(f)
+        return selected
+
+    def mark(self, path: Path, state: str, error: str = None):
+        """Met à jour l'état d'un fichier (l'identité est recalculée au passage à PENDING)."""
+        path = Path(path)
+        with self._lock:
+            entry = self.entries.get(path.name, {})
+            if state == PENDING or "content_hash" not in entry:
+                entry.update(self.identify(path))
+            entry["state"] = state
+            entry["error"] = error
+            entry["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.entries[path.name] = entry
+            self._save()
+
+    def reidentify(self, path: Path, content_hash: str, row_count: int) -> bool:
+        """
+        Fichier réécrit sans changement de lignes (catalogue parquet_catalog.py) : connu
+        sous content_hash et row_count, il prend l'identité du fichier réécrit, état
+        conservé. Renvoie True si l'entrée a été reprise.
+        """
+        path = Path(path)
+        with self._lock:
+            entry = self.entries.get(path.name)
+            if entry is None or entry.get("content_hash") != content_hash or entry.get("row_count") != row_count:
+                return False
+            entry.update(self.identify(path))
+            entry["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self._save()
+        return True
+
+    def has_state(self, state: str) -> bool:
+        return any(entry.get("state") == state for entry in self.entries.values())
+
+    def sync_to_warehouse(self, execute, table: str = "INGESTION_LEDGER"):
+        """
+        Réplique le registre dans une table de l'entrepôt (MERGE sur FILE_NAME).
+        Colonnes du VALUES nommées par alias : syntaxe commune à Snowflake et DuckDB.
+        """
+        if not self.entries:
+            return
+        execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                FILE_NAME VARCHAR, CONTENT_HASH VARCHAR, ROW_COUNT NUMBER,
+                SCHEMA_FINGERPRINT VARCHAR, STATE VARCHAR, UPDATED_AT TIMESTAMP_NTZ, ERROR VARCHAR
+            )
+        """)
+        values = ",\n".join(
+            "({})".format(", ".join(_sql_literal(v) for v in (
+                name, entry.get("content_hash"), entry.get("row_count"),
+                entry.get("schema_fingerprint"), entry.get("state"),
+                entry.get("updated_at"), entry.get("error"),
+            )))
+            for name, entry in sorted(self.entries.items())
+        )
+        execute(f"""
+            MERGE INTO {table} AS target
+            USING (
+                SELECT FILE_NAME, CONTENT_HASH, ROW_COUNT, SCHEMA_FINGERPRINT, STATE,
+                       UPDATED_AT::TIMESTAMP_NTZ AS UPDATED_AT, ERROR
+                FROM (VALUES {values})
+                    AS v (FILE_NAME, CONTENT_HASH, ROW_COUNT, SCHEMA_FINGERPRINT, STATE, UPDATED_AT, ERROR)
+            ) AS source
+            ON target.FILE_NAME = source.FILE_NAME
+            WHEN MATCHED THEN UPDATE SET
+                CONTENT_HASH = source.CONTENT_HASH, ROW_COUNT = source.ROW_COUNT,
+                SCHEMA_FINGERPRINT = source.SCHEMA_FINGERPRINT, STATE = source.STATE,
+                UPDATED_AT = source.UPDATED_AT, ERROR = source.ERROR
+            WHEN NOT MATCHED THEN INSERT
+                (FILE_NAME, CONTENT_HASH, ROW_COUNT, SCHEMA_FINGERPRINT, STATE, UPDATED_AT, ERROR)
+            VALUES (source.FILE_NAME, source.CONTENT_HASH, source.ROW_COUNT, source.SCHEMA_FINGERPRINT,
+                    source.STATE, source.UPDATED_AT, source.ERROR)
+        """)
+
+
+def _sql_literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
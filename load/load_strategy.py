@@ -0,0 +1,130 @@
+# load/load_strategy.py
+"""
+Stratégies d'écriture du buffer vers la table finale :
+  - merge   : MERGE sur la clé métier (historique), coût proportionnel à la table entière
+  - replace : le fichier remplace sa fenêtre de prise en charge (un mois) :
+              DELETE des lignes de la fenêtre qu'il avait chargées (SOURCE_FILE)
+              + MERGE du buffer restreint à la fenêtre, dans une même transaction.
+              Les lignes de la fenêtre chargées depuis d'autres fichiers (dates
+              hors mois d'un autre fichier) sont conservées.
+              Un fichier dont les lignes débordent sur plusieurs mois retombe
+              sur un MERGE restreint à sa plage de dates.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+MERGE = "merge"
+REPLACE = "replace"
+STRATEGIES = (MERGE, REPLACE)
+
+PICKUP_COLUMN = "TPEP_PICKUP_DATETIME"
+# Provenance de chaque ligne : dernier fichier source qui l'a chargée (ou mise à jour)
+SOURCE_COLUMN = "SOURCE_FILE"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+@dataclass
+class PickupWindow:
+    """
+    Plage [first, last] des dates de prise en charge d'un fichier.
+    Fenêtre remplacée/filtrée : le mois entier si la plage tient dans un mois,
+    sinon la plage exacte.
+    """
+    first: pd.Timestamp
+    last: pd.Timestamp
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, column: str = PICKUP_COLUMN):
+        """Plage des lignes du DataFrame (None si vide ou sans date)."""
+        pickups = df[column].dropna()
+        if pickups.empty:
+            return None
+        return cls(pd.Timestamp(pickups.min()), pd.Timestamp(pickups.max()))
+
+    def union(self, other: "PickupWindow") -> "PickupWindow":
+        if other is None:
+            return self
+        return PickupWindow(min(self.first, other.first), max(self.last, other.last))
+
+    @property
+    def single_month(self) -> bool:
+        return self.first.to_period("M") == self.last.to_period("M")
+
+    @property
+    def start(self) -> datetime:
+        if self.single_month:
+            return self.first.to_period("M").to_timestamp().to_pydatetime()
+        return self.first.to_pydatetime()
+
+    @property
+    def end(self) -> datetime:
+        """Borne exclue."""
+        if self.single_month:
+            return (self.first.to_period("M") + 1).to_timestamp().to_pydatetime()
+        return (self.last + timedelta(microseconds=1)).to_pydatetime()
+
+    def predicate(self, alias: str = None) -> str:
+        column = f"{alias}.{PICKUP_COLUMN}" if alias else PICKUP_COLUMN
+        return (f"{column} >= '{self.start.strftime(TIMESTAMP_FORMAT)}' "
+                f"AND {column} < '{self.end.strftime(TIMESTAMP_FORMAT)}'")
+
+    def label(self) -> str:
+        if self.single_month:
+            return self.start.strftime("%Y-%m")
+        return f"{self.start:%Y-%m-%d %H:%M:%S} → {self.end:%Y-%m-%d %H:%M:%S}"
+
+
+def footer_window(path, column: str = PICKUP_COLUMN):
+    """
+    Plage des dates de prise en charge lue dans les statistiques du footer parquet
+    (sans lire les données). None si les statistiques sont absentes.
+    """
+    metadata = pq.read_metadata(path)
+    first = last = None
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            chunk = row_group.column(j)
+            if chunk.path_in_schema.upper() != column:
+                continue
+            stats = chunk.statistics
+            if stats is None or not stats.has_min_max:
+                return None
+            first = stats.min if first is None else min(first, stats.min)
+            last = stats.max if last is None else max(last, stats.max)
+    if first is None:
+        return None
+    return PickupWindow(pd.Timestamp(first), pd.Timestamp(last))
+
+
+def with_source(df: pd.DataFrame, source_file: str) -> pd.DataFrame:
+    """Ajoute (ou remplace) la colonne SOURCE_FILE d'un DataFrame prêt à charger."""
+    df[SOURCE_COLUMN] = source_file
+    return df
+
+
+def build_replace_statements(table_final: str, table_buffer: str, window: PickupWindow,
+                             source_file: str, merge_sql: str) -> list:
+    """
+    DELETE des lignes de la fenêtre chargées par source_file, MERGE du buffer restreint
+    à la fenêtre (merge_sql) puis vidage du buffer (à exécuter dans une transaction).
+    Les lignes absentes de la nouvelle version du fichier disparaissent ; celles d'autres
+    fichiers (ou sans provenance, chargées avant SOURCE_FILE) sont mises à jour ou
+    conservées, jamais dupliquées.
+    """
+    source_literal = source_file.replace("'", "''")
+    return [
+        f"DELETE FROM {table_final} WHERE {window.predicate()} AND {SOURCE_COLUMN} = '{source_literal}'",
+        merge_sql,
+        f"TRUNCATE TABLE {table_buffer}",
+    ]
+
+
+def affected_rows(result: list, position: int = 0):
+    """Nombre de lignes renvoyé par un DML (Snowflake : une ligne de compteurs)."""
+    if not result or len(result[0]) <= position:
+        return None
+    return result[0][position]
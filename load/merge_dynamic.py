@@ -1,11 +1,14 @@
-import os
 from pathlib import Path
+import argparse
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 from dotenv import load_dotenv
-import snowflake.connector
-from snowflake.connector.pandas_tools import write_pandas
 import logging
 import csv
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 # --- allow root-level imports when executed from GitHub Actions ---
@@ -13,55 +16,57 @@ import sys
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT))
 
-from checks.writer_report_xlsx import save_ingestion_report_xlsx
-from snowflake_utils import execute_sql
-
+from checks.run_history import apply_retention, record_run
+from chunked_upload import UploadResult, upload_chunked
+from backends import BACKENDS, DuckDBBackend, get_backend, set_backend
+from snowflake_utils import close_pool, execute_in_transaction, execute_sql
+from dq_stats import RECONCILE_COLUMNS, DQStatsStore, FileStats, compare, reconcile_query
+from dedup import (
+    FINGERPRINT_COLUMN, FileFingerprints, FingerprintIndex, first_occurrence_mask, pickup_month_codes, row_fingerprints,
+    with_fingerprints,
+)
+from ingestion_ledger import FAILED, LOADED, MERGED, PENDING, IngestionLedger, file_month
+from load_strategy import (
+    MERGE, REPLACE, STRATEGIES, PickupWindow, affected_rows, build_replace_statements, footer_window, with_source,
+)
+from migrate_timestamps import require_migrated
+from parallel_ingest import BufferSlots, PreparedFile, prepare_file
+from parquet_catalog import ParquetCatalog, PickupSelection
+from prevalidation import DEFAULT_QUARANTINE_DIR, DROP, MODES, FilePrevalidation, Prevalidator
+from projection import ProjectionPlan, load_projection, projected_columns
+from schema_registry import SchemaRegistry
+from telemetry import record_span, span, start_run, timed_iter
+from stage_loader import (
+    TARGET_CHUNK_MB,
+    FileLoadResult,
+    StageEngine,
+    checked_results,
+    source_name_for_chunk,
+    unified_schema,
+    write_stage_chunks,
+)
+from type_plan import apply_type_plan, read_frame, snowflake_type, to_frame
 
-# 1️⃣ Chargement des variables d'environnement
-load_dotenv()
 
-# 2️⃣ Création du dossier logs si nécessaire
+# Import sans effet de bord : variables d'environnement (.env), dossier logs et
+# logging sont initialisés par main() ; les connexions sont ouvertes à la demande
+# par le pool de snowflake_utils, réutilisées d'une requête à l'autre.
 LOG_DIR = Path(__file__).parent / "logs"
-LOG_DIR.mkdir(parents=True, exist_ok=True)
 LOG_FILE = LOG_DIR / "merge_pipeline.log"
 
-# 3️⃣ Setup du logging
-try:
-    logging.basicConfig(
-        filename=LOG_FILE,
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
-except Exception as e:
-    print(f"⚠️ Logging setup failed: {e}")
-
-
-# Récupération des variables d'environnement
-sf_user = os.getenv("SNOWFLAKE_USER")
-sf_password = os.getenv("SNOWFLAKE_PASSWORD")
-sf_account = os.getenv("SNOWFLAKE_ACCOUNT")
-sf_warehouse = os.getenv("SNOWFLAKE_WAREHOUSE")
-sf_database = os.getenv("SNOWFLAKE_DATABASE")
-sf_schema = os.getenv("SNOWFLAKE_SCHEMA")
-sf_role = os.getenv("SNOWFLAKE_ROLE")
-
-""" # Fusion account + organization si org existe
-if sf_org:
-    sf_account_full = f"{sf_account}.{sf_org}"
-else:
-    sf_account_full = sf_account """
-
-# 4️⃣ Connexion Snowflake
-conn = snowflake.connector.connect(
-    user=sf_user,
-    password=sf_password,
-    account=sf_account,
-    warehouse=sf_warehouse,
-    database=sf_database,
-    schema=sf_schema,
-    role=sf_role
-)
-cursor = conn.cursor()
+
+def configure_logging():
+    """Création du dossier logs et logging fichier (lancement en ligne de commande)."""
+    try:
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        logging.basicConfig(
+            filename=LOG_FILE,
+            level=logging.INFO,
+            format='%(asctime)s - %(levelname)s - %(message)s'
+        )
+    except Exception as e:
+        print(f"⚠️ Logging setup failed: {e}")
+
 
 # 5️⃣ Fonctions auxiliaires (map_dtype, create_table_if_not_exists, update_table_schema...)
 
@@ -93,133 +98,806 @@ def map_dtype(dtype: str, verbose: bool =False) -> str:
 
     return sf_type
 
-# Création de la table si elle n'existe pas
-def create_table_if_not_exists(df, table_name, verbose: bool =False):
-    cols = []
-    for col in df.columns:
-        pandas_dtype = str(df[col].dtype)
-        snowflake_type = map_dtype(pandas_dtype, verbose=verbose)
-        cols.append(f'"{col.upper()}" {snowflake_type}')
+# Registre des schémas de tables, partagé pendant tout le run
+schema_registry = SchemaRegistry(execute_sql)
+
+
+def target_schema(df: pd.DataFrame) -> dict:
+    """{COLONNE: type Snowflake} : plan de types (type_plan.py), sinon déduit du dtype pandas."""
+    return {
+        col.upper(): snowflake_type(col) or map_dtype(str(df[col].dtype))
+        for col in df.columns
+    }
 
-    columns_definition = ", ".join(cols)
-    sql = f'CREATE TABLE IF NOT EXISTS {table_name} ({columns_definition})'
 
+# Création de la table si elle n'existe pas
+def create_table_if_not_exists(df, table_name, verbose: bool =False):
+    """CREATE TABLE IF NOT EXISTS, sans requête si la table est déjà connue du registre."""
     if verbose:
-        print(f"[🛠️ SQL] {sql}")
-
-    execute_sql(sql)
-
-# Mise à jour du schéma si colonnes manquantes
-#def update_table_schema(df: pd.DataFrame, table_name: str, verbose: bool = False):
-#    try:
-#        existing_cols = [row[0].upper() for row in execute_sql(f"DESC TABLE {table_name}")]
-#    except:
-#        existing_cols = []
-#    for col in df.columns:
-#        if col.upper() not in existing_cols:
-#            pandas_dtype = str(df[col].dtype)
-#            snowflake_type = map_dtype(pandas_dtype, verbose=verbose)
-#            sql = f'ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {col.upper()} {snowflake_type}'
-#            execute_sql(sql)
-# Assure-toi que map_dtype(dtype, verbose=False) est définie plus haut
-# Assure-toi que execute_sql(sql) est définie et renvoie cursor.fetchall()
+        for col in df.columns:
+            map_dtype(str(df[col].dtype), verbose=True)
+    if schema_registry.columns(table_name) is None:
+        schema_registry.ensure(table_name, target_schema(df), verbose=verbose)
+
 
 def get_existing_columns_and_types(table_name: str):
     """
     Retourne un dict {COLUMN_NAME: DATA_TYPE} pour la table donnée (nom TABLE_SCHEMA.TABLE_NAME attendu
     ou juste TABLE_NAME si le schema par défaut est correctement configuré dans la connexion).
+    Lu depuis le registre (INFORMATION_SCHEMA interrogé une seule fois par run).
     """
+    return schema_registry.columns(table_name) or {}
 
-    # Normalisation SCHEMA + TABLE
-    if '.' not in table_name:
-        schema = os.getenv('SNOWFLAKE_SCHEMA').upper()
-        table = table_name.upper()
-    else:
-        parts = table_name.split('.')
-        if len(parts) == 2:
-            schema, table = parts[0].upper(), parts[1].upper()
-        else:
-            raise ValueError("table_name doit être 'TABLE' ou 'SCHEMA.TABLE'")
-        
-    # On interroge INFORMATION_SCHEMA pour avoir le type exact stocké en Snowflake
-    sql = f"""
-    SELECT COLUMN_NAME, DATA_TYPE
-    FROM INFORMATION_SCHEMA.COLUMNS
-    WHERE TABLE_NAME = '{table_name.split('.')[-1].upper()}'
-      AND TABLE_SCHEMA = '{os.getenv('SNOWFLAKE_SCHEMA').upper()}'
-    """
-    try:
-        rows = execute_sql(sql)
-        return {row[0].upper(): row[1].upper() for row in rows}
-    except Exception as e:
-        # Si la table n'existe pas ou autre, renvoie dict vide
-        print(f"⚠️ Warning getting columns for {table_name}: {e}")
-        return {}
 
 def update_table_schema(df: pd.DataFrame, table_name: str, verbose: bool = False):
     """
-    Compare les colonnes du DataFrame à la table Snowflake et ajoute les colonnes manquantes.
+    Compare les colonnes du DataFrame à la table Snowflake et ajoute les colonnes manquantes
+    en un seul ALTER TABLE. Le diff n'est calculé qu'une fois par schéma source distinct.
     - df: pandas.DataFrame (colonnes en lower_case recommandées)
     - table_name: chaîne, ex: "RAW.YELLOW_TAXI_TRIPS" ou "YELLOW_TAXI_TRIPS"
     - verbose: affiche des logs détaillés si True
     """
-    # Normaliser le nom de la table en majuscules si nécessaire
-    if '.' in table_name:
-        table_name_sql = table_name.upper()
+    schema_registry.ensure(table_name, target_schema(df), verbose=verbose)
+
+
+# 6️⃣ Traitement des fichiers parquet
+TABLE_FINAL = "YELLOW_TAXI_TRIPS_V2"
+TABLE_BUFFER = "BUFFER_YELLOW_TAXI_TRIPS_V2"
+
+# Clé métier, hachée une fois par ligne à l'ingestion (colonne ROW_FINGERPRINT)
+DEDUP_KEYS = [
+    "TPEP_PICKUP_DATETIME",
+    "TPEP_DROPOFF_DATETIME",
+    "VENDORID",
+    "PULOCATIONID",
+    "DOLOCATIONID",
+    "PASSENGER_COUNT",
+    "TOTAL_AMOUNT",
+    "TRIP_DISTANCE"
+]
+# Clé du MERGE : empreinte persistée + date de prise en charge (élagage des
+# micro-partitions, et une collision 64 bits devrait tomber sur la même microseconde)
+MERGE_KEYS = [FINGERPRINT_COLUMN, "TPEP_PICKUP_DATETIME"]
+
+# Index persistant des empreintes déjà chargées (dédoublonnage inter-fichiers)
+DEDUP_INDEX_DIR = Path(__file__).parent / "dedup_index"
+
+# Uploads simultanés par défaut en mode --workers
+DEFAULT_UPLOAD_CONCURRENCY = 4
+
+# Registre local des fichiers ingérés
+LEDGER_FILE = Path(__file__).parent / "ingestion_ledger.json"
+# Statistiques de qualité par fichier, calculées pendant l'ingestion
+DQ_STATS_FILE = Path(__file__).parent / "dq_stats.json"
+
+# Budget mémoire par défaut du mode streaming (Mo)
+DEFAULT_MEMORY_BUDGET_MB = 256
+# Nombre de fichiers source chargés par COPY INTO (backend stage)
+DEFAULT_STAGE_BATCH_FILES = 6
+# Facteur entre la taille non compressée parquet et l'empreinte réelle d'un batch
+# (batch Arrow + DataFrame pandas + copie dédoublonnée + sérialisation write_pandas)
+BATCH_MEMORY_FACTOR = 4
+
+
+def projection_plan(keep: list = None) -> ProjectionPlan:
+    """Projection dérivée du projet dbt ; la clé métier est toujours lue, keep : colonnes d'audit."""
+    return load_projection(required=DEDUP_KEYS, keep=keep)
+
+
+def buffer_source(table_buffer: str, dedup: bool = False) -> str:
+    """Buffer lu tel quel, ou dédoublonné sur MERGE_KEYS côté entrepôt."""
+    if not dedup:
+        return table_buffer
+    keys = ", ".join(MERGE_KEYS)
+    return (f"(SELECT * FROM {table_buffer} "
+            f"QUALIFY ROW_NUMBER() OVER (PARTITION BY {keys} ORDER BY {keys}) = 1)")
+
+
+def build_merge_sql(table_final: str, table_buffer: str, cols_upper: list,
+                    dedup_source: bool = False, window: PickupWindow = None) -> str:
+    """
+    MERGE dynamique buffer -> table finale sur l'empreinte persistée (MERGE_KEYS) :
+    jointure sur deux colonnes au lieu des huit colonnes de DEDUP_KEYS.
+    dedup_source=True dédoublonne le buffer côté entrepôt (chargement par stage,
+    où les données ne passent pas par pandas, ou upload avec chunks relancés).
+    window : plage de prise en charge du buffer ; la table finale n'est lue que
+    sur cette plage (pruning), sans changer le résultat puisque la clé inclut
+    TPEP_PICKUP_DATETIME. Valable uniquement sur des timestamps migrés (une ligne
+    gonflée serait hors fenêtre et dupliquée) : process_parquet_files refuse de
+    charger avant la migration (require_migrated).
+    """
+    conditions = [f"target.{col} = source.{col}" for col in MERGE_KEYS]
+    if window is not None:
+        conditions.append(window.predicate("target"))
+    on_clause = "\n            AND ".join(conditions)
+    return f"""
+        MERGE INTO {table_final} AS target
+        USING {buffer_source(table_buffer, dedup_source)} AS source
+        ON {on_clause}
+        WHEN MATCHED THEN UPDATE SET {', '.join([f'{col} = source.{col}' for col in cols_upper])}
+        WHEN NOT MATCHED THEN INSERT ({', '.join(cols_upper)})
+        VALUES ({', '.join([f'source.{col}' for col in cols_upper])});
+        """
+
+
+def require_fingerprints(table_final: str):
+    """
+    Échec immédiat si des lignes de la table finale n'ont pas d'empreinte (chargées avant
+    ROW_FINGERPRINT) : le MERGE sur l'empreinte ne les retrouverait pas et les dupliquerait.
+    COUNT(*) - COUNT(colonne) : servi par les métadonnées Snowflake, sans scan.
+    """
+    columns = schema_registry.columns(table_final) or {}
+    count = f"COUNT(*) - COUNT({FINGERPRINT_COLUMN})" if FINGERPRINT_COLUMN in columns else "COUNT(*)"
+    missing = execute_sql(f"SELECT {count} FROM {table_final}")[0][0]
+    if missing:
+        raise RuntimeError(f"❌ {missing} ligne(s) sans {FINGERPRINT_COLUMN} dans {table_final} : "
+                           "lancez d'abord python load/backfill_fingerprints.py")
+
+
+def prepare_tables(df: pd.DataFrame, table_final: str, table_buffer: str):
+    """
+    Création/mise à jour des tables finale et buffer à partir des colonnes du DataFrame.
+    Les deux tables sont lues en une requête, puis servies par le registre.
+    """
+    schema_registry.load([table_final, table_buffer])
+    update_table_schema(df, table_final, verbose=True)
+    update_table_schema(df, table_buffer, verbose=True)
+
+
+def replaces_window(strategy: str, window: PickupWindow) -> bool:
+    """La stratégie replace ne s'applique qu'à un fichier contenu dans un seul mois."""
+    return strategy == REPLACE and window is not None and window.single_month
+
+
+def merge_buffer(file_name: str, cols_upper: list, table_final: str, table_buffer: str,
+                 dedup_source: bool = False, strategy: str = MERGE, window: PickupWindow = None):
+    """
+    Écriture du buffer dans la table finale puis vidage du buffer, dans une même transaction :
+      - strategy="replace" et fenêtre d'un mois : DELETE des lignes de la fenêtre chargées
+        par ce fichier (SOURCE_FILE) + MERGE restreint à la fenêtre
+      - sinon : MERGE, restreint à la fenêtre si elle est connue
+    Les lignes touchées par fenêtre sont historisées dans logs/window_load_results.csv.
+    """
+    if replaces_window(strategy, window):
+        merge_sql = build_merge_sql(table_final, table_buffer, cols_upper, dedup_source=dedup_source, window=window)
+        results = execute_in_transaction(build_replace_statements(table_final, table_buffer, window, file_name,
+                                                                  merge_sql))
+        mode, deleted = REPLACE, affected_rows(results[0])
+        inserted, updated = affected_rows(results[1]), affected_rows(results[1], 1)
+        print(f"🔁 Fenêtre {window.label()} remplacée : {deleted} lignes supprimées, {inserted} insérées\n")
     else:
-        table_name_sql = f"{os.getenv('SNOWFLAKE_SCHEMA').upper()}.{table_name.upper()}"
+        results = execute_in_transaction([
+            build_merge_sql(table_final, table_buffer, cols_upper, dedup_source=dedup_source, window=window),
+            f"TRUNCATE TABLE {table_buffer}",
+        ])
+        mode, deleted, inserted, updated = MERGE, None, affected_rows(results[0]), affected_rows(results[0], 1)
+        print("🔁 MERGE terminé\n")
+        if window is not None:
+            details = f", {updated} mises à jour" if updated is not None else ""
+            print(f"🔁 Fenêtre {window.label()} : {inserted} lignes touchées{details}\n")
+    try:
+        logging.info(f"{mode.upper()} terminé pour {file_name}")
+    except Exception:
+        pass
+    record_window_result(file_name, mode, window, deleted, inserted, updated)
+    print("🔁 BUFFER vidé\n")
 
 
-    existing = get_existing_columns_and_types(table_name_sql)
+def record_window_result(file_name: str, mode: str, window: PickupWindow, deleted, inserted, updated):
+    """Historise les lignes touchées par fenêtre dans logs/window_load_results.csv."""
+    report_file = LOG_DIR / "window_load_results.csv"
+    report_file.parent.mkdir(parents=True, exist_ok=True)
+    write_header = not report_file.exists()
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(report_file, mode="a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(["timestamp", "source", "mode", "window_start", "window_end",
+                             "rows_deleted", "rows_inserted", "rows_updated"])
+        writer.writerow([timestamp, file_name, mode,
+                         window.start if window is not None else "", window.end if window is not None else "",
+                         deleted, inserted, updated])
+
 
-    if verbose:
-        print(f"[INFO] Columns existing in {table_name_sql}: {list(existing.keys())}")
+def batch_rows_for_budget(parquet_file: pq.ParquetFile, memory_budget_mb: int, columns: list = None) -> int:
+    """
+    Nombre de lignes par batch pour rester sous le budget mémoire,
+    estimé à partir de la taille non compressée déclarée dans le footer parquet
+    (colonnes lues seulement si une projection s'applique).
+    """
+    metadata = parquet_file.metadata
+    if metadata.num_rows == 0:
+        return 1
+    if columns is None:
+        uncompressed = sum(metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups))
+    else:
+        wanted = set(columns)
+        uncompressed = sum(
+            metadata.row_group(i).column(j).total_uncompressed_size
+            for i in range(metadata.num_row_groups)
+            for j in range(metadata.num_columns)
+            if metadata.row_group(i).column(j).path_in_schema in wanted
+        )
+    bytes_per_row = max(uncompressed / metadata.num_rows, 1) * BATCH_MEMORY_FACTOR
+    return max(int(memory_budget_mb * 1024 * 1024 / bytes_per_row), 1_000)
+
+
+def iter_parquet_batches(path: Path, memory_budget_mb: int = DEFAULT_MEMORY_BUDGET_MB, transform=None,
+                         projection: ProjectionPlan = None, row_groups: list = None):
+    """
+    Itère un fichier parquet par record batches Arrow typés (plan de types)
+    convertis en DataFrame, sans jamais matérialiser le fichier complet.
+    transform(batch) est appliqué au batch typé avant conversion (ex. pré-validation).
+    projection : seules les colonnes du plan sont lues (pushdown parquet).
+    row_groups : row groups lus (sélection par plage de prise en charge), tous par défaut.
+    """
+    parquet_file = pq.ParquetFile(path)
+    columns = projected_columns(projection, parquet_file.schema_arrow)
+    batch_rows = batch_rows_for_budget(parquet_file, memory_budget_mb, columns)
+    for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=columns, row_groups=row_groups):
+        batch = apply_type_plan(batch)
+        if transform is not None:
+            batch = transform(batch)
+        yield to_frame(batch)
+
+
+def read_filter(validation: FilePrevalidation, selection: PickupSelection = None):
+    """Filtre des lots Arrow lus : plage de prise en charge puis pré-validation (None si aucun)."""
+    filters = [f for f in (selection.filter if selection is not None else None,
+                           validation.filter if validation is not None else None) if f is not None]
+    if not filters:
+        return None
+
+    def apply(data):
+        for row_filter in filters:
+            data = row_filter(data)
+        return data
+    return apply
+
+
+def deduplicate(df: pd.DataFrame, dedup_index: FingerprintIndex = None, seen: FileFingerprints = None):
+    """
+    Dédoublonnage vectorisé sur l'empreinte 64 bits de DEDUP_KEYS :
+      - doublons internes (première occurrence conservée, et hors `seen`)
+      - doublons déjà chargés par un autre fichier (dedup_index)
+    Renvoie (df avec la colonne ROW_FINGERPRINT, empreintes, mois, doublons internes,
+    doublons inter-fichiers).
+    """
+    fingerprints = row_fingerprints(df, DEDUP_KEYS)
+    months = pickup_month_codes(df)
+    keep = first_occurrence_mask(fingerprints)
+    if seen is not None:
+        keep &= ~seen.contains(fingerprints)
+    in_file = int((~keep).sum())
+
+    cross_file = 0
+    if dedup_index is not None:
+        known = dedup_index.contains(fingerprints, months) & keep
+        cross_file = int(known.sum())
+        keep &= ~known
+
+    kept = with_fingerprints(df[keep].reset_index(drop=True), fingerprints[keep])
+    return kept, fingerprints[keep], months[keep], in_file, cross_file
 
-    to_add = []
-    type_mismatches = []
 
-    for col in df.columns:
-        col_up = col.upper()
-        pandas_dtype = str(df[col].dtype)
-        target_type = map_dtype(pandas_dtype, verbose=False).upper()
+def log_duplicates(file_name: str, in_file: int, cross_file: int):
+    print(f"🧹 {in_file} duplicate rows removed before upload.")
+    if cross_file:
+        print(f"🧹 {cross_file} rows already loaded from another file skipped.")
+    try:
+        logging.info(f"{in_file} duplicates removed from {file_name}")
+        logging.info(f"{cross_file} cross-file duplicates skipped in {file_name}")
+    except Exception:
+        pass
+
 
-        if col_up not in existing:
-            to_add.append((col_up, target_type))
+def commit_fingerprints(dedup_index: FingerprintIndex, fingerprints: np.ndarray, months: np.ndarray,
+                        replace: bool = False):
+    """
+    Enregistre les empreintes d'un fichier une fois son MERGE validé.
+    replace=True (fenêtre remplacée) : les empreintes du mois sont remplacées, pas ajoutées.
+    """
+    if dedup_index is not None and len(fingerprints):
+        if replace:
+            dedup_index.replace(fingerprints, months)
         else:
-            snow_type = existing[col_up].upper()
-            # On compare simplement et on logge la mismatch, on n'essaie pas de modifier automatiquement
-            if snow_type != target_type:
-                type_mismatches.append((col_up, snow_type, target_type))
-
-    # Ajout des colonnes manquantes
-    for col_name, sf_type in to_add:
-        sql = f'ALTER TABLE {table_name_sql} ADD COLUMN IF NOT EXISTS "{col_name}" {sf_type}'
-        if verbose:
-            print(f"[SQL] {sql}")
-        execute_sql(sql)
-        print(f"➕ Added column {col_name} {sf_type} to {table_name_sql}")
-
-    # Signaler les mismatches de type
-    if type_mismatches:
-        print("⚠️ Type mismatches detected (Snowflake_type vs detected_pandas_type):")
-        for col_name, snow_type, detected in type_mismatches:
-            print(f"   - {col_name}: {snow_type} (Snowflake)  |  {detected} (detected)")
-        print("➡️ No automatic type conversion performed; review and alter types manually if needed.")
-
-    if not to_add and not type_mismatches and verbose:
-        print(f"[INFO] No schema changes required for {table_name_sql}")
+            dedup_index.add(fingerprints, months)
+        dedup_index.save()
 
 
-# 6️⃣ Traitement des fichiers parquet
-def process_parquet_files():
-    table_final = "YELLOW_TAXI_TRIPS_V2"
-    table_buffer = "BUFFER_YELLOW_TAXI_TRIPS_V2"
+def mark_file(ledger: IngestionLedger, f: Path, state: str, error: str = None):
+    if ledger is not None:
+        ledger.mark(f, state, error)
+
+
+def new_file_stats(f: Path, rows_read: int = 0, in_file: int = 0, cross_file: int = 0) -> FileStats:
+    stats = FileStats(f.name, file_month(f))
+    stats.rows_read = rows_read
+    stats.in_file_duplicates = in_file
+    stats.cross_file_duplicates = cross_file
+    return stats
+
+
+def start_prevalidation(prevalidator: Prevalidator, f: Path) -> FilePrevalidation:
+    return prevalidator.for_file(f) if prevalidator is not None else None
+
+
+def record_rejects(stats: FileStats, validation: FilePrevalidation):
+    """Bilan de pré-validation d'un fichier : affiché et reporté dans ses statistiques DQ."""
+    if validation is None:
+        return
+    validation.close()
+    validation.report()
+    stats.rows_read = validation.rows_checked
+    stats.rejected = validation.rejected
+    stats.rejects_by_rule = dict(validation.by_rule)
+
+
+def record_stats(dq_store: DQStatsStore, stats: FileStats):
+    """Conserve les statistiques d'un fichier une fois son MERGE validé."""
+    if dq_store is not None:
+        dq_store.record(stats)
+
+
+def upload_frame(df: pd.DataFrame, table_buffer: str) -> UploadResult:
+    """
+    Chargement d'un DataFrame dans le buffer par chunks adaptatifs (chunked_upload.py),
+    span "upload" : lignes, taille en mémoire et réglages atteints.
+    En cas d'échec le buffer est vidé : aucun chargement partiel n'atteint le MERGE.
+    """
+    with span("upload") as upload_span:
+        upload_span.bytes = int(df.memory_usage(index=False).sum())
+        result = upload_chunked(df, table_buffer)
+        upload_span.rows = result.rows
+        upload_span.attrs.update(chunks=result.chunks, retries=result.retries, parallel=result.parallel,
+                                 chunk_rows=result.chunk_rows, compression=result.compression)
+    print(result.summary())
+    if not result.success:
+        print(f"❌ Upload interrompu : {result.error}")
+        execute_sql(f"TRUNCATE TABLE {table_buffer}")
+        print("🔁 BUFFER vidé")
+    return result
+
+
+def ingest_file(f: Path, table_final: str, table_buffer: str, dedup_index: FingerprintIndex = None,
+                ledger: IngestionLedger = None, strategy: str = MERGE, dq_store: DQStatsStore = None,
+                prevalidator: Prevalidator = None, projection: ProjectionPlan = None,
+                selection: PickupSelection = None) -> bool:
+    """
+    Ingestion d'un fichier complet en mémoire (mode historique). Renvoie False en cas d'échec.
+    selection : seuls ses row groups sont lus, et ses lignes chargées (rechargement d'une plage).
+    """
+    # Harmonisation colonnes et types (plan de types Arrow), pré-validation éventuelle
+    validation = start_prevalidation(prevalidator, f)
+    try:
+        with span("read") as read_span:
+            df = read_frame(f, read_filter(validation, selection), projected_columns(projection, pq.read_schema(f)),
+                            selection.row_groups if selection is not None else None)
+            read_span.rows, read_span.bytes = len(df), f.stat().st_size
+    finally:
+        if validation is not None:
+            validation.close()
+    window = PickupWindow.from_frame(df)
+    # Fenêtre remplacée : tout le mois est rechargé, l'index inter-fichiers ne filtre rien
+    replace = replaces_window(strategy, window)
+
+    rows_read = len(df)
+
+    # Suppression doublons
+    with span("dedup") as dedup_span:
+        df, fingerprints, months, in_file, cross_file = deduplicate(df, None if replace else dedup_index)
+        dedup_span.rows = rows_read
+    df = with_source(df, f.name)
+    log_duplicates(f.name, in_file, cross_file)
+    stats = new_file_stats(f, rows_read, in_file, cross_file)
+    record_rejects(stats, validation)
+    stats.observe_frame(df)
+    if df.empty:
+        print(f"✔️ Rien de nouveau dans {f.name}")
+        record_stats(dq_store, stats)
+        return True
+
+    # Création/mise à jour des tables
+    with span("schema_sync"):
+        prepare_tables(df, table_final, table_buffer)
+
+    # Insertion dans buffer
+    upload = upload_frame(df, table_buffer)
+    if not upload.success:
+        print("❌ Échec insertion")
+        return False
+    print(f"✅ {upload.rows} lignes dans {table_buffer}")
+    try:
+        logging.info(f"{upload.rows} lignes insérées depuis {f.name}")
+    except Exception:
+        pass
+    mark_file(ledger, f, LOADED)
+
+    with span("merge", rows=len(df)):
+        # Un chunk relancé a pu être chargé deux fois : buffer dédoublonné côté entrepôt
+        merge_buffer(f.name, [col.upper() for col in df.columns], table_final, table_buffer,
+                     dedup_source=upload.retries > 0, strategy=strategy, window=window)
+    commit_fingerprints(dedup_index, fingerprints, months, replace=replace)
+    record_stats(dq_store, stats)
+    return True
+
+
+def ingest_file_streaming(f: Path, table_final: str, table_buffer: str,
+                          memory_budget_mb: int = DEFAULT_MEMORY_BUDGET_MB,
+                          dedup_index: FingerprintIndex = None, ledger: IngestionLedger = None,
+                          strategy: str = MERGE, dq_store: DQStatsStore = None,
+                          prevalidator: Prevalidator = None, projection: ProjectionPlan = None,
+                          catalog: ParquetCatalog = None, selection: PickupSelection = None) -> bool:
+    """
+    Ingestion par record batches : chaque batch est dédoublonné puis chargé
+    dans le buffer dès sa lecture, un seul MERGE est lancé en fin de fichier.
+    Le pic mémoire dépend de la taille des batches, pas de celle du fichier.
+    Les doublons entre batches sont détectés via les empreintes (uint64)
+    des clés déjà chargées (FileFingerprints) : cet état par fichier croît avec
+    le nombre de lignes chargées (16 octets par ligne, empreinte et mois), il est
+    aussi la liste enregistrée dans l'index après le MERGE. En stratégie replace, la fenêtre est connue avant
+    lecture grâce à l'index du catalogue (ou aux statistiques du footer parquet).
+    selection : seuls ses row groups sont lus, et ses lignes chargées (rechargement d'une plage).
+    """
+    replace = replaces_window(strategy, catalog.window(f) if catalog is not None else footer_window(f))
+    # Fenêtre remplacée : tout le mois est rechargé, l'index inter-fichiers ne filtre rien
+    batch_index = None if replace else dedup_index
+    window = None
+    stats = new_file_stats(f)
+    validation = start_prevalidation(prevalidator, f)
+    seen = FileFingerprints()
+    in_file = 0
+    cross_file = 0
+    total_rows = 0
+    retried = False
+    cols_upper = None
+
+    batches = iter_parquet_batches(f, memory_budget_mb, read_filter(validation, selection), projection,
+                                   selection.row_groups if selection is not None else None)
+    for df in timed_iter("read", batches):
+        stats.rows_read += len(df)
+        # Suppression doublons (dans le batch, avec les batches précédents et les autres fichiers)
+        with span("dedup", rows=len(df)):
+            df, fingerprints, months, batch_in_file, batch_cross_file = deduplicate(df, batch_index, seen)
+        df = with_source(df, f.name)
+        # Colonnes après dédoublonnage : ROW_FINGERPRINT et SOURCE_FILE comprises
+        if cols_upper is None:
+            cols_upper = list(df.columns)
+            with span("schema_sync"):
+                prepare_tables(df, table_final, table_buffer)
+        in_file += batch_in_file
+        cross_file += batch_cross_file
+        seen.add(fingerprints, months)
+        stats.observe_frame(df)
+        if df.empty:
+            continue
+        batch_window = PickupWindow.from_frame(df)
+        window = batch_window.union(window) if batch_window is not None else window
+
+        upload = upload_frame(df, table_buffer)
+        if not upload.success:
+            print("❌ Échec insertion")
+            if validation is not None:
+                validation.close()
+            return False
+        retried = retried or upload.retries > 0
+        total_rows += upload.rows
+        print(f"   ↳ batch de {upload.rows} lignes chargé ({total_rows} au total)")
+
+    if cols_upper is None:
+        print(f"⚠️ {f.name} ne contient aucune ligne")
+        return True
+
+    log_duplicates(f.name, in_file, cross_file)
+    stats.in_file_duplicates, stats.cross_file_duplicates = in_file, cross_file
+    record_rejects(stats, validation)
+    if not total_rows:
+        print(f"✔️ Rien de nouveau dans {f.name}")
+        record_stats(dq_store, stats)
+        return True
+    print(f"✅ {total_rows} lignes dans {table_buffer}")
+    try:
+        logging.info(f"{total_rows} lignes insérées depuis {f.name} (streaming)")
+    except Exception:
+        pass
+    mark_file(ledger, f, LOADED)
+
+    with span("merge", rows=total_rows):
+        merge_buffer(f.name, cols_upper, table_final, table_buffer, dedup_source=retried,
+                     strategy=REPLACE if replace else MERGE, window=window)
+    commit_fingerprints(dedup_index, *seen.arrays(), replace=replace)
+    record_stats(dq_store, stats)
+    return True
+
+
+def record_load_results(results: list):
+    """Historise les résultats de chargement par chunk dans logs/stage_load_results.csv."""
+    report_file = LOG_DIR / "stage_load_results.csv"
+    report_file.parent.mkdir(parents=True, exist_ok=True)
+    write_header = not report_file.exists()
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open(report_file, mode="a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(["timestamp", "source", "chunk", "status", "rows_parsed", "rows_loaded", "first_error"])
+        for r in results:
+            writer.writerow([timestamp, r.source, r.chunk, r.status, r.rows_parsed, r.rows_loaded, r.first_error])
+
+
+def ingest_files_staged(files: list, table_final: str, table_buffer: str, engine: StageEngine = None,
+                        batch_files: int = DEFAULT_STAGE_BATCH_FILES, target_chunk_mb: int = TARGET_CHUNK_MB,
+                        ledger: IngestionLedger = None, dq_store: DQStatsStore = None,
+                        prevalidator: Prevalidator = None, projection: ProjectionPlan = None) -> list:
+    """
+    Chargement par stage : les fichiers sont réécrits en chunks parquet zstd
+    (sans pandas), déposés en stage puis chargés par un seul COPY INTO par lot
+    de batch_files fichiers, suivi d'un MERGE dédoublonné côté entrepôt.
+    Les statistiques DQ sont calculées sur les batches Arrow pendant l'écriture
+    des chunks (doublons écartés côté entrepôt : non comptés). L'empreinte
+    ROW_FINGERPRINT est ajoutée aux chunks pendant la même passe.
+    Renvoie la liste des fichiers en échec (lot dont un chunk n'est pas chargé en entier).
+    """
+    engine = engine or get_backend().stage_engine(execute_sql)
+    failures = []
+
+    for start in range(0, len(files), batch_files):
+        batch = files[start:start + batch_files]
+        names = ", ".join(f.name for f in batch)
+        print(f"📦 Lot stage : {names}")
+        for f in batch:
+            mark_file(ledger, f, PENDING)
+
+        # DDL à partir de l'union des schémas du lot (DataFrame vide, aucun chargement de données)
+        schema = unified_schema(batch, fingerprint=True, source=True, projection=projection)
+        with span("schema_sync", file=names):
+            prepare_tables(schema.empty_table().to_pandas(), table_final, table_buffer)
+
+        with tempfile.TemporaryDirectory(prefix="nyc_taxi_stage_") as tmp_dir:
+            chunks = []
+            batch_stats = []
+            for f in batch:
+                stats = new_file_stats(f)
+                validation = start_prevalidation(prevalidator, f)
+                with span("read", file=f.name) as read_span:
+                    chunks.extend(write_stage_chunks(f, Path(tmp_dir), target_chunk_mb,
+                                                     on_batch=stats.observe_arrow,
+                                                     transform=validation.filter if validation is not None else None,
+                                                     fingerprint_keys=DEDUP_KEYS, source_name=f.name,
+                                                     projection=projection))
+                    read_span.rows, read_span.bytes = stats.rows_loaded, f.stat().st_size
+                stats.rows_read = stats.rows_loaded
+                record_rejects(stats, validation)
+                batch_stats.append(stats)
+            try:
+                with span("upload", file=names, chunks=len(chunks)) as upload_span:
+                    upload_span.bytes = sum(chunk.stat().st_size for chunk in chunks)
+                    engine.stage(table_buffer, chunks)
+                    results = engine.copy_into(table_buffer, chunks)
+                    upload_span.rows = sum(r.rows_loaded for r in results)
+            except Exception as e:
+                results = [FileLoadResult(source=source_name_for_chunk(c), chunk=c.name,
+                                          status="LOAD_FAILED", rows_parsed=0, rows_loaded=0,
+                                          first_error=str(e)) for c in chunks]
+            # Lot validé seulement si chaque chunk est chargé en entier (tant que les chunks existent)
+            results = checked_results(chunks, results)
+
+        record_load_results(results)
+        failed = [r for r in results if r.status != "LOADED"]
+        loaded_rows = sum(r.rows_loaded for r in results)
+        if failed:
+            print(f"❌ Échec COPY pour {len(failed)} chunk(s) : {failed[0].first_error}")
+            execute_sql(f"TRUNCATE TABLE {table_buffer}")
+            print("🔁 BUFFER vidé\n")
+            for f in batch:
+                mark_file(ledger, f, FAILED, failed[0].first_error)
+            failures.extend(batch)
+            continue
+        print(f"✅ {loaded_rows} lignes dans {table_buffer} ({len(results)} chunk(s))")
+        try:
+            logging.info(f"{loaded_rows} lignes chargées par stage depuis {names}")
+        except Exception:
+            pass
+
+        for f in batch:
+            mark_file(ledger, f, LOADED)
+
+        with span("merge", file=names, rows=loaded_rows):
+            merge_buffer(names, [field.name for field in schema], table_final, table_buffer, dedup_source=True)
+        for f, stats in zip(batch, batch_stats):
+            mark_file(ledger, f, MERGED)
+            record_stats(dq_store, stats)
+    return failures
+
+
+def drop_worker_buffers(slots: BufferSlots):
+    """Supprime les buffers par worker en fin de run (vides ou non) : aucune table permanente laissée."""
+    for table in slots.tables:
+        execute_sql(f"DROP TABLE IF EXISTS {table}")
+        schema_registry.invalidate(table)
+
+
+def ingest_files_parallel(files: list, table_final: str, table_buffer: str, workers: int = 2,
+                          upload_concurrency: int = None, dedup_index: FingerprintIndex = None,
+                          ledger: IngestionLedger = None, strategy: str = MERGE,
+                          dq_store: DQStatsStore = None, prevalidator: Prevalidator = None,
+                          projection: ProjectionPlan = None) -> list:
+    """
+    Ingestion parallèle :
+      1. lecture + pré-validation + dédoublonnage interne dans un pool de `workers` processus
+      2. upload (au plus `upload_concurrency` simultanés), chacun dans sa propre
+         table buffer <buffer>_W<i>
+      3. MERGE vers la table finale sérialisés par le coordinateur (un à la fois)
+    Les buffers par worker sont supprimés en sortie, succès ou échec.
+    Renvoie la liste des fichiers en échec.
+    """
+    upload_concurrency = upload_concurrency or min(workers, DEFAULT_UPLOAD_CONCURRENCY)
+    slots = BufferSlots(table_buffer, upload_concurrency)
+    schema_lock = threading.Lock()   # registre de schémas (DDL) non thread-safe
+    index_lock = threading.Lock()    # index d'empreintes partagé
+    merge_lock = threading.Lock()    # un seul MERGE à la fois dans la table finale
+    failures = []
+
+    def upload_and_merge(prepared: PreparedFile):
+        f = prepared.source
+        # Étapes mesurées dans le worker de lecture
+        for stage, seconds in (prepared.stage_seconds or {}).items():
+            record_span(stage, seconds, file=f.name, rows=prepared.rows_read, worker=True)
+        with span("file", file=f.name) as file_span:
+            file_span.rows, file_span.bytes = prepared.rows_read, f.stat().st_size
+            load_prepared(prepared)
+
+    def load_prepared(prepared: PreparedFile):
+        f = prepared.source
+        df = with_source(pd.read_parquet(prepared.prepared), f.name)
+        fingerprints = np.load(prepared.fingerprints)
+        months = np.load(prepared.months)
+        window = PickupWindow.from_frame(df)
+        replace = replaces_window(strategy, window)
+
+        cross_file = 0
+        if dedup_index is not None and not replace:
+            with index_lock:
+                known = dedup_index.contains(fingerprints, months)
+            cross_file = int(known.sum())
+            df = df[~known].reset_index(drop=True)
+            fingerprints, months = fingerprints[~known], months[~known]
+        log_duplicates(f.name, prepared.in_file_duplicates, cross_file)
+        stats = new_file_stats(f, prepared.rows_read, prepared.in_file_duplicates, cross_file)
+        stats.rejected, stats.rejects_by_rule = prepared.rows_rejected, prepared.rejects_by_rule or {}
+        stats.observe_frame(df)
+        if df.empty:
+            print(f"✔️ Rien de nouveau dans {f.name}")
+            record_stats(dq_store, stats)
+            return
+
+        with slots.slot() as worker_buffer:
+            with schema_lock, span("schema_sync"):
+                prepare_tables(df, table_final, worker_buffer)
+            execute_sql(f"TRUNCATE TABLE {worker_buffer}")
+            upload = upload_frame(df, worker_buffer)
+            if not upload.success:
+                raise RuntimeError("échec insertion buffer")
+            print(f"✅ {upload.rows} lignes de {f.name} dans {worker_buffer}")
+            mark_file(ledger, f, LOADED)
+
+            with merge_lock, span("merge", rows=len(df)):
+                merge_buffer(f.name, list(df.columns), table_final, worker_buffer,
+                             dedup_source=upload.retries > 0, strategy=strategy, window=window)
+
+        with index_lock:
+            commit_fingerprints(dedup_index, fingerprints, months, replace=replace)
+        record_stats(dq_store, stats)
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="nyc_taxi_prepared_") as tmp_dir, \
+                ProcessPoolExecutor(max_workers=workers) as parsers, \
+                ThreadPoolExecutor(max_workers=upload_concurrency) as uploaders:
+            parsing = {}
+            for f in files:
+                mark_file(ledger, f, PENDING)
+                parsing[parsers.submit(prepare_file, f, Path(tmp_dir), DEDUP_KEYS, prevalidator, projection)] = f
+
+            uploads = {}
+            for future in as_completed(parsing):
+                f = parsing[future]
+                try:
+                    uploads[uploaders.submit(upload_and_merge, future.result())] = f
+                except Exception as e:
+                    print(f"❌ Lecture impossible de {f.name} : {e}")
+                    mark_file(ledger, f, FAILED, str(e))
+                    failures.append(f)
+
+            for future in as_completed(uploads):
+                f = uploads[future]
+                try:
+                    future.result()
+                    mark_file(ledger, f, MERGED)
+                except Exception as e:
+                    print(f"❌ Ingestion de {f.name} en échec : {e}")
+                    mark_file(ledger, f, FAILED, str(e))
+                    failures.append(f)
+    finally:
+        drop_worker_buffers(slots)
+
+    return failures
+
+
+def reload_pickup_window(files: list, catalog: ParquetCatalog, pickup_window: PickupWindow, table_final: str,
+                         table_buffer: str, stream: bool = False,
+                         memory_budget_mb: int = DEFAULT_MEMORY_BUDGET_MB, prevalidator: Prevalidator = None,
+                         projection: ProjectionPlan = None):
+    """
+    Rechargement des seules courses prises en charge dans pickup_window : les fichiers
+    et row groups hors plage sont écartés d'après l'index du catalogue (sans ouvrir
+    les fichiers), les lignes lues sont filtrées exactement, puis fusionnées par MERGE.
+    Rechargement partiel : le registre d'ingestion, l'index d'empreintes et les
+    statistiques DQ par fichier ne sont ni consultés ni mis à jour.
+    """
+    label = f"{pickup_window.first:%Y-%m-%d %H:%M:%S} → {pickup_window.last:%Y-%m-%d %H:%M:%S}"
+    print(f"🎯 Rechargement de la plage {label}")
+    for f in files:
+        selection = catalog.select(f, pickup_window)
+        if selection is None:
+            print(f"⏭️ {f.name} : hors plage")
+            continue
+        print(selection.describe(f.name))
+        with span("file", file=f.name) as file_span:
+            file_span.bytes = f.stat().st_size
+            file_span.attrs["row_groups"] = len(selection.row_groups)
+            if stream:
+                ok = ingest_file_streaming(f, table_final, table_buffer, memory_budget_mb, None, None, MERGE, None,
+                                           prevalidator, projection, catalog, selection)
+            else:
+                ok = ingest_file(f, table_final, table_buffer, None, None, MERGE, None, prevalidator, projection,
+                                 selection)
+        if not ok:
+            raise RuntimeError(f"❌ Échec du rechargement de {f.name}")
+
+
+def raise_on_failures(failures: list):
+    """Run en échec si un fichier n'a pas pu être chargé (les autres fichiers sont traités)."""
+    if failures:
+        raise RuntimeError(f"{len(failures)} fichier(s) en échec : {', '.join(f.name for f in failures)}")
+
+
+def process_parquet_files(stream: bool = False, memory_budget_mb: int = DEFAULT_MEMORY_BUDGET_MB,
+                          backend: str = "pandas", dedup_index: FingerprintIndex = None,
+                          ledger: IngestionLedger = None, force: bool = False, months: list = None,
+                          workers: int = 1, upload_concurrency: int = None, strategy: str = MERGE,
+                          dq_store: DQStatsStore = None, prevalidator: Prevalidator = None,
+                          data_dir: Path = None, projection: ProjectionPlan = None,
+                          pickup_window: PickupWindow = None):
+    """
+    Charge tous les fichiers de extract/data (ou data_dir) dans Snowflake : fichiers du
+    catalogue partitionné (parquet_catalog.py), puis fichiers à plat non catalogués.
+    - backend="pandas", stream=False : lecture complète de chaque fichier (pd.read_parquet)
+    - backend="pandas", stream=True  : lecture par record batches sous un budget mémoire (Mo)
+    - backend="stage" : chunks parquet zstd + PUT / COPY INTO par lot de fichiers
+    dedup_index : index des empreintes déjà chargées (backend pandas uniquement),
+    les lignes déjà présentes sont écartées avant l'upload.
+    ledger : registre d'ingestion, seuls les fichiers nouveaux, modifiés ou en
+    échec sont traités (force=True : tous ; months=['2024-01', ...] : filtre).
+    workers > 1 : lecture/dédoublonnage en parallèle (processus) et uploads
+    concurrents dans des buffers par worker (backend pandas, hors streaming).
+    strategy="replace" : chaque fichier d'un seul mois remplace sa fenêtre de prise
+    en charge (DELETE + INSERT), les autres sont fusionnés par MERGE restreint à
+    leur plage de dates (backend pandas uniquement).
+    dq_store : statistiques DQ par fichier, calculées pendant l'ingestion.
+    prevalidator : règles de qualité du staging dbt évaluées avant upload (rejets
+    comptés par règle, écartés ou mis en quarantaine selon le mode).
+    projection : plan de projection (projection_plan()), seules les colonnes
+    référencées par le projet dbt sont lues et chargées.
+    pickup_window : rechargement des seules courses de cette plage (reload_pickup_window,
+    backend pandas, un worker, stratégie merge).
+    """
+    table_final = TABLE_FINAL
+    table_buffer = TABLE_BUFFER
 
     # Récupère le chemin du dossier racine du projet (2 niveaux au-dessus de ce fichier)
     project_root = Path(__file__).resolve().parents[1]
 
     # Chemin absolu vers le dossier extract/data
-    data_dir = project_root / "extract" / "data"
+    data_dir = Path(data_dir) if data_dir is not None else project_root / "extract" / "data"
 
     print("📂 Fichier actuel :", __file__)
     print("📂 Racine projet  :", project_root)
@@ -229,85 +907,98 @@ def process_parquet_files():
     if not data_dir.exists():
         raise FileNotFoundError(f"❌ Le dossier {data_dir} n'existe pas.")
 
-    # Recherche des fichiers .parquet
-    files = list(data_dir.glob("*.parquet"))
+    if pickup_window is not None and (backend != "pandas" or (workers > 1 and not stream) or strategy != MERGE):
+        raise ValueError("❌ Le rechargement d'une plage n'est disponible qu'avec le backend pandas, "
+                         "un seul worker et la stratégie merge")
+
+    # Recherche des fichiers .parquet (index du catalogue : aucun fichier ouvert)
+    catalog = ParquetCatalog(data_dir)
+    files = catalog.files()
     if not files:
         print("⚠️ Aucun fichier .parquet trouvé dans", data_dir)
         return
     
     print(f"✅ {len(files)} fichier(s) trouvé(s) :")
-    for f in files:
-        print("   -", f.name)
-        df = pd.read_parquet(f)
-        # Harmonisation colonnes
-        df.columns = [col.upper() for col in df.columns]          
-
-        # Suppression doublons
-        before = len(df)
-        df = df.drop_duplicates(
-            subset=[
-                "TPEP_PICKUP_DATETIME",
-                "TPEP_DROPOFF_DATETIME",
-                "VENDORID",
-                "PULOCATIONID",
-                "DOLOCATIONID",
-                "PASSENGER_COUNT",
-                "TOTAL_AMOUNT",
-                "TRIP_DISTANCE"
-            ],
-            keep="first"
-        )
-        removed = before - len(df)
-        print(f"🧹 {removed} duplicate rows removed before upload.")
-        try:
-            logging.info(f"{removed} duplicates removed from {f.name}")
-        except Exception:
-            pass
+    for line in catalog.describe_drift():
+        print(line)
+    if ledger is not None and pickup_window is None:
+        carried = catalog.carry_over(ledger)
+        if carried:
+            print(f"🗂️ {len(carried)} fichier(s) catalogué(s) repris dans le registre sans rechargement")
+        files = ledger.select(sorted(files), force=force, months=months)
+        if not files:
+            print("✔️ Aucun fichier nouveau ou modifié, rien à ingérer")
+            return
+    elif months:
+        files = [f for f in files if file_month(f) in months]
+    # Table finale chargée par une version antérieure : timestamps gonflés (fenêtres) ou
+    # lignes sans empreinte (clé du MERGE) dupliqueraient des lignes, refus tant que les
+    # migrations n'ont pas été lancées (le staging dbt ne corrige plus les timestamps)
+    if get_backend().table_exists(execute_sql, table_final):
+        require_migrated(table_final)
+        require_fingerprints(table_final)
+    # Un run précédent a pu s'arrêter entre l'upload et le MERGE (crash, MERGE en échec) :
+    # le buffer partagé est toujours vidé avant de charger quoi que ce soit
+    get_backend().truncate_if_exists(execute_sql, table_buffer)
+    print("🔁 BUFFER vidé avant chargement\n")
+    if projection is not None and files:
+        print(projection.describe(pq.read_schema(files[0])))
+    if pickup_window is not None:
+        reload_pickup_window(files, catalog, pickup_window, table_final, table_buffer, stream, memory_budget_mb,
+                             prevalidator, projection)
+        return
 
-        # Création/mise à jour des tables
-        create_table_if_not_exists(df, table_final)
-        update_table_schema(df, table_final, verbose=True)
-        create_table_if_not_exists(df, table_buffer)
-        update_table_schema(df, table_buffer, verbose=True)
+    if backend == "stage":
+        if strategy != MERGE:
+            raise ValueError("❌ La stratégie replace n'est disponible qu'avec le backend pandas")
+        failures = ingest_files_staged(files, table_final, table_buffer, ledger=ledger, dq_store=dq_store,
+                                       prevalidator=prevalidator, projection=projection)
+        raise_on_failures(failures)
+        return
 
-        # Insertion dans buffer
-        success, _, nrows, _ = write_pandas(conn, df, table_buffer)
-        if not success:
-            print("❌ Échec insertion")
-            continue
-        print(f"✅ {nrows} lignes dans {table_buffer}")
-        try:
-            logging.info(f"{nrows} lignes insérées depuis {f.name}")
-        except Exception:
-            pass
+    if workers > 1 and not stream:
+        failures = ingest_files_parallel(files, table_final, table_buffer, workers=workers,
+                                         upload_concurrency=upload_concurrency,
+                                         dedup_index=None if force else dedup_index, ledger=ledger,
+                                         strategy=strategy, dq_store=dq_store, prevalidator=prevalidator,
+                                         projection=projection)
+        raise_on_failures(failures)
+        return
 
-        # MERGE dynamique
-        cols_upper = [col.upper() for col in df.columns]
-        merge_sql = f"""
-        MERGE INTO {table_final} AS target
-        USING {table_buffer} AS source
-        ON target.TPEP_PICKUP_DATETIME = source.TPEP_PICKUP_DATETIME 
-            AND target.TPEP_DROPOFF_DATETIME = source.TPEP_DROPOFF_DATETIME
-            AND target.VENDORID = source.VENDORID
-            AND target.PULOCATIONID = source.PULOCATIONID
-            AND target.DOLOCATIONID = source.DOLOCATIONID
-            AND target.PASSENGER_COUNT = source.PASSENGER_COUNT
-            AND target.TOTAL_AMOUNT = source.TOTAL_AMOUNT
-            AND target.TRIP_DISTANCE = source.TRIP_DISTANCE
-        WHEN MATCHED THEN UPDATE SET {', '.join([f'target.{col} = source.{col}' for col in cols_upper])}
-        WHEN NOT MATCHED THEN INSERT ({', '.join(cols_upper)})
-        VALUES ({', '.join([f'source.{col}' for col in cols_upper])});
-        """
-        execute_sql(merge_sql)
-        print("🔁 MERGE terminé\n")
+    failures = []
+    for f in files:
+        print("   -", f.name)
+        mark_file(ledger, f, PENDING)
+        # Rechargement forcé : le MERGE gère l'idempotence, l'index ne doit pas tout écarter
+        file_index = None if force else dedup_index
         try:
-            logging.info(f"MERGE terminé pour {f.name}")
-        except Exception:
-            pass
+            with span("file", file=f.name) as file_span:
+                file_span.rows, file_span.bytes = pq.ParquetFile(f).metadata.num_rows, f.stat().st_size
+                if stream:
+                    ok = ingest_file_streaming(f, table_final, table_buffer, memory_budget_mb, file_index, ledger,
+                                               strategy, dq_store, prevalidator, projection, catalog)
+                else:
+                    ok = ingest_file(f, table_final, table_buffer, file_index, ledger, strategy, dq_store,
+                                     prevalidator, projection)
+        except Exception as e:
+            mark_file(ledger, f, FAILED, str(e))
+            raise
+        mark_file(ledger, f, MERGED if ok else FAILED, None if ok else "échec insertion buffer")
+        if not ok:
+            failures.append(f)
+    raise_on_failures(failures)
+
+def post_ingestion_stats(dq_store: DQStatsStore, table_final: str) -> dict:
+    """
+    Statistiques post-ingestion : statistiques locales par fichier (dq_stats.py) et
+    TOTAL_ROWS, nombre de lignes réel de la table (COUNT(*) servi par les métadonnées
+    Snowflake, sans scan) : la somme des lignes chargées dérive avec les MERGE et les remplacements.
+    """
+    results = dq_store.table_stats()
+    exists = get_backend().table_exists(execute_sql, table_final)
+    results["TOTAL_ROWS"] = execute_sql(f"SELECT COUNT(*) FROM {table_final}")[0][0] if exists else 0
+    return results
 
-        # Vidage du buffer
-        execute_sql(f"TRUNCATE TABLE {table_buffer}")
-        print("🔁 BUFFER vidé\n")
 
 """ # 7️⃣ Sauvegarde du report
 def save_ingestion_report(stats: dict):
@@ -345,50 +1036,144 @@ def save_ingestion_report(stats: dict):
     print(f"📊 Ingestion report saved to: {report_file}") """
 
 # 8️⃣ Lancement principal
-if __name__ == "__main__":
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Ingestion des fichiers parquet dans Snowflake")
+    parser.add_argument("--stream", action="store_true",
+                        help="Lecture par record batches (mémoire bornée)")
+    parser.add_argument("--memory-budget-mb", type=int, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help="Budget mémoire par batch en mode --stream")
+    parser.add_argument("--backend", choices=["pandas", "stage"], default="pandas",
+                        help="pandas : write_pandas + MERGE ; stage : chunks parquet + PUT/COPY INTO")
+    parser.add_argument("--strategy", choices=STRATEGIES, default=MERGE,
+                        help="merge : MERGE sur la clé ; replace : remplacement du mois de chaque fichier")
+    parser.add_argument("--dedup-index", type=Path, default=DEDUP_INDEX_DIR,
+                        help="Dossier de l'index des empreintes déjà chargées")
+    parser.add_argument("--no-dedup-index", action="store_true",
+                        help="Désactive le dédoublonnage inter-fichiers (MERGE seul)")
+    parser.add_argument("--reset-dedup-index", action="store_true",
+                        help="Vide l'index avant le run (ex. après vidage de la table finale)")
+    parser.add_argument("--force", action="store_true",
+                        help="Retraite les fichiers même s'ils sont déjà fusionnés")
+    parser.add_argument("--months", default=None,
+                        help="Mois à traiter, ex. 2024-01,2024-02")
+    parser.add_argument("--ledger", type=Path, default=LEDGER_FILE,
+                        help="Registre local des fichiers ingérés")
+    parser.add_argument("--ledger-sync", action="store_true",
+                        help="Réplique le registre dans RAW.INGESTION_LEDGER en fin de run")
+    parser.add_argument("--dq-stats", type=Path, default=DQ_STATS_FILE,
+                        help="Statistiques DQ par fichier (calculées pendant l'ingestion)")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="Vérifie les statistiques locales par une requête unique sur la table")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processus de lecture/dédoublonnage (>1 : ingestion parallèle)")
+    parser.add_argument("--upload-concurrency", type=int, default=None,
+                        help="Uploads simultanés (une table buffer par upload)")
+    parser.add_argument("--prevalidate", nargs="?", choices=MODES, const=DROP, default=None,
+                        help="Règles de qualité du staging avant upload : report (compte), "
+                             "drop (écarte, défaut) ou quarantine (écarte et écrit les rejets en parquet)")
+    parser.add_argument("--quarantine-dir", type=Path, default=DEFAULT_QUARANTINE_DIR,
+                        help="Dossier des fichiers de rejets (--prevalidate quarantine)")
+    parser.add_argument("--warehouse", choices=BACKENDS, default=None,
+                        help="Entrepôt cible (défaut : WAREHOUSE_BACKEND, sinon snowflake) ; "
+                             "duckdb : base locale embarquée, sans réseau")
+    parser.add_argument("--duckdb-path", default=None,
+                        help="Fichier de la base DuckDB (défaut : DUCKDB_PATH ou load/local_warehouse.duckdb)")
+    parser.add_argument("--keep-columns", default=None,
+                        help="Colonnes chargées en plus de celles utilisées par dbt (audit), ex. STORE_AND_FWD_FLAG")
+    parser.add_argument("--all-columns", action="store_true",
+                        help="Désactive la projection : toutes les colonnes source sont chargées")
+    parser.add_argument("--pickup-from", default=None,
+                        help="Rechargement d'une plage de prise en charge : premier jour (YYYY-MM-DD)")
+    parser.add_argument("--pickup-to", default=None,
+                        help="Dernier jour inclus de la plage (YYYY-MM-DD)")
+    parser.add_argument("--profile", nargs="?", const="all", default=None,
+                        help="Profilage cProfile (logs/profiles) : du run complet (défaut) "
+                             "ou des étapes listées, ex. read,dedup")
+    return parser
+
+
+def main(argv=None) -> int:
+    """Code de sortie : 0 si l'ingestion et les contrôles post-ingestion ont réussi, 1 sinon."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if bool(args.pickup_from) != bool(args.pickup_to):
+        parser.error("--pickup-from et --pickup-to vont ensemble")
+    load_dotenv()
+    configure_logging()
+
+    telemetry = start_run("ingestion", profile=args.profile)
+    if args.warehouse == "duckdb" or args.duckdb_path:
+        set_backend(DuckDBBackend(path=args.duckdb_path))
+    elif args.warehouse:
+        set_backend(args.warehouse)
+    print(f"🏛️ Entrepôt cible : {get_backend().name}")
+
+    dedup_index = None if args.no_dedup_index else FingerprintIndex(args.dedup_index)
+    if dedup_index is not None and args.reset_dedup_index:
+        dedup_index.reset()
+    ledger = IngestionLedger(args.ledger)
+    months = [m.strip() for m in args.months.split(",")] if args.months else None
+    dq_store = DQStatsStore(args.dq_stats)
+    prevalidator = Prevalidator(mode=args.prevalidate, quarantine_dir=args.quarantine_dir) if args.prevalidate else None
+    keep_columns = [c.strip() for c in args.keep_columns.split(",") if c.strip()] if args.keep_columns else None
+    projection = None if args.all_columns else projection_plan(keep_columns)
+    pickup_window = None
+    if args.pickup_from:
+        pickup_window = PickupWindow(pd.Timestamp(args.pickup_from),
+                                     pd.Timestamp(args.pickup_to) + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1))
+
+    success = False
     try:
-        process_parquet_files()
-
-        print("\n📊 Vérification post-ingestion Snowflake...")
-        sql_checks = {
-            "TOTAL_ROWS": "SELECT COUNT(*) AS TOTAL_ROWS FROM RAW.YELLOW_TAXI_TRIPS_V2;",
-            "DUPLICATE_GROUPS": """
-                SELECT COUNT(*) AS DUPLICATE_GROUPS 
-                FROM (
-                    SELECT TPEP_PICKUP_DATETIME, TPEP_DROPOFF_DATETIME, VENDORID, PULOCATIONID, DOLOCATIONID,
-                           COUNT(*) AS c
-                    FROM RAW.YELLOW_TAXI_TRIPS_V2
-                    GROUP BY 1,2,3,4,5
-                    HAVING COUNT(*) > 1
-                );
-            """,
-            "BUFFER_ROWS": "SELECT COUNT(*) AS BUFFER_ROWS FROM RAW.BUFFER_YELLOW_TAXI_TRIPS_V2;",
-            "DISTANCE_STATS": """
-                SELECT 
-                    MIN(TRIP_DISTANCE) AS MIN_DISTANCE,
-                    MAX(TRIP_DISTANCE) AS MAX_DISTANCE,
-                    AVG(TRIP_DISTANCE) AS AVG_DISTANCE
-                FROM RAW.YELLOW_TAXI_TRIPS_V2;
-            """
-        }
-
-        results = {}
-        for check_name, sql in sql_checks.items():
-            result = execute_sql(sql)
-            if check_name == "DISTANCE_STATS":
-                results["MIN_DISTANCE"] = result[0][0] if result else None
-                results["MAX_DISTANCE"] = result[0][1] if result else None
-                results["AVG_DISTANCE"] = result[0][2] if result else None
-            else:
-                results[check_name] = result[0][0] if result else None
-            print(f"{check_name}: {result[0][0] if result else 'N/A'}")
+        process_parquet_files(stream=args.stream, memory_budget_mb=args.memory_budget_mb,
+                              backend=args.backend, dedup_index=dedup_index,
+                              ledger=ledger, force=args.force, months=months,
+                              workers=args.workers, upload_concurrency=args.upload_concurrency,
+                              strategy=args.strategy, dq_store=dq_store, prevalidator=prevalidator,
+                              projection=projection, pickup_window=pickup_window)
+        if args.ledger_sync:
+            ledger.sync_to_warehouse(execute_sql)
+
+        print("\n📊 Statistiques post-ingestion (calculées pendant l'ingestion)...")
+        with span("post_checks"):
+            results = post_ingestion_stats(dq_store, f"RAW.{TABLE_FINAL}")
+            missing = [name for name, entry in ledger.entries.items()
+                       if entry.get("state") == MERGED and name not in dq_store.entries]
+            if missing:
+                print(f"⚠️ {len(missing)} fichier(s) fusionné(s) sans statistiques locales "
+                      f"(ex. {missing[0]}) : totaux partiels, utiliser --reconcile")
+            for key in ("TOTAL_ROWS", "ROWS_LOADED", "DUPLICATES_REMOVED", "REJECTED_ROWS",
+                        "MIN_DISTANCE", "MAX_DISTANCE", "AVG_DISTANCE"):
+                print(f"{key}: {results[key] if results[key] is not None else 'N/A'}")
+            for month, rows in dq_store.by_month().items():
+                print(f"   - {month} : {rows} lignes chargées")
+
+            if args.reconcile:
+                print("\n📊 Réconciliation Snowflake (requête unique)...")
+                row = execute_sql(reconcile_query(f"RAW.{TABLE_FINAL}", f"RAW.{TABLE_BUFFER}"))[0]
+                warehouse = dict(zip(RECONCILE_COLUMNS, row))
+                for key, value in warehouse.items():
+                    print(f"{key}: {value if value is not None else 'N/A'}")
+                mismatches = compare(results, warehouse)
+                for key, local, remote in mismatches:
+                    print(f"⚠️ Écart {key} : local={local} | Snowflake={remote}")
+                if not mismatches:
+                    print("✅ Statistiques locales conformes à la table")
+                results.update(warehouse)
 
-        save_ingestion_report_xlsx(results)
+        # Historique des runs (append-only) ; rapport xlsx/csv : checks/run_history.py export
+        record_run(results)
+        apply_retention()
+        success = True
 
     except Exception as e:
         print(f"❌ Erreur pendant le processus d'ingestion: {e}")
 
     finally:
-        cursor.close()
-        conn.close()
-        print("✅ Pipeline terminé proprement (Snowflake fermé, logs à jour).")
+        close_pool()
+        telemetry.finish(success)
+        print("✅ Pipeline terminé proprement (connexions fermées, logs à jour).")
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
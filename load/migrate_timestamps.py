@@ -0,0 +1,98 @@
+# load/migrate_timestamps.py
+"""
+Migration ponctuelle des timestamps déjà chargés dans RAW.
+
+Avant le plan de types (type_plan.py), write_pandas chargeait les timestamps
+parquet comme des entiers : les microsecondes étaient lues comme des secondes
+(dates autour de l'an 54 millions). Ce script remet ces lignes à l'échelle, en une
+transaction, et ne touche que les valeurs gonflées : il peut être relancé sans effet.
+L'ingestion refuse de charger tant que la table contient des valeurs gonflées
+(require_migrated) : le staging dbt ne les corrige plus.
+
+Usage :
+    python load/migrate_timestamps.py --dry-run
+    python load/migrate_timestamps.py
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from snowflake_utils import close_pool, execute_in_transaction, execute_sql
+
+TABLE = "RAW.YELLOW_TAXI_TRIPS_V2"
+TIMESTAMP_COLUMNS = ["TPEP_PICKUP_DATETIME", "TPEP_DROPOFF_DATETIME"]
+# Au-delà de 10^11 secondes (an 5138), la valeur ne peut être qu'un nombre de microsecondes
+INFLATED_EPOCH_SECONDS = 100_000_000_000
+# Même seuil en littéral timestamp : comparaison portable (Snowflake, DuckDB) et servie
+# par les min/max des micro-partitions
+INFLATED_FROM = datetime(1970, 1, 1) + timedelta(seconds=INFLATED_EPOCH_SECONDS)
+
+
+def inflated_condition(column: str) -> str:
+    return f"{column} > TIMESTAMP '{INFLATED_FROM:%Y-%m-%d %H:%M:%S}'"
+
+
+def inflated_columns(table: str) -> list:
+    """Colonnes contenant au moins une valeur gonflée : MAX par colonne (métadonnées), une requête."""
+    maxima = ", ".join(f"MAX({col}) AS {col}" for col in TIMESTAMP_COLUMNS)
+    checks = ", ".join(f"COALESCE({inflated_condition(col)}, FALSE)" for col in TIMESTAMP_COLUMNS)
+    row = execute_sql(f"SELECT {checks} FROM (SELECT {maxima} FROM {table}) AS maxima")[0]
+    return [col for col, inflated in zip(TIMESTAMP_COLUMNS, row) if inflated]
+
+
+def require_migrated(table: str):
+    """Échec immédiat si des timestamps gonflés restent dans la table (migration non lancée)."""
+    columns = inflated_columns(table)
+    if columns:
+        raise RuntimeError(f"❌ Timestamps gonflés dans {table} ({', '.join(columns)}) : "
+                           "lancez d'abord python load/migrate_timestamps.py")
+
+
+def count_inflated(table: str) -> dict:
+    """Nombre de valeurs gonflées par colonne, en une requête."""
+    counts = ", ".join(
+        f"COUNT_IF({inflated_condition(col)}) AS {col}" for col in TIMESTAMP_COLUMNS
+    )
+    row = execute_sql(f"SELECT {counts} FROM {table}")[0]
+    return dict(zip(TIMESTAMP_COLUMNS, row))
+
+
+def build_migration_statements(table: str) -> list:
+    """Un UPDATE par colonne, restreint aux valeurs gonflées (idempotent)."""
+    return [
+        f"""
+        UPDATE {table}
+        SET {col} = TO_TIMESTAMP_NTZ(DATE_PART('epoch_second', {col}) / 1000000)
+        WHERE {inflated_condition(col)}
+        """
+        for col in TIMESTAMP_COLUMNS
+    ]
+
+
+def migrate(table: str = TABLE, dry_run: bool = False) -> dict:
+    before = count_inflated(table)
+    for col, count in before.items():
+        print(f"🔎 {col} : {count} valeur(s) à corriger")
+    if dry_run or not any(before.values()):
+        print("✔️ Aucune mise à jour effectuée" if not dry_run else "ℹ️ Dry-run : aucune mise à jour")
+        return before
+
+    execute_in_transaction(build_migration_statements(table), verbose=True)
+    after = count_inflated(table)
+    if any(after.values()):
+        raise RuntimeError(f"❌ Valeurs encore gonflées après migration : {after}")
+    print(f"✅ Timestamps de {table} corrigés")
+    return before
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Correction des timestamps µs chargés comme secondes")
+    parser.add_argument("--table", default=TABLE, help="Table RAW à corriger")
+    parser.add_argument("--dry-run", action="store_true", help="Compte les lignes sans les modifier")
+    args = parser.parse_args()
+    try:
+        migrate(args.table, dry_run=args.dry_run)
+    finally:
+        close_pool()
@@ -0,0 +1,101 @@
+# load/parallel_ingest.py
+"""
+Étape CPU de l'ingestion parallèle, exécutée dans un pool de processus :
+lecture parquet, harmonisation des colonnes, pré-validation éventuelle, dédoublonnage interne et calcul
+des empreintes (colonne ROW_FINGERPRINT du fichier préparé). Le résultat est
+écrit sur disque (parquet + .npy) pour ne renvoyer au coordinateur que des
+chemins, pas des DataFrames.
+"""
+import queue
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+
+from dedup import first_occurrence_mask, pickup_month_codes, row_fingerprints, with_fingerprints
+from projection import projected_columns
+from type_plan import read_frame
+
+
+@dataclass
+class PreparedFile:
+    source: Path
+    prepared: Path
+    fingerprints: Path
+    months: Path
+    rows_read: int
+    rows_kept: int
+    rows_rejected: int = 0
+    rejects_by_rule: dict = None
+    # Durées mesurées dans le worker {étape: secondes}, reportées dans la télémétrie du coordinateur
+    stage_seconds: dict = None
+
+    @property
+    def in_file_duplicates(self) -> int:
+        return self.rows_read - self.rows_rejected - self.rows_kept
+
+
+def prepare_file(source: Path, out_dir: Path, keys: list, prevalidator=None, projection=None) -> PreparedFile:
+    """
+    Lit (plan de types, projection facultative), pré-valide (prevalidator facultatif),
+    dédoublonne (empreinte des clés) et écrit le fichier préparé dans out_dir.
+    """
+    source, out_dir = Path(source), Path(out_dir)
+    stage_seconds = {}
+    start = time.perf_counter()
+    validation = prevalidator.for_file(source) if prevalidator is not None else None
+    try:
+        df = read_frame(source, validation.filter if validation is not None else None,
+                        projected_columns(projection, pq.read_schema(source)))
+    finally:
+        if validation is not None:
+            validation.close()
+    rows_read = validation.rows_checked if validation is not None else len(df)
+    stage_seconds["read"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fingerprints = row_fingerprints(df, keys)
+    months = pickup_month_codes(df)
+    keep = first_occurrence_mask(fingerprints)
+    df = with_fingerprints(df[keep].reset_index(drop=True), fingerprints[keep])
+    stage_seconds["dedup"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    prepared = out_dir / source.name
+    fingerprints_path = out_dir / f"{source.stem}.fingerprints.npy"
+    months_path = out_dir / f"{source.stem}.months.npy"
+    df.to_parquet(prepared, index=False)
+    np.save(fingerprints_path, fingerprints[keep])
+    np.save(months_path, months[keep])
+    stage_seconds["handoff"] = time.perf_counter() - start
+
+    if validation is None:
+        return PreparedFile(source, prepared, fingerprints_path, months_path, rows_read, len(df),
+                            stage_seconds=stage_seconds)
+    validation.report()
+    return PreparedFile(source, prepared, fingerprints_path, months_path, rows_read, len(df),
+                        validation.rejected, dict(validation.by_rule), stage_seconds)
+
+
+class BufferSlots:
+    """
+    Tables buffer dédiées aux workers d'upload (<buffer>_W0 ... <buffer>_Wn) :
+    un upload emprunte une table libre et la rend après le MERGE.
+    """
+
+    def __init__(self, table_buffer: str, count: int):
+        self.tables = [f"{table_buffer}_W{i}" for i in range(max(count, 1))]
+        self._free = queue.Queue()
+        for table in self.tables:
+            self._free.put(table)
+
+    @contextmanager
+    def slot(self):
+        table = self._free.get()
+        try:
+            yield table
+        finally:
+            self._free.put(table)
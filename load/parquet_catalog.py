@@ -0,0 +1,310 @@
+# load/parquet_catalog.py
+"""
+Catalogue local des fichiers parquet téléchargés (extract/data) :
+  - réécriture en partitions year=YYYY/month=MM, lignes triées par date de prise
+    en charge, row groups de taille bornée, compression zstd
+  - index JSON des statistiques de footer (_catalog.json) : lignes, plage de prise
+    en charge par fichier et par row group, NULL par colonne, empreinte du schéma
+
+Le chargement (merge_dynamic.py) lit l'index au lieu d'ouvrir les fichiers pour
+planifier les fenêtres, écarter les row groups hors de la plage demandée et
+signaler les dérives de schéma. Les fichiers à plat de extract/data servent de
+boîte d'arrivée : tout fichier déposé (ou re-téléchargé) est catalogué au run
+suivant, puis supprimé (--keep-source pour le conserver).
+
+Usage :
+    python load/parquet_catalog.py
+    python load/parquet_catalog.py --keep-source --row-group-rows 250000
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from ingestion_ledger import file_md5, file_month
+from load_strategy import PICKUP_COLUMN, PickupWindow, footer_window
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "extract" / "data"
+CATALOG_DIR = "catalog"
+INDEX_NAME = "_catalog.json"
+# ~75 Mo non compressés par row group : quelques jours de courses par row group
+ROW_GROUP_ROWS = int(os.getenv("CATALOG_ROW_GROUP_ROWS", "500000"))
+COMPRESSION = "zstd"
+
+
+def schema_hash(schema) -> str:
+    """Même empreinte que le registre d'ingestion (noms en majuscules + types Arrow)."""
+    schema_text = ",".join(f"{field.name.upper()}:{field.type}" for field in schema)
+    return hashlib.sha1(schema_text.encode("utf-8")).hexdigest()
+
+
+def partition_path(root: Path, name: str) -> Path:
+    """yellow_tripdata_2024-01.parquet -> catalog/year=2024/month=01/yellow_tripdata_2024-01.parquet"""
+    month = file_month(name)
+    if month is None:
+        return Path(root) / CATALOG_DIR / "unpartitioned" / name
+    year, mon = month.split("-")
+    return Path(root) / CATALOG_DIR / f"year={year}" / f"month={mon}" / name
+
+
+def _timestamp(value):
+    return pd.Timestamp(value).isoformat() if value is not None else None
+
+
+def footer_stats(path: Path) -> dict:
+    """Statistiques du footer (aucune donnée lue) : lignes, schéma, plages et NULL par colonne."""
+    metadata = pq.read_metadata(path)
+    schema = metadata.schema.to_arrow_schema()
+    null_counts = {name.upper(): 0 for name in schema.names}
+    row_groups = []
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        first = last = None
+        for j in range(row_group.num_columns):
+            chunk = row_group.column(j)
+            name = chunk.path_in_schema.upper()
+            stats = chunk.statistics
+            # Statistique absente dans un row group : nombre de NULL inconnu pour la colonne
+            if stats is None or not stats.has_null_count:
+                null_counts[name] = None
+            elif null_counts.get(name) is not None:
+                null_counts[name] += stats.null_count
+            if name == PICKUP_COLUMN and stats is not None and stats.has_min_max:
+                first, last = stats.min, stats.max
+        row_groups.append({"rows": row_group.num_rows, "pickup_min": _timestamp(first),
+                           "pickup_max": _timestamp(last)})
+
+    window = footer_window(path)
+    stat = Path(path).stat()
+    return {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "rows": metadata.num_rows,
+        "schema_hash": schema_hash(schema),
+        "columns": {field.name.upper(): str(field.type) for field in schema},
+        "pickup_min": _timestamp(window.first) if window is not None else None,
+        "pickup_max": _timestamp(window.last) if window is not None else None,
+        "null_counts": null_counts,
+        "row_groups": row_groups,
+    }
+
+
+def rewrite_file(source: Path, target: Path, row_group_rows: int = ROW_GROUP_ROWS):
+    """
+    Réécrit un fichier trié par date de prise en charge (plages de row groups
+    disjointes, donc élagables), en zstd ; écriture atomique.
+    """
+    table = pq.read_table(source)
+    pickup = next((name for name in table.column_names if name.upper() == PICKUP_COLUMN), None)
+    if pickup is not None:
+        table = table.sort_by([(pickup, "ascending")])
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f".{target.name}.tmp")
+    pq.write_table(table, tmp_path, row_group_size=row_group_rows, compression=COMPRESSION,
+                   write_statistics=True)
+    os.replace(tmp_path, target)
+
+
+def _window(first, last):
+    if first is None or last is None:
+        return None
+    return PickupWindow(pd.Timestamp(first), pd.Timestamp(last))
+
+
+def _overlaps(first, last, window: PickupWindow) -> bool:
+    """Plage [first, last] d'un fichier ou row group en intersection avec la fenêtre (inconnue : lue)."""
+    if first is None or last is None:
+        return True
+    return pd.Timestamp(first) <= window.last and pd.Timestamp(last) >= window.first
+
+
+@dataclass
+class PickupSelection:
+    """Row groups d'un fichier à lire pour une plage de prise en charge, et filtre exact des lignes."""
+    window: PickupWindow
+    row_groups: list
+    total_row_groups: int
+
+    def filter(self, data):
+        """Lignes d'un lot Arrow typé (plan de types) dans la plage [first, last]."""
+        pickups = data.column(PICKUP_COLUMN)
+        first = pd.Timestamp(self.window.first).to_datetime64()
+        last = pd.Timestamp(self.window.last).to_datetime64()
+        mask = pc.and_(pc.greater_equal(pickups, first), pc.less_equal(pickups, last))
+        return data.filter(pc.fill_null(mask, False))
+
+    def describe(self, name: str) -> str:
+        skipped = self.total_row_groups - len(self.row_groups)
+        return f"🎯 {name} : {len(self.row_groups)}/{self.total_row_groups} row group(s) lu(s), {skipped} écarté(s)"
+
+
+class ParquetCatalog:
+    """
+    Index JSON {nom_fichier: {path, month, statistiques de footer, source (taille, date,
+    MD5 du fichier à plat), catalogued_at}}, écrit de manière atomique. Une entrée dont le fichier a changé (taille ou date
+    de modification) est recalculée depuis son footer à la lecture.
+    """
+
+    def __init__(self, root: Path = DATA_DIR):
+        self.root = Path(root)
+        self.path = self.root / INDEX_NAME
+        self._lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Index du catalogue illisible ({e}), il sera reconstruit")
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.entries, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def contains(self, name: str) -> bool:
+        entry = self.entries.get(name)
+        return entry is not None and (self.root / entry["path"]).exists()
+
+    def entry(self, path: Path) -> dict:
+        """Entrée à jour d'un fichier catalogué (None s'il ne l'est pas)."""
+        path = Path(path)
+        entry = self.entries.get(path.name)
+        if entry is None or (self.root / entry["path"]).resolve() != path.resolve():
+            return None
+        stat = path.stat()
+        if entry.get("size") != stat.st_size or entry.get("mtime") != stat.st_mtime_ns:
+            with self._lock:
+                entry.update(footer_stats(path))
+                self._save()
+        return entry
+
+    def add(self, source: Path, keep_source: bool = False, row_group_rows: int = ROW_GROUP_ROWS) -> dict:
+        """Réécrit un fichier dans sa partition et indexe son footer."""
+        source = Path(source)
+        stat = source.stat()
+        target = partition_path(self.root, source.name)
+        rewrite_file(source, target, row_group_rows)
+        entry = {
+            "path": target.relative_to(self.root).as_posix(),
+            "month": file_month(source.name),
+            "source": {"size": stat.st_size, "mtime": stat.st_mtime_ns, "md5": file_md5(source)},
+            "catalogued_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **footer_stats(target),
+        }
+        with self._lock:
+            self.entries[source.name] = entry
+            self._save()
+        if not keep_source:
+            source.unlink()
+        return entry
+
+    def is_current(self, source: Path) -> bool:
+        """Fichier à plat déjà catalogué tel quel (conservé par --keep-source)."""
+        entry = self.entries.get(Path(source).name)
+        if entry is None or not self.contains(Path(source).name):
+            return False
+        stat = Path(source).stat()
+        recorded = entry.get("source", {})
+        return recorded.get("size") == stat.st_size and recorded.get("mtime") == stat.st_mtime_ns
+
+    def carry_over(self, ledger) -> list:
+        """
+        Fichiers ingérés avant leur catalogage : la réécriture change le hash du contenu,
+        le registre d'ingestion les reprend sous leur nouvelle identité (mêmes lignes, état
+        conservé) au lieu de les recharger. Renvoie les noms repris.
+        """
+        carried = []
+        for name, entry in sorted(self.entries.items()):
+            source_md5 = entry.get("source", {}).get("md5")
+            path = self.root / entry["path"]
+            if source_md5 and path.exists() and ledger.reidentify(path, source_md5, entry["rows"]):
+                carried.append(name)
+        return carried
+
+    def files(self) -> list:
+        """Fichiers à charger : fichiers catalogués, puis fichiers à plat pas encore catalogués."""
+        catalogued = [self.root / entry["path"] for _, entry in sorted(self.entries.items())
+                      if (self.root / entry["path"]).exists()]
+        names = {path.name for path in catalogued}
+        flat = sorted(path for path in self.root.glob("*.parquet") if path.name not in names)
+        return catalogued + flat
+
+    def window(self, path: Path):
+        """Plage de prise en charge lue dans l'index (footer du fichier s'il n'est pas catalogué)."""
+        entry = self.entry(path)
+        if entry is None:
+            return footer_window(path)
+        return _window(entry["pickup_min"], entry["pickup_max"])
+
+    def select(self, path: Path, window: PickupWindow):
+        """
+        Row groups de path en intersection avec la fenêtre, d'après l'index (ou le
+        footer). None si aucun : le fichier n'est pas ouvert.
+        """
+        entry = self.entry(path)
+        if entry is None:
+            entry = footer_stats(path)
+        if not _overlaps(entry["pickup_min"], entry["pickup_max"], window):
+            return None
+        row_groups = [i for i, group in enumerate(entry["row_groups"])
+                      if _overlaps(group["pickup_min"], group["pickup_max"], window)]
+        if not row_groups:
+            return None
+        return PickupSelection(window, row_groups, len(entry["row_groups"]))
+
+    def schema_drift(self) -> list:
+        """Changements de colonnes d'un mois au suivant : [(mois, ajoutées, retirées, retypées)]."""
+        drift = []
+        previous = None
+        for entry in sorted(self.entries.values(), key=lambda e: e.get("month") or ""):
+            columns = entry["columns"]
+            if previous is not None and entry["schema_hash"] != previous["schema_hash"]:
+                before = previous["columns"]
+                added = [c for c in columns if c not in before]
+                removed = [c for c in before if c not in columns]
+                retyped = [f"{c} {before[c]}→{columns[c]}" for c in columns if c in before and before[c] != columns[c]]
+                drift.append((entry["month"], added, removed, retyped))
+            previous = entry
+        return drift
+
+    def describe_drift(self) -> list:
+        lines = []
+        for month, added, removed, retyped in self.schema_drift():
+            details = [f"+{c}" for c in added] + [f"-{c}" for c in removed] + retyped
+            lines.append(f"🧬 Dérive de schéma en {month} : {', '.join(details)}")
+        return lines
+
+
+def build_catalog(data_dir: Path = DATA_DIR, keep_source: bool = False,
+                  row_group_rows: int = ROW_GROUP_ROWS) -> ParquetCatalog:
+    """Catalogue les fichiers à plat de data_dir (nouveaux ou modifiés) et affiche les dérives de schéma."""
+    catalog = ParquetCatalog(data_dir)
+    sources = sorted(path for path in Path(data_dir).glob("*.parquet") if not catalog.is_current(path))
+    for source in sources:
+        size = source.stat().st_size
+        entry = catalog.add(source, keep_source=keep_source, row_group_rows=row_group_rows)
+        print(f"🗂️ {source.name} → {entry['path']} ({entry['rows']} lignes, {len(entry['row_groups'])} "
+              f"row group(s), {size / 1024 / 1024:.1f} → {entry['size'] / 1024 / 1024:.1f} Mo)")
+    if not sources:
+        print("✔️ Catalogue à jour")
+    for line in catalog.describe_drift():
+        print(line)
+    return catalog
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Catalogue partitionné des fichiers parquet téléchargés")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--keep-source", action="store_true", help="Conserve les fichiers à plat après réécriture")
+    parser.add_argument("--row-group-rows", type=int, default=ROW_GROUP_ROWS, help="Lignes par row group")
+    args = parser.parse_args()
+    build_catalog(args.data_dir, keep_source=args.keep_source, row_group_rows=args.row_group_rows)
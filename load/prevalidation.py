@@ -0,0 +1,169 @@
+# load/prevalidation.py
+"""
+Pré-validation locale des trajets, avant upload : les règles de qualité du
+filtre dbt de stg__clean_trips (var trip_quality_rules de dbt_project.yml,
+macro trip_quality_filter) sont évaluées en Arrow, de façon vectorisée, sur
+les données typées par le plan de types. Les règles sont lues dans
+dbt_project.yml : Python et dbt ne peuvent pas diverger.
+
+Modes :
+  - report     : compte les rejets par règle, tout est chargé
+  - drop       : les lignes rejetées ne sont pas chargées
+  - quarantine : idem, et elles sont écrites dans <dossier>/<fichier>.rejected.parquet
+"""
+from dataclasses import dataclass
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import yaml
+
+DBT_PROJECT_FILE = Path(__file__).resolve().parents[1] / "nyc_taxi_dbt_snowflake" / "dbt_project.yml"
+RULES_VAR = "trip_quality_rules"
+DEFAULT_QUARANTINE_DIR = Path(__file__).parent / "quarantine"
+
+REPORT = "report"
+DROP = "drop"
+QUARANTINE = "quarantine"
+MODES = [REPORT, DROP, QUARANTINE]
+
+# Colonne listant les règles violées, ajoutée aux fichiers de quarantaine
+REJECT_RULES_COLUMN = "REJECT_RULES"
+
+
+def trip_duration_minutes(data):
+    """Équivalent de DATEDIFF('minute', pickup, dropoff) : frontières de minute franchies."""
+    return pc.minutes_between(data.column("TPEP_PICKUP_DATETIME"), data.column("TPEP_DROPOFF_DATETIME"))
+
+
+# Colonnes dérivées des règles (mêmes définitions que la macro trip_rule_column)
+DERIVED_COLUMNS = {
+    "TRIP_DURATION_MIN": trip_duration_minutes,
+}
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Ligne conservée si `column` est non NULL et dans [minimum, maximum] (bornes facultatives)."""
+    name: str
+    column: str
+    minimum: float = None
+    maximum: float = None
+
+    def valid_mask(self, data):
+        """Masque Arrow des lignes valides (NULL -> rejet, comme un WHERE SQL)."""
+        values = self.values(data)
+        if values is None:
+            return pa.array([False] * data.num_rows, pa.bool_())
+        mask = pc.is_valid(values)
+        if self.minimum is not None:
+            mask = pc.and_(mask, pc.greater_equal(values, self.minimum))
+        if self.maximum is not None:
+            mask = pc.and_(mask, pc.less_equal(values, self.maximum))
+        return pc.fill_null(mask, False)
+
+    def values(self, data):
+        if self.column in DERIVED_COLUMNS:
+            return DERIVED_COLUMNS[self.column](data)
+        if self.column in data.schema.names:
+            return data.column(self.column)
+        # Colonne absente : NULL dans RAW, donc rejetée par le filtre dbt
+        return None
+
+
+def load_rules(path: Path = DBT_PROJECT_FILE) -> list:
+    """Règles déclarées dans la variable dbt trip_quality_rules."""
+    project = yaml.safe_load(Path(path).read_text(encoding="utf-8"))
+    declared = (project.get("vars") or {}).get(RULES_VAR)
+    if not declared:
+        raise ValueError(f"❌ Variable {RULES_VAR} absente de {path}")
+    rules = []
+    for rule in declared:
+        column = str(rule["column"]).upper()
+        rules.append(Rule(rule["name"], column, rule.get("min"), rule.get("max")))
+    return rules
+
+
+class FilePrevalidation:
+    """Pré-validation d'un fichier source, lot par lot (compteurs et quarantaine)."""
+
+    def __init__(self, rules: list, source: Path, mode: str, quarantine_dir: Path):
+        self.rules = rules
+        self.source = Path(source)
+        self.mode = mode
+        self.quarantine_dir = Path(quarantine_dir)
+        self.rows_checked = 0
+        self.rejected = 0
+        self.by_rule = {rule.name: 0 for rule in rules}
+        self._writer = None
+
+    @property
+    def quarantine_file(self) -> Path:
+        return self.quarantine_dir / f"{self.source.stem}.rejected.parquet"
+
+    def filter(self, data):
+        """Évalue les règles sur un lot Arrow typé ; renvoie les lignes à charger."""
+        self.rows_checked += data.num_rows
+        if not data.num_rows:
+            return data
+        masks = [rule.valid_mask(data) for rule in self.rules]
+        valid = masks[0]
+        for rule, mask in zip(self.rules, masks):
+            self.by_rule[rule.name] += data.num_rows - (pc.sum(mask).as_py() or 0)
+            valid = pc.and_(valid, mask)
+        rejected = pc.invert(valid)
+        batch_rejected = pc.sum(rejected).as_py() or 0
+        self.rejected += batch_rejected
+
+        if self.mode == REPORT or not batch_rejected:
+            return data
+        if self.mode == QUARANTINE:
+            self._quarantine(data.filter(rejected), [pc.invert(mask).filter(rejected) for mask in masks])
+        return data.filter(valid)
+
+    def _quarantine(self, rows, failed):
+        """Lignes rejetées + liste des règles violées, ajoutées au fichier de quarantaine."""
+        names = [
+            ",".join(rule.name for rule, flags in zip(self.rules, row_flags) if flags)
+            for row_flags in zip(*(flags.to_pylist() for flags in failed))
+        ]
+        rows = pa.Table.from_batches([rows]) if isinstance(rows, pa.RecordBatch) else rows
+        rows = rows.append_column(REJECT_RULES_COLUMN, pa.array(names, pa.string()))
+        if self._writer is None:
+            self.quarantine_dir.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(self.quarantine_file, rows.schema)
+        self._writer.write_table(rows)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def report(self):
+        if not self.rejected:
+            print(f"🔎 Pré-validation {self.source.name} : aucune ligne rejetée")
+            return
+        action = {REPORT: "chargées quand même", DROP: "écartées", QUARANTINE: f"→ {self.quarantine_file}"}
+        print(f"🔎 Pré-validation {self.source.name} : {self.rejected}/{self.rows_checked} ligne(s) "
+              f"rejetée(s), {action[self.mode]}")
+        for name, count in self.by_rule.items():
+            if count:
+                print(f"   ↳ {name} : {count}")
+
+
+class Prevalidator:
+    """Règles + mode, partagés par tous les fichiers d'un run (sérialisable pour les processus)."""
+
+    def __init__(self, rules: list = None, mode: str = DROP, quarantine_dir: Path = DEFAULT_QUARANTINE_DIR):
+        if mode not in MODES:
+            raise ValueError(f"❌ Mode de pré-validation inconnu : {mode}")
+        self.rules = rules if rules is not None else load_rules()
+        self.mode = mode
+        self.quarantine_dir = Path(quarantine_dir)
+
+    def for_file(self, source: Path) -> FilePrevalidation:
+        validation = FilePrevalidation(self.rules, source, self.mode, self.quarantine_dir)
+        # Fichier rechargé : l'ancienne quarantaine est remplacée
+        validation.quarantine_file.unlink(missing_ok=True)
+        return validation
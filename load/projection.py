@@ -0,0 +1,97 @@
+# load/projection.py
+"""
+Plan de projection des colonnes : seules les colonnes source référencées par le
+projet dbt (sources, modèles, macros, snapshots, tests, variables de
+dbt_project.yml) sont lues et chargées dans RAW. La projection est appliquée à
+la lecture parquet (pushdown : les colonnes écartées ne sont ni décompressées
+ni décodées), donc aussi à l'upload et au stockage.
+
+Toujours conservées : les colonnes requises par l'ingestion (clé métier) et la
+liste d'audit (PROJECTION_KEEP=COL1,COL2 ou --keep-columns). Sans projet dbt
+lisible, aucune colonne n'est écartée.
+"""
+import os
+import re
+from pathlib import Path
+
+import pyarrow as pa
+
+DBT_PROJECT_DIR = Path(__file__).resolve().parents[1] / "nyc_taxi_dbt_snowflake"
+SCANNED_DIRS = ["models", "macros", "snapshots", "tests", "analyses", "seeds"]
+SCANNED_SUFFIXES = {".sql", ".yml", ".yaml"}
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# Commentaires SQL, Jinja et YAML : une colonne seulement citée en commentaire n'est pas lue
+_SQL_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/|\{#.*?#\}", re.DOTALL)
+_YAML_COMMENTS = re.compile(r"(^|\s)#[^\n]*")
+
+
+def keep_from_env() -> list:
+    return [col.strip().upper() for col in os.getenv("PROJECTION_KEEP", "").split(",") if col.strip()]
+
+
+def project_files(project_dir: Path = DBT_PROJECT_DIR) -> list:
+    files = [project_dir / "dbt_project.yml"]
+    for name in SCANNED_DIRS:
+        folder = project_dir / name
+        if folder.exists():
+            files += sorted(p for p in folder.rglob("*") if p.suffix in SCANNED_SUFFIXES)
+    return [f for f in files if f.exists()]
+
+
+def referenced_identifiers(project_dir: Path = DBT_PROJECT_DIR) -> set:
+    """Identifiants (majuscules) présents hors commentaires dans les fichiers du projet dbt."""
+    identifiers = set()
+    for path in project_files(project_dir):
+        text = path.read_text(encoding="utf-8")
+        pattern = _YAML_COMMENTS if path.suffix in (".yml", ".yaml") else _SQL_COMMENTS
+        identifiers.update(name.upper() for name in _IDENTIFIER.findall(pattern.sub(" ", text)))
+    return identifiers
+
+
+class ProjectionPlan:
+    """Colonnes conservées : référencées par dbt, requises par l'ingestion ou listées pour audit."""
+
+    def __init__(self, referenced: set, required: list = None, keep: list = None):
+        self.referenced = set(referenced)
+        self.required = [col.upper() for col in required or []]
+        self.keep = [col.upper() for col in keep or []]
+
+    def keeps(self, column: str) -> bool:
+        name = column.upper()
+        return name in self.referenced or name in self.required or name in self.keep
+
+    def columns(self, schema: pa.Schema) -> list:
+        """Noms (tels qu'écrits dans le fichier) des colonnes à lire, dans l'ordre du fichier."""
+        return [name for name in schema.names if self.keeps(name)]
+
+    def dropped(self, schema: pa.Schema) -> list:
+        return [name.upper() for name in schema.names if not self.keeps(name)]
+
+    def project_schema(self, schema: pa.Schema) -> pa.Schema:
+        return pa.schema([field for field in schema if self.keeps(field.name)])
+
+    def describe(self, schema: pa.Schema) -> str:
+        dropped = self.dropped(schema)
+        kept = len(schema.names) - len(dropped)
+        details = f" (écartées : {', '.join(dropped)})" if dropped else ""
+        return f"✂️ Projection dbt : {kept}/{len(schema.names)} colonnes lues{details}"
+
+
+def load_projection(required: list = None, keep: list = None,
+                    project_dir: Path = DBT_PROJECT_DIR) -> ProjectionPlan:
+    """Plan dérivé du projet dbt (None si le projet est introuvable : toutes les colonnes sont lues)."""
+    if not (project_dir / "dbt_project.yml").exists():
+        print(f"⚠️ Projet dbt introuvable ({project_dir}) : projection désactivée")
+        return None
+    return ProjectionPlan(referenced_identifiers(project_dir), required, (keep or []) + keep_from_env())
+
+
+def projected_columns(projection: ProjectionPlan, schema: pa.Schema):
+    """Argument columns= de pyarrow pour un fichier (None : toutes les colonnes)."""
+    return projection.columns(schema) if projection is not None else None
+
+
+def projected_schema(projection: ProjectionPlan, schema: pa.Schema) -> pa.Schema:
+    """Schéma du fichier restreint aux colonnes lues (inchangé sans projection)."""
+    return projection.project_schema(schema) if projection is not None else schema
@@ -0,0 +1,280 @@
+# load/result_cache.py
+"""
+Cache local (opt-in) des résultats de requêtes, en parquet :
+  - clé = SQL normalisé + LAST_ALTERED des tables sources : toute écriture
+    dans une source (DML ou DDL) invalide naturellement l'entrée
+  - éviction LRU par taille totale (date de dernier accès = mtime du fichier)
+  - écriture atomique (fichier temporaire puis rename) : une lecture
+    interrompue ne laisse jamais d'entrée partielle
+
+Les requêtes sur des vues, sur des tables introuvables ou sans table source
+identifiable ne sont pas mises en cache (fraîcheur non vérifiable). Une clause
+FROM qui n'est pas une liste de tables et de sous-requêtes (fonction table,
+LATERAL, PIVOT, jointure parenthésée...) rend la requête non cacheable : une
+source manquée servirait un résultat périmé.
+Variables : RESULT_CACHE=1 (cache utilisé sans le demander à chaque appel),
+RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB.
+"""
+import hashlib
+import os
+import re
+import threading
+import uuid
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_DIR = Path(os.getenv("RESULT_CACHE_DIR", Path(__file__).parent / ".result_cache"))
+DEFAULT_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "2048"))
+DEFAULT_BATCH_ROWS = 100_000
+
+# Jetons SQL : chaîne, identifiant entre guillemets, mot, caractère isolé
+_TOKEN_PATTERN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|[A-Za-z_][\w$]*|\S")
+_WORD_PATTERN = re.compile(r"[A-Za-z_][\w$]*|\"(?:[^\"]|\"\")*\"")
+# WITH nom AS ( ... ), nom AS ( ... ) : noms de CTE, à exclure des sources
+_CTE_PATTERN = re.compile(r"(?:\bWITH|,)\s*(?:RECURSIVE\s+)?\"?([A-Za-z_]\w*)\"?\s+AS\s*\(", re.IGNORECASE)
+_QUERY_STARTS = {"SELECT", "WITH"}
+# Mots qui terminent la liste FROM
+_FROM_END = {
+    "WHERE", "GROUP", "HAVING", "QUALIFY", "WINDOW", "ORDER", "LIMIT", "OFFSET", "FETCH",
+    "UNION", "EXCEPT", "INTERSECT", "MINUS",
+}
+_JOIN_WORDS = {"JOIN", "INNER", "LEFT", "RIGHT", "FULL", "OUTER", "CROSS", "NATURAL", "ASOF"}
+_CONDITION_WORDS = {"ON", "USING"}
+# Mots qui ne peuvent pas être un alias de table (PIVOT, SAMPLE, AT... : FROM non cacheable)
+_NOT_ALIASES = _FROM_END | _JOIN_WORDS | _CONDITION_WORDS | {
+    "AT", "BEFORE", "CHANGES", "LATERAL", "MATCH_RECOGNIZE", "PIVOT", "UNPIVOT", "SAMPLE", "TABLESAMPLE",
+}
+_NOT_TABLES = {"LATERAL", "TABLE", "VALUES", "UNNEST", "SELECT", "WITH"}
+_COMMENT_PATTERN = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+
+def cache_enabled_by_default() -> bool:
+    return os.getenv("RESULT_CACHE", "0").lower() in ("1", "true", "yes")
+
+
+def normalize_sql(sql: str) -> str:
+    """SQL sans commentaires ni variations d'espaces, pour une clé stable."""
+    return " ".join(_COMMENT_PATTERN.sub(" ", sql).split()).rstrip(";").strip()
+
+
+def _tokens(sql: str) -> list:
+    return _TOKEN_PATTERN.findall(_COMMENT_PATTERN.sub(" ", sql))
+
+
+def _is_word(token: str) -> bool:
+    return _WORD_PATTERN.fullmatch(token) is not None
+
+
+def _closing(tokens: list, i: int) -> int:
+    """Indice qui suit la parenthèse fermante associée à tokens[i] == "("."""
+    depth = 0
+    for j in range(i, len(tokens)):
+        if tokens[j] == "(":
+            depth += 1
+        elif tokens[j] == ")":
+            depth -= 1
+            if depth == 0:
+                return j + 1
+    return len(tokens)
+
+
+def _from_list(tokens: list, i: int):
+    """
+    Tables de la liste FROM commençant à tokens[i] (virgules et JOIN compris),
+    None si un élément n'est ni une table ni une sous-requête. Les sous-requêtes
+    sont sautées : leurs propres FROM sont lus par source_tables().
+    """
+    tables = []
+    while True:
+        # Élément : sous-requête ou [base.][schéma.]table
+        if i >= len(tokens):
+            return None
+        if tokens[i] == "(":
+            if i + 1 >= len(tokens) or tokens[i + 1].upper() not in _QUERY_STARTS:
+                return None
+            i = _closing(tokens, i)
+        elif _is_word(tokens[i]) and tokens[i].upper() not in _NOT_TABLES:
+            parts = [tokens[i]]
+            i += 1
+            while i + 1 < len(tokens) and tokens[i] == "." and _is_word(tokens[i + 1]):
+                parts.append(tokens[i + 1])
+                i += 2
+            if len(parts) > 3 or (i < len(tokens) and tokens[i] in (".", "(")):
+                # Fonction table (read_parquet(...), IDENTIFIER(...)...) ou nom invalide
+                return None
+            tables.append(".".join(part.replace('"', "") for part in parts).upper())
+        else:
+            return None
+
+        # Alias
+        if i < len(tokens) and tokens[i].upper() == "AS":
+            i += 1
+        if i < len(tokens) and _is_word(tokens[i]) and tokens[i].upper() not in _NOT_ALIASES:
+            i += 1
+
+        # Condition de jointure : sautée jusqu'au prochain élément
+        if i < len(tokens) and tokens[i].upper() in _CONDITION_WORDS:
+            while (i < len(tokens) and tokens[i] not in (",", ")", ";")
+                   and tokens[i].upper() not in _FROM_END | _JOIN_WORDS):
+                i = _closing(tokens, i) if tokens[i] == "(" else i + 1
+
+        # Séparateur
+        if i >= len(tokens) or tokens[i] in (")", ";") or tokens[i].upper() in _FROM_END:
+            return tables
+        if tokens[i] == ",":
+            i += 1
+            continue
+        if tokens[i].upper() not in _JOIN_WORDS:
+            return None
+        while i < len(tokens) and tokens[i].upper() in _JOIN_WORDS - {"JOIN"}:
+            i += 1
+        if i >= len(tokens) or tokens[i].upper() != "JOIN":
+            return None
+        i += 1
+
+
+def source_tables(sql: str) -> list:
+    """
+    Tables lues par la requête (listes FROM complètes : virgules, JOIN, sous-requêtes),
+    noms de CTE exclus, en majuscules. Liste vide si la requête n'est pas un SELECT ou si
+    une liste FROM contient autre chose que des tables et des sous-requêtes.
+    """
+    tokens = _tokens(sql)
+    if not tokens or tokens[0].upper() not in _QUERY_STARTS:
+        return []
+    without_strings = " ".join(token for token in tokens if not token.startswith("'"))
+    ctes = {name.upper() for name in _CTE_PATTERN.findall(without_strings)}
+
+    # Une parenthèse ouvre une requête si elle commence par SELECT / WITH ; sinon le FROM
+    # qu'elle contient est un argument de fonction (EXTRACT(YEAR FROM ...), TRIM(... FROM ...))
+    query_scopes = [True]
+    tables = []
+    for i, token in enumerate(tokens):
+        if token == "(":
+            query_scopes.append(i + 1 < len(tokens) and tokens[i + 1].upper() in _QUERY_STARTS)
+        elif token == ")":
+            if len(query_scopes) > 1:
+                query_scopes.pop()
+        elif token.upper() == "FROM" and query_scopes[-1]:
+            if i >= 2 and tokens[i - 1].upper() == "DISTINCT" and tokens[i - 2].upper() in ("IS", "NOT"):
+                # IS [NOT] DISTINCT FROM : comparaison, pas une source
+                continue
+            found = _from_list(tokens, i + 1)
+            if found is None:
+                return []
+            for name in found:
+                if name not in ctes and name not in tables:
+                    tables.append(name)
+    return tables
+
+
+class CacheWriter:
+    """Écrit les batches d'un résultat dans un fichier temporaire, publié par commit()."""
+
+    def __init__(self, cache, key: str):
+        self.cache = cache
+        self.key = key
+        self.tmp_path = cache.directory / f".{key}.{uuid.uuid4().hex[:8]}.tmp"
+        self._writer = None
+
+    def write(self, batch: pa.RecordBatch):
+        if self._writer is None:
+            self.cache.directory.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(self.tmp_path, batch.schema, compression="zstd")
+        self._writer.write_batch(batch)
+
+    def commit(self):
+        """Publie l'entrée (résultats vides non mis en cache), puis éviction LRU."""
+        if self._writer is None:
+            return
+        self._writer.close()
+        os.replace(self.tmp_path, self.cache.path_for(self.key))
+        self.cache.evict()
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
+class ResultCache:
+    """Résultats parquet indexés par clé (SQL + versions des sources), bornés en taille."""
+
+    def __init__(self, directory: Path = None, max_mb: int = DEFAULT_MAX_MB):
+        self.directory = Path(directory or DEFAULT_DIR)
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(sql: str, versions: dict) -> str:
+        payload = normalize_sql(sql) + "|" + "|".join(f"{t}@{versions[t]}" for t in sorted(versions))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}.parquet"
+
+    def get(self, key: str) -> Path:
+        """Chemin de l'entrée (marquée comme récemment utilisée), None si absente."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def read_batches(self, path: Path, batch_rows: int = DEFAULT_BATCH_ROWS):
+        yield from pq.ParquetFile(path).iter_batches(batch_size=batch_rows)
+
+    def writer(self, key: str) -> CacheWriter:
+        return CacheWriter(self, key)
+
+    def entries(self) -> list:
+        """[(chemin, taille, dernier accès)] des entrées publiées."""
+        entries = []
+        for path in self.directory.glob("*.parquet"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def size_bytes(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> int:
+        """Supprime les entrées les moins récemment utilisées au-delà de max_bytes ; renvoie leur nombre."""
+        with self._lock:
+            entries = sorted(self.entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            evicted = 0
+            for path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                evicted += 1
+            return evicted
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            path.unlink(missing_ok=True)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Cache partagé, créé à la première utilisation."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
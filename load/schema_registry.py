@@ -0,0 +1,175 @@
+# load/schema_registry.py
+"""
+Cache des schémas de tables pour la durée d'un run : une seule requête
+INFORMATION_SCHEMA pour toutes les tables suivies, un seul diff par schéma
+source distinct, et un seul ALTER multi-colonnes pour les ajouts (dialecte
+du DDL fourni par le backend actif, cf. backends.py).
+Le cache n'est modifié que par les DDL émis par le registre lui-même.
+"""
+import hashlib
+
+from backends import get_backend
+
+# Noms renvoyés par INFORMATION_SCHEMA.COLUMNS -> noms utilisés dans nos DDL
+TYPE_ALIASES = {"TEXT": "VARCHAR"}
+# Types de DDL rapportés sous un autre nom par INFORMATION_SCHEMA (SMALLINT -> NUMBER)
+DDL_EQUIVALENTS = {"SMALLINT": "NUMBER", "INTEGER": "NUMBER", "INT": "NUMBER", "BIGINT": "NUMBER",
+                   # Types rapportés par le backend DuckDB
+                   "DOUBLE": "FLOAT", "TIMESTAMP": "TIMESTAMP_NTZ"}
+
+
+def schema_fingerprint(columns: dict) -> str:
+    """Empreinte stable d'un schéma {COLONNE: TYPE}."""
+    payload = "|".join(f"{name}:{sf_type}" for name, sf_type in sorted(columns.items()))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def comparable_type(sf_type: str) -> str:
+    """Type sans paramètres ni alias, pour comparer une DDL à INFORMATION_SCHEMA."""
+    base = sf_type.split("(")[0].strip().upper()
+    base = TYPE_ALIASES.get(base, base)
+    return DDL_EQUIVALENTS.get(base, base)
+
+
+def _sql_list(values: list) -> str:
+    return ", ".join(f"'{value}'" for value in values)
+
+
+class SchemaRegistry:
+    """
+    Registre des colonnes {COLONNE: TYPE} par table "SCHEMA.TABLE".
+    - columns()  : lit le cache, ou INFORMATION_SCHEMA au premier accès
+    - load()     : précharge plusieurs tables en une requête
+    - ensure()   : CREATE TABLE / ALTER TABLE ADD COLUMN pour couvrir un schéma cible
+    """
+
+    def __init__(self, execute, schema: str = None, backend=None):
+        self.execute = execute
+        self._schema = schema
+        self._backend = backend
+        self._columns = {}       # "SCHEMA.TABLE" -> {COLONNE: TYPE} ou None si absente
+        self._synced = set()     # ("SCHEMA.TABLE", empreinte du schéma cible)
+
+    # Résolus à l'usage : le backend peut être choisi après l'import (--warehouse)
+    @property
+    def backend(self):
+        return self._backend or get_backend()
+
+    @property
+    def schema(self) -> str:
+        return (self._schema or self.backend.default_schema).upper()
+
+    def qualified(self, table_name: str) -> str:
+        if "." in table_name:
+            parts = table_name.upper().split(".")
+            if len(parts) != 2:
+                raise ValueError("table_name doit être 'TABLE' ou 'SCHEMA.TABLE'")
+            return ".".join(parts)
+        return f"{self.schema}.{table_name.upper()}"
+
+    def load(self, table_names: list):
+        """Charge en une requête les tables absentes du cache."""
+        missing = [self.qualified(t) for t in table_names if self.qualified(t) not in self._columns]
+        if not missing:
+            return
+        by_schema = {}
+        for name in missing:
+            schema, table = name.split(".")
+            by_schema.setdefault(schema, []).append(table)
+
+        conditions = " OR ".join(
+            f"(TABLE_SCHEMA = '{schema}' AND TABLE_NAME IN ({_sql_list(tables)}))"
+            for schema, tables in by_schema.items()
+        )
+        sql = f"""
+        SELECT TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, DATA_TYPE
+        FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE {conditions}
+        """
+        try:
+            rows = self.execute(sql)
+        except Exception as e:
+            print(f"⚠️ Warning getting columns for {', '.join(missing)}: {e}")
+            return
+
+        for name in missing:
+            self._columns[name] = None
+        for schema, table, column, data_type in rows:
+            name = f"{schema.upper()}.{table.upper()}"
+            sf_type = data_type.upper()
+            self._columns.setdefault(name, None)
+            if self._columns[name] is None:
+                self._columns[name] = {}
+            self._columns[name][column.upper()] = TYPE_ALIASES.get(sf_type, sf_type)
+
+    def columns(self, table_name: str):
+        """{COLONNE: TYPE} de la table, None si elle n'existe pas."""
+        name = self.qualified(table_name)
+        self.load([name])
+        columns = self._columns.get(name)
+        return dict(columns) if columns is not None else None
+
+    def invalidate(self, table_name: str = None):
+        """Oublie une table (ou tout le cache) : relu au prochain accès."""
+        if table_name is None:
+            self._columns.clear()
+            self._synced.clear()
+            return
+        name = self.qualified(table_name)
+        self._columns.pop(name, None)
+        self._synced = {item for item in self._synced if item[0] != name}
+
+    def ensure(self, table_name: str, target: dict, verbose: bool = False) -> list:
+        """
+        Garantit que la table existe et contient toutes les colonnes de target
+        ({COLONNE: TYPE}). Renvoie les colonnes ajoutées. Le diff n'est calculé
+        qu'une fois par (table, schéma cible) ; les écarts de type sont signalés
+        sans conversion automatique.
+        """
+        name = self.qualified(table_name)
+        key = (name, schema_fingerprint(target))
+        if key in self._synced:
+            return []
+
+        existing = self.columns(name)
+        if existing is None:
+            sql = self.backend.create_table_sql(name, target)
+            if verbose:
+                print(f"[🛠️ SQL] {sql}")
+            self.execute(sql)
+            self._columns[name] = dict(target)
+            self._synced.add(key)
+            return list(target)
+
+        if verbose:
+            print(f"[INFO] Columns existing in {name}: {list(existing.keys())}")
+
+        to_add = [(col, sf_type) for col, sf_type in target.items() if col not in existing]
+        type_mismatches = [
+            (col, existing[col], sf_type)
+            for col, sf_type in target.items()
+            if col in existing and comparable_type(existing[col]) != comparable_type(sf_type)
+        ]
+
+        # Ajout des colonnes manquantes (un seul ALTER sur Snowflake)
+        if to_add:
+            for sql in self.backend.add_columns_sql(name, to_add):
+                if verbose:
+                    print(f"[SQL] {sql}")
+                self.execute(sql)
+            self._columns[name].update(dict(to_add))
+            for col, sf_type in to_add:
+                print(f"➕ Added column {col} {sf_type} to {name}")
+
+        # Signaler les mismatches de type
+        if type_mismatches:
+            print("⚠️ Type mismatches detected (Snowflake_type vs detected_pandas_type):")
+            for col, snow_type, detected in type_mismatches:
+                print(f"   - {col}: {snow_type} (Snowflake)  |  {detected} (detected)")
+            print("➡️ No automatic type conversion performed; review and alter types manually if needed.")
+
+        if not to_add and not type_mismatches and verbose:
+            print(f"[INFO] No schema changes required for {name}")
+
+        self._synced.add(key)
+        return [col for col, _ in to_add]
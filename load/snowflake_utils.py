@@ -1,37 +1,235 @@
 # load/snowflake_utils.py
+import logging
 import os
-import snowflake.connector
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from backends import get_backend
+from result_cache import (
+    DEFAULT_BATCH_ROWS, ResultCache, cache_enabled_by_default, get_result_cache, normalize_sql, source_tables,
+)
+from telemetry import record_query
+
+logger = logging.getLogger(__name__)
+
+# Taille max du pool et durée d'inactivité avant fermeture d'une connexion (secondes)
+DEFAULT_POOL_SIZE = int(os.getenv("SNOWFLAKE_POOL_SIZE", "4"))
+DEFAULT_IDLE_TIMEOUT = 300
+# Au-delà de cette inactivité, une connexion est testée (SELECT 1) avant d'être réutilisée
+HEALTH_CHECK_AFTER = 60
+
 
-# ✅ 1. Connexion unique à Snowflake
+# ✅ 1. Connexion unique à l'entrepôt
 def get_connection():
     """
-    Initialise une connexion Snowflake à partir des variables d'environnement (.env).
-    Variables requises :
+    Ouvre une connexion sur le backend actif (backends.py, WAREHOUSE_BACKEND).
+    Snowflake (défaut) : variables d'environnement (.env) requises
       SNOWFLAKE_USER, SNOWFLAKE_PASSWORD, SNOWFLAKE_ACCOUNT,
       SNOWFLAKE_WAREHOUSE, SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA, SNOWFLAKE_ROLE
+    DuckDB : fichier local DUCKDB_PATH (load/local_warehouse.duckdb par défaut).
     """
-    try:
-        conn = snowflake.connector.connect(
-            user=os.getenv("SNOWFLAKE_USER"),
-            password=os.getenv("SNOWFLAKE_PASSWORD"),
-            account=os.getenv("SNOWFLAKE_ACCOUNT"),
-            warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
-            database=os.getenv("SNOWFLAKE_DATABASE"),
-            schema=os.getenv("SNOWFLAKE_SCHEMA"),
-            role=os.getenv("SNOWFLAKE_ROLE"),
-        )
+    return get_backend().connect()
+
+
+# ✅ 2. Pool de connexions partagé
+class ConnectionPool:
+    """
+    Pool de connexions thread-safe :
+      - au plus max_size connexions ouvertes (les appelants attendent au-delà)
+      - les connexions inactives depuis idle_timeout secondes sont fermées
+      - une connexion restée inactive est testée avant réutilisation
+      - durée cumulée et nombre de requêtes dans self.stats
+    `connect` est la fabrique de connexions (get_connection par défaut : backend
+    actif) ; toute autre fabrique de connexions DB-API peut la remplacer.
+    """
+
+    def __init__(self, connect=get_connection, max_size: int = DEFAULT_POOL_SIZE,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT, acquire_timeout: float = 120):
+        self._connect = connect
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self._idle = []          # [(connexion, dernière utilisation)]
+        self._open = 0           # connexions ouvertes (inactives + empruntées)
+        self._cond = threading.Condition()
+        self.stats = {"created": 0, "reused": 0, "evicted": 0, "queries": 0, "query_seconds": 0.0}
+
+    def _evict_idle(self):
+        """Ferme les connexions inactives depuis trop longtemps (appelé sous verrou)."""
+        now = time.monotonic()
+        expired = [(c, t) for c, t in self._idle if now - t > self.idle_timeout]
+        for item in expired:
+            self._idle.remove(item)
+            self._open -= 1
+            self.stats["evicted"] += 1
+            _close_quietly(item[0])
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        is_closed = getattr(conn, "is_closed", None)
+        if callable(is_closed) and is_closed():
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._open < self.max_size:
+                    self._open += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"❌ Aucune connexion disponible après {self.acquire_timeout}s")
+                self._cond.wait(remaining)
+
+        if conn is not None:
+            if time.monotonic() - last_used < HEALTH_CHECK_AFTER or self._is_healthy(conn):
+                self.stats["reused"] += 1
+                return conn
+            _close_quietly(conn)
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        self.stats["created"] += 1
         return conn
-    except Exception as e:
-        raise RuntimeError(f"❌ Erreur de connexion Snowflake : {e}")
 
-# ✅ 2. Exécution d'une requête SQL classique
-def execute_sql(sql: str, verbose: bool = False):
+    def release(self, conn, broken: bool = False):
+        with self._cond:
+            if broken:
+                self._open -= 1
+                _close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Emprunte une connexion du pool : `with pool.connection() as conn:`"""
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            is_closed = getattr(conn, "is_closed", None)
+            broken = callable(is_closed) and is_closed()
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Regroupe plusieurs requêtes DML dans une transaction (BEGIN / COMMIT,
+        ROLLBACK en cas d'erreur). Attention : un DDL valide implicitement la
+        transaction en cours côté Snowflake.
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            try:
+                yield conn
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            finally:
+                cursor.close()
+
+    def record(self, elapsed: float):
+        with self._cond:
+            self.stats["queries"] += 1
+            self.stats["query_seconds"] += elapsed
+
+    def close_all(self):
+        with self._cond:
+            for conn, _ in self._idle:
+                _close_quietly(conn)
+            self._open -= len(self._idle)
+            self._idle = []
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Pool partagé par tous les helpers, créé à la première utilisation."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def configure_pool(connect=get_connection, max_size: int = DEFAULT_POOL_SIZE,
+                   idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> ConnectionPool:
+    """Remplace le pool partagé (autre fabrique de connexions, autre taille...)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = ConnectionPool(connect=connect, max_size=max_size, idle_timeout=idle_timeout)
+        return _pool
+
+
+def close_pool():
+    """Ferme toutes les connexions inactives du pool partagé."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            logger.info(f"Pool stats: {_pool.stats}")
+            _pool.close_all()
+            _pool = None
+
+
+# ✅ 3. Exécution d'une requête SQL classique
+def execute_sql(sql: str, verbose: bool = False, conn=None):
     """
     Exécute une requête SQL et renvoie le résultat sous forme de liste.
+    Sans `conn`, une connexion est empruntée au pool puis rendue ;
+    avec `conn` (ex. dans pool.transaction()), la requête s'exécute
+    sur cette connexion sans commit.
     """
-    conn = get_connection()
+    if conn is not None:
+        return _run(conn, sql, verbose, commit=False)
+    with get_pool().connection() as pooled:
+        return _run(pooled, sql, verbose, commit=True)
+
+
+def _run(conn, sql: str, verbose: bool, commit: bool):
     cursor = conn.cursor()
+    start = time.perf_counter()
 
     try:
         if verbose:
@@ -40,35 +238,177 @@ def execute_sql(sql: str, verbose: bool = False):
         cursor.execute(sql)
         results = cursor.fetchall() if cursor.description else []
 
-        conn.commit()
+        if commit:
+            conn.commit()
         return results
 
     except Exception as e:
-        conn.rollback()
+        if commit:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
         print(f"⚠️ Erreur d'exécution SQL : {e}")
         raise
 
     finally:
+        elapsed = time.perf_counter() - start
+        get_pool().record(elapsed)
+        # sfqid : query ID Snowflake (absent sur DuckDB), rattaché au span de télémétrie courant
+        query_id = getattr(cursor, "sfqid", None)
+        record_query(query_id, elapsed)
+        logger.debug(f"SQL {elapsed:.3f}s [{query_id or '-'}] : {' '.join(sql.split())[:120]}")
         cursor.close()
-        conn.close()
 
-# ✅ 3. Exécution d'une requête SQL avec sortie en DataFrame Pandas
-def execute_sql_df(sql: str, verbose: bool = False) -> pd.DataFrame:
+
+def execute_in_transaction(statements: list, verbose: bool = False) -> list:
+    """Exécute plusieurs requêtes dans une même transaction, renvoie leurs résultats."""
+    with get_pool().transaction() as conn:
+        return [execute_sql(sql, verbose=verbose, conn=conn) for sql in statements]
+
+
+def write_frame(conn, df: pd.DataFrame, table_name: str, compression: str = None):
     """
-    Exécute une requête SQL et renvoie un DataFrame pandas.
+    Charge un DataFrame dans une table existante, renvoie (succès, nb lignes).
+    Délégué au backend actif : write_pandas pour Snowflake (compression du
+    fichier intermédiaire : gzip par défaut, ou snappy), insertion directe
+    du DataFrame enregistré pour DuckDB.
+    Pour un gros DataFrame : chunked_upload.upload_chunked (chunks, relances).
     """
-    conn = get_connection()
-
+    start = time.perf_counter()
     try:
+        return get_backend().write_frame(conn, df, table_name, compression=compression)
+    finally:
+        elapsed = time.perf_counter() - start
+        get_pool().record(elapsed)
+        record_query(None, elapsed)
+
+
+# ✅ 4. Lecture de résultats en Arrow (batches, DataFrame, parquet), cache local facultatif
+def _resolve_cache(cache):
+    """cache : None (RESULT_CACHE), True / False, ou une instance de ResultCache."""
+    if cache is None:
+        cache = cache_enabled_by_default()
+    if cache is True:
+        return get_result_cache()
+    return cache or None
+
+
+def _cache_key(cache: ResultCache, sql: str, tables: list = None, verbose: bool = False):
+    """Clé de cache de la requête, None si la fraîcheur de ses sources n'est pas vérifiable."""
+    tables = [t.upper() for t in tables] if tables else source_tables(sql)
+    if not tables:
+        return None
+    versions = get_backend().last_altered(execute_sql, tables)
+    stale = [table for table, version in versions.items() if version is None]
+    if stale:
         if verbose:
-            print(f"[SQL DF] {sql}")
+            print(f"[CACHE] non utilisé : date de modification inconnue pour {', '.join(stale)}")
+        return None
+    return cache.key(sql, versions)
 
-        df = pd.read_sql(sql, conn)
-        return df
 
-    except Exception as e:
-        print(f"⚠️ Erreur lors de la récupération du DataFrame : {e}")
-        raise
+def iter_sql_batches(sql: str, batch_rows: int = DEFAULT_BATCH_ROWS, frames: bool = False,
+                     cache=None, tables: list = None, verbose: bool = False):
+    """
+    Itère le résultat d'une requête par batches Arrow (pyarrow.RecordBatch, ou
+    DataFrame si frames=True), sans matérialiser le résultat complet.
+    cache : résultat relu depuis le cache local s'il est frais, sinon écrit dans
+    le cache au fil de la lecture (entrée publiée seulement si l'itération va au bout).
+    tables : tables sources pour la clé de cache (défaut : déduites des listes FROM, cf. source_tables).
+    La connexion reste empruntée au pool tant que l'itération n'est pas terminée ou fermée.
+    """
+    cache = _resolve_cache(cache)
+    key = _cache_key(cache, sql, tables, verbose) if cache is not None else None
+    hit = cache.get(key) if key is not None else None
+    if hit is not None:
+        if verbose:
+            print(f"[CACHE] {hit.name}")
+        for batch in cache.read_batches(hit, batch_rows):
+            yield batch.to_pandas() if frames else batch
+        return
 
-    finally:
-        conn.close()
+    backend = get_backend()
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        writer = cache.writer(key) if key is not None else None
+        committed = False
+        try:
+            if verbose:
+                print(f"[SQL ARROW] {sql}")
+            start = time.perf_counter()
+            cursor.execute(sql)
+            elapsed = time.perf_counter() - start
+            get_pool().record(elapsed)
+            record_query(getattr(cursor, "sfqid", None), elapsed)
+
+            for batch in backend.arrow_batches(cursor, batch_rows):
+                if writer is not None:
+                    writer.write(batch)
+                yield batch.to_pandas() if frames else batch
+            if writer is not None:
+                writer.commit()
+                committed = True
+        except Exception as e:
+            print(f"⚠️ Erreur lors de la lecture Arrow : {e}")
+            raise
+        finally:
+            if writer is not None and not committed:
+                writer.abort()
+            cursor.close()
+
+
+def execute_sql_df(sql: str, verbose: bool = False, cache=None, tables: list = None,
+                   arrow_dtypes: bool = False) -> pd.DataFrame:
+    """
+    Exécute une requête SQL et renvoie un DataFrame pandas, construit à partir
+    des batches Arrow (types natifs, pas de conversion ligne à ligne).
+    arrow_dtypes=True : colonnes pd.ArrowDtype (chaînes sans objets Python, mémoire réduite).
+    cache / tables : voir iter_sql_batches.
+    """
+    batches = list(iter_sql_batches(sql, cache=cache, tables=tables, verbose=verbose))
+    if not batches:
+        # Résultat vide : colonnes seules (le schéma Arrow n'est pas toujours fourni)
+        return pd.DataFrame(columns=_result_columns(sql))
+    table = pa.Table.from_batches(batches)
+    return table.to_pandas(types_mapper=pd.ArrowDtype if arrow_dtypes else None, self_destruct=True)
+
+
+def _result_columns(sql: str) -> list:
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT * FROM ({normalize_sql(sql)}) LIMIT 0")
+            return [column[0] for column in cursor.description or []]
+        finally:
+            cursor.close()
+
+
+def execute_sql_to_parquet(sql: str, path: Path, batch_rows: int = DEFAULT_BATCH_ROWS, cache=None,
+                           tables: list = None, compression: str = "zstd", verbose: bool = False) -> int:
+    """
+    Écrit le résultat d'une requête dans un fichier parquet, batch par batch
+    (mémoire bornée par batch_rows). Renvoie le nombre de lignes écrites.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    writer = None
+    rows = 0
+    try:
+        for batch in iter_sql_batches(sql, batch_rows, cache=cache, tables=tables, verbose=verbose):
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, batch.schema, compression=compression)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    if writer is None:
+        print(f"⚠️ Résultat vide, {path.name} non écrit")
+        return 0
+    writer.close()
+    os.replace(tmp_path, path)
+    return rows
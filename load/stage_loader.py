@@ -0,0 +1,262 @@
+# load/stage_loader.py
+"""
+Chargement en masse par stage : fichiers parquet source -> chunks parquet zstd
+-> PUT en stage -> un COPY INTO par lot de fichiers.
+Aucun aller-retour pandas : les chunks sont réécrits directement en Arrow.
+"""
+import shutil
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dedup import FINGERPRINT_COLUMN, append_arrow_fingerprints
+from load_strategy import SOURCE_COLUMN
+from projection import projected_columns, projected_schema
+from type_plan import apply_type_plan, planned_schema
+
+# Snowflake recommande des fichiers de 100 à 250 Mo compressés pour COPY INTO
+TARGET_CHUNK_MB = 128
+COMPRESSION = "zstd"
+# Taille max d'un record batch lu depuis la source (lignes)
+READ_BATCH_ROWS = 128 * 1024
+
+
+@dataclass
+class FileLoadResult:
+    """Résultat de chargement d'un chunk (équivalent d'une ligne de résultat COPY INTO)."""
+    source: str
+    chunk: str
+    status: str
+    rows_parsed: int
+    rows_loaded: int
+    first_error: str = None
+
+
+def chunk_rows_for_target(parquet_file: pq.ParquetFile, target_chunk_mb: int, columns: list = None) -> int:
+    """
+    Lignes par chunk pour viser target_chunk_mb compressés (d'après le footer source,
+    limité aux colonnes lues si une projection s'applique).
+    """
+    metadata = parquet_file.metadata
+    if metadata.num_rows == 0:
+        return 1
+    wanted = set(columns) if columns is not None else None
+    compressed = sum(
+        metadata.row_group(i).column(j).total_compressed_size
+        for i in range(metadata.num_row_groups)
+        for j in range(metadata.num_columns)
+        if wanted is None or metadata.row_group(i).column(j).path_in_schema in wanted
+    )
+    bytes_per_row = max(compressed / metadata.num_rows, 1)
+    return max(int(target_chunk_mb * 1024 * 1024 / bytes_per_row), 1)
+
+
+def write_stage_chunks(source: Path, out_dir: Path, target_chunk_mb: int = TARGET_CHUNK_MB,
+                       compression: str = COMPRESSION, on_batch=None, transform=None,
+                       fingerprint_keys: list = None, source_name: str = None, projection=None) -> list:
+    """
+    Réécrit un fichier source en chunks parquet compressés de taille cible,
+    colonnes en majuscules et typées selon le plan de types. Retourne la liste des chunks écrits.
+    transform(batch) filtre chaque batch typé avant écriture (ex. pré-validation).
+    on_batch(batch) est appelé sur chaque batch écrit (ex. statistiques DQ dans la même passe).
+    fingerprint_keys : colonnes hachées dans ROW_FINGERPRINT, ajoutée à chaque batch.
+    source_name : valeur de SOURCE_FILE (provenance), ajoutée à chaque batch.
+    projection : plan de projection (projection.py), seules ses colonnes sont lues.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    parquet_file = pq.ParquetFile(source)
+    columns = projected_columns(projection, parquet_file.schema_arrow)
+    schema = planned_schema(projected_schema(projection, parquet_file.schema_arrow))
+    if fingerprint_keys:
+        schema = with_fingerprint_field(schema)
+    if source_name:
+        schema = with_source_field(schema)
+    chunk_rows = chunk_rows_for_target(parquet_file, target_chunk_mb, columns)
+
+    chunks = []
+    writer = None
+    rows_in_chunk = 0
+    try:
+        for batch in parquet_file.iter_batches(batch_size=min(chunk_rows, READ_BATCH_ROWS), columns=columns):
+            if writer is None or rows_in_chunk >= chunk_rows:
+                if writer is not None:
+                    writer.close()
+                chunk_path = out_dir / f"{source.stem}_{len(chunks):04d}.parquet"
+                writer = pq.ParquetWriter(chunk_path, schema, compression=compression)
+                chunks.append(chunk_path)
+                rows_in_chunk = 0
+            typed = apply_type_plan(batch)
+            if transform is not None:
+                typed = transform(typed)
+            if fingerprint_keys:
+                typed = append_arrow_fingerprints(typed, fingerprint_keys)
+            if source_name:
+                typed = typed.append_column(pa.field(SOURCE_COLUMN, pa.string()),
+                                            pa.array([source_name] * typed.num_rows, pa.string()))
+            writer.write_batch(typed)
+            if on_batch is not None:
+                on_batch(typed)
+            rows_in_chunk += typed.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return chunks
+
+
+# 🔌 Interface des moteurs de stage
+class StageEngine(ABC):
+    """
+    Interface : stage() dépose les chunks, copy_into() les charge dans une table
+    et renvoie un FileLoadResult par chunk.
+    """
+
+    @abstractmethod
+    def stage(self, table: str, chunks: list):
+        """Dépose les chunks dans le stage de la table."""
+
+    @abstractmethod
+    def copy_into(self, table: str, chunks: list) -> list:
+        """Charge les chunks déposés dans la table, un FileLoadResult par chunk."""
+
+
+class SnowflakeStageEngine(StageEngine):
+    """PUT dans le stage de table (@%TABLE) puis COPY INTO ... FILES=(...)."""
+
+    def __init__(self, execute, parallel: int = 8):
+        self.execute = execute
+        self.parallel = parallel
+
+    def stage(self, table: str, chunks: list):
+        # Un seul PUT par dossier grâce au joker : upload parallèle côté connecteur
+        for folder in sorted({chunk.parent for chunk in chunks}):
+            self.execute(
+                f"PUT 'file://{folder.as_posix()}/*.parquet' @%{table} "
+                f"AUTO_COMPRESS=FALSE OVERWRITE=TRUE PARALLEL={self.parallel}"
+            )
+
+    def copy_into(self, table: str, chunks: list) -> list:
+        # FORCE : les noms de chunks sont déterministes (<fichier>_0000.parquet), un chunk
+        # identique renvoyé (relance, --force) serait sinon ignoré par les métadonnées de
+        # chargement. Sans risque de doublon : le buffer est vidé après chaque MERGE ou échec.
+        files = ", ".join(f"'{chunk.name}'" for chunk in chunks)
+        rows = self.execute(f"""
+            COPY INTO {table}
+            FROM @%{table}
+            FILES = ({files})
+            FILE_FORMAT = (TYPE = PARQUET USE_LOGICAL_TYPE = TRUE)
+            MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
+            ON_ERROR = ABORT_STATEMENT
+            PURGE = TRUE
+            FORCE = TRUE
+        """)
+        by_name = {chunk.name: chunk for chunk in chunks}
+        results = []
+        # Colonnes COPY : file, status, rows_parsed, rows_loaded, error_limit, errors_seen, first_error...
+        for row in rows:
+            if len(row) < 4:
+                # "Copy executed with 0 files processed." : aucun chunk chargé (cf. checked_results)
+                continue
+            name = Path(str(row[0])).name
+            results.append(FileLoadResult(
+                source=source_name_for_chunk(by_name.get(name, Path(name))),
+                chunk=name,
+                status=str(row[1]),
+                rows_parsed=int(row[2] or 0),
+                rows_loaded=int(row[3] or 0),
+                first_error=row[6] if len(row) > 6 else None,
+            ))
+        return results
+
+
+class DuckDBStageEngine(StageEngine):
+    """
+    Moteur local de substitution : le "stage" est un dossier, le COPY est un
+    INSERT ... BY NAME depuis read_parquet() sur les chunks du lot.
+    Requêtes passées par `execute` (connexion empruntée au pool puis rendue, comme
+    SnowflakeStageEngine) ; chunks supprimés du stage après le COPY (PURGE).
+    """
+
+    def __init__(self, execute, stage_dir: Path):
+        self.execute = execute
+        self.stage_dir = Path(stage_dir)
+
+    def stage(self, table: str, chunks: list):
+        target = self.stage_dir / table
+        target.mkdir(parents=True, exist_ok=True)
+        for chunk in chunks:
+            shutil.copy2(chunk, target / chunk.name)
+
+    def copy_into(self, table: str, chunks: list) -> list:
+        staged = [self.stage_dir / table / chunk.name for chunk in chunks]
+        file_list = ", ".join(f"'{path.as_posix()}'" for path in staged)
+        try:
+            self.execute(
+                f"INSERT INTO {table} BY NAME SELECT * FROM read_parquet([{file_list}], union_by_name = true)"
+            )
+            status, error = "LOADED", None
+        except Exception as e:
+            status, error = "LOAD_FAILED", str(e)
+
+        results = []
+        for chunk, path in zip(chunks, staged):
+            rows = pq.ParquetFile(path).metadata.num_rows
+            path.unlink()
+            results.append(FileLoadResult(
+                source=source_name_for_chunk(chunk),
+                chunk=chunk.name,
+                status=status,
+                rows_parsed=rows,
+                rows_loaded=rows if status == "LOADED" else 0,
+                first_error=error,
+            ))
+        return results
+
+
+def checked_results(chunks: list, results: list) -> list:
+    """
+    Un résultat par chunk écrit : un chunk absent du résultat COPY (fichier ignoré)
+    ou dont les lignes chargées diffèrent des lignes écrites (footer du chunk) passe
+    en échec, même si le COPY n'a signalé aucune erreur.
+    """
+    by_chunk = {r.chunk: r for r in results}
+    checked = []
+    for chunk in chunks:
+        written = pq.ParquetFile(chunk).metadata.num_rows
+        result = by_chunk.get(chunk.name)
+        if result is None:
+            result = FileLoadResult(source=source_name_for_chunk(chunk), chunk=chunk.name, status="NOT_LOADED",
+                                    rows_parsed=0, rows_loaded=0, first_error="chunk absent du résultat COPY")
+        elif result.status == "LOADED" and result.rows_loaded != written:
+            result = FileLoadResult(source=result.source, chunk=result.chunk, status="PARTIALLY_LOADED",
+                                    rows_parsed=result.rows_parsed, rows_loaded=result.rows_loaded,
+                                    first_error=f"{result.rows_loaded} ligne(s) chargée(s) sur {written}")
+        checked.append(result)
+    return checked
+
+
+def source_name_for_chunk(chunk: Path) -> str:
+    """yellow_tripdata_2024-01_0003.parquet -> yellow_tripdata_2024-01.parquet"""
+    return f"{chunk.stem.rsplit('_', 1)[0]}.parquet"
+
+
+def with_fingerprint_field(schema: pa.Schema) -> pa.Schema:
+    return schema.append(pa.field(FINGERPRINT_COLUMN, pa.int64()))
+
+
+def with_source_field(schema: pa.Schema) -> pa.Schema:
+    return schema.append(pa.field(SOURCE_COLUMN, pa.string()))
+
+
+def unified_schema(sources: list, fingerprint: bool = False, source: bool = False, projection=None) -> pa.Schema:
+    """
+    Union des schémas (majuscules, plan de types) d'un lot de fichiers source,
+    restreints à la projection éventuelle, + ROW_FINGERPRINT et SOURCE_FILE si demandés.
+    """
+    schemas = [planned_schema(projected_schema(projection, pq.read_schema(path))) for path in sources]
+    schema = pa.unify_schemas(schemas, promote_options="permissive")
+    if fingerprint:
+        schema = with_fingerprint_field(schema)
+    return with_source_field(schema) if source else schema
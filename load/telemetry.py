@@ -0,0 +1,359 @@
+# load/telemetry.py
+"""
+Instrumentation du pipeline (téléchargement et ingestion) :
+  - spans par étape et par fichier : durée, lignes, octets, lignes/s, pic RSS,
+    requêtes entrepôt exécutées pendant le span (nombre, durée, query IDs)
+  - logs/telemetry.jsonl : une ligne JSON par span, écrite dès la fin du span
+  - logs/nyc_taxi_<pipeline>.prom : agrégats du dernier run au format textfile
+    Prometheus (node_exporter --collector.textfile.directory)
+  - profilage opt-in (cProfile) du run complet ou de certaines étapes
+
+Usage :
+    telemetry = start_run("ingestion")
+    with span("read", file=f.name) as s:
+        df = read_frame(f)
+        s.rows = len(df)
+    telemetry.finish()
+
+Sans start_run(), les spans sont rattachés à un run par défaut (pipeline "ingestion").
+Variables : TELEMETRY_DIR (dossier de sortie), TELEMETRY_PROFILE (all ou étapes séparées par des virgules).
+"""
+import contextvars
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_DIR = Path(os.getenv("TELEMETRY_DIR", Path(__file__).parent / "logs"))
+SPANS_FILE_NAME = "telemetry.jsonl"
+METRIC_PREFIX = "nyc_taxi_last_run"
+# Profil du run complet (par opposition à une liste d'étapes)
+PROFILE_ALL = "all"
+PROFILE_TOP = 25
+
+_current = contextvars.ContextVar("telemetry_span", default=None)
+_span_ids = itertools.count(1)
+
+
+def peak_rss_mb() -> float:
+    """Pic de mémoire résidente du processus et de ses enfants (Mo), None hors Unix."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss : Ko sous Linux, octets sous macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(max(own, children) / scale, 1)
+
+
+@dataclass
+class Span:
+    """Mesure d'une étape ; rows / bytes sont renseignés par le code instrumenté."""
+
+    stage: str
+    file: str = None
+    rows: int = None
+    bytes: int = None
+    seconds: float = 0.0
+    status: str = "ok"
+    error: str = None
+    queries: int = 0
+    query_seconds: float = 0.0
+    query_ids: list = field(default_factory=list)
+    attrs: dict = field(default_factory=dict)
+    span_id: int = field(default_factory=lambda: next(_span_ids))
+    parent_id: int = None
+    started_at: str = None
+    peak_rss_mb: float = None
+
+    @property
+    def rows_per_sec(self):
+        return round(self.rows / self.seconds) if self.rows and self.seconds else None
+
+    def add_query(self, query_id: str, seconds: float):
+        self.queries += 1
+        self.query_seconds += seconds
+        if query_id:
+            self.query_ids.append(query_id)
+
+    def to_dict(self) -> dict:
+        entry = asdict(self)
+        entry["seconds"] = round(self.seconds, 6)
+        entry["query_seconds"] = round(self.query_seconds, 6)
+        entry["rows_per_sec"] = self.rows_per_sec
+        return entry
+
+
+class Telemetry:
+    """Spans d'un run, thread-safe (uploads parallèles, téléchargements concurrents)."""
+
+    def __init__(self, pipeline: str = "ingestion", out_dir: Path = None, profile: str = None):
+        self.pipeline = pipeline
+        self.out_dir = Path(out_dir or DEFAULT_DIR)
+        self.run_id = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        self.spans = []
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+        self._profiles = {}      # étape -> pstats.Stats cumulées
+        self._run_profiler = None
+        profile = profile if profile is not None else os.getenv("TELEMETRY_PROFILE")
+        self.profile_stages = {s.strip() for s in profile.split(",") if s.strip()} if profile else set()
+        if PROFILE_ALL in self.profile_stages:
+            self._run_profiler = cProfile.Profile()
+            self._run_profiler.enable()
+
+    @property
+    def spans_file(self) -> Path:
+        return self.out_dir / SPANS_FILE_NAME
+
+    @property
+    def prometheus_file(self) -> Path:
+        return self.out_dir / f"nyc_taxi_{self.pipeline}.prom"
+
+    @contextmanager
+    def span(self, stage: str, file: str = None, rows: int = None, bytes: int = None, **attrs):
+        """
+        Mesure le bloc ; le span est enregistré même si le bloc lève une exception.
+        Le fichier est hérité du span englobant s'il n'est pas précisé.
+        """
+        parent = _current.get()
+        current = Span(stage=stage, file=file if file is not None else getattr(parent, "file", None),
+                       rows=rows, bytes=bytes, attrs=attrs, parent_id=getattr(parent, "span_id", None),
+                       started_at=datetime.now().isoformat(timespec="milliseconds"))
+        token = _current.set(current)
+        profiler = self._start_stage_profile(stage)
+        start = time.perf_counter()
+        try:
+            yield current
+        except BaseException as e:
+            current.status, current.error = "error", str(e)[:500]
+            raise
+        finally:
+            current.seconds = time.perf_counter() - start
+            self._stop_stage_profile(stage, profiler)
+            _current.reset(token)
+            current.peak_rss_mb = peak_rss_mb()
+            self.record(current)
+
+    def timed_iter(self, stage: str, iterable, file: str = None, rows=len):
+        """Un span par élément produit : seul le temps de production de l'élément est compté."""
+        iterator = iter(iterable)
+        while True:
+            with self.span(stage, file=file) as current:
+                item = next(iterator, StopIteration)
+                if item is StopIteration:
+                    current.attrs["exhausted"] = True
+                elif rows is not None:
+                    current.rows = rows(item)
+            if item is StopIteration:
+                return
+            yield item
+
+    def record(self, current: Span):
+        with self._lock:
+            self.spans.append(current)
+            try:
+                self.out_dir.mkdir(parents=True, exist_ok=True)
+                with open(self.spans_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"run_id": self.run_id, "pipeline": self.pipeline, **current.to_dict()},
+                                       default=str) + "\n")
+            except OSError as e:
+                print(f"⚠️ Télémétrie non écrite ({e})")
+
+    def add_query(self, query_id: str, seconds: float):
+        """Requête entrepôt : rattachée au span courant du thread et au total du run."""
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += seconds
+        current = _current.get()
+        if current is not None:
+            current.add_query(query_id, seconds)
+
+    # 🔬 Profilage opt-in
+    def _start_stage_profile(self, stage: str):
+        # Un seul profileur actif à la fois : les spans concurrents de la même étape ne sont pas profilés
+        if stage not in self.profile_stages or not self._profile_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            self._profile_lock.release()
+            return None
+        return profiler
+
+    def _stop_stage_profile(self, stage: str, profiler):
+        if profiler is None:
+            return
+        profiler.disable()
+        self._profile_lock.release()
+        with self._lock:
+            if stage in self._profiles:
+                self._profiles[stage].add(profiler)
+            else:
+                self._profiles[stage] = pstats.Stats(profiler)
+
+    def write_profiles(self) -> list:
+        """Écrit un .pstats (snakeviz, pstats) et un résumé texte par profil, renvoie les chemins."""
+        profiles = dict(self._profiles)
+        if self._run_profiler is not None:
+            self._run_profiler.disable()
+            profiles[PROFILE_ALL] = pstats.Stats(self._run_profiler)
+            self._run_profiler = None
+        written = []
+        profile_dir = self.out_dir / "profiles"
+        for name, stats in profiles.items():
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            path = profile_dir / f"{self.pipeline}_{self.run_id}_{name}.pstats"
+            stats.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(str(path), stream=summary).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            path.with_suffix(".txt").write_text(summary.getvalue(), encoding="utf-8")
+            written.append(path)
+        return written
+
+    # 📈 Agrégats
+    def by_stage(self) -> dict:
+        """{étape: {seconds, calls, rows, bytes, errors, queries}} sur les spans du run."""
+        stages = {}
+        with self._lock:
+            spans = list(self.spans)
+        for current in spans:
+            entry = stages.setdefault(current.stage, {"seconds": 0.0, "calls": 0, "rows": 0, "bytes": 0,
+                                                      "errors": 0, "queries": 0, "query_seconds": 0.0})
+            entry["seconds"] += current.seconds
+            entry["calls"] += 1
+            entry["rows"] += current.rows or 0
+            entry["bytes"] += current.bytes or 0
+            entry["errors"] += current.status != "ok"
+            entry["queries"] += current.queries
+            entry["query_seconds"] += current.query_seconds
+        return stages
+
+    def prometheus_text(self, success: bool = True) -> str:
+        labels = f'pipeline="{self.pipeline}"'
+        lines = []
+
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            for sample_labels, value in samples:
+                lines.append(f"{METRIC_PREFIX}_{name}{{{sample_labels}}} {value}")
+
+        stages = self.by_stage()
+        per_stage = [(f'{labels},stage="{stage}"', entry) for stage, entry in sorted(stages.items())]
+        metric("stage_seconds", "Wall time spent in each stage during the last run.",
+               [(l, round(e["seconds"], 6)) for l, e in per_stage])
+        metric("stage_calls", "Number of spans per stage during the last run.",
+               [(l, e["calls"]) for l, e in per_stage])
+        metric("stage_rows", "Rows processed per stage during the last run.",
+               [(l, e["rows"]) for l, e in per_stage])
+        metric("stage_bytes", "Bytes processed per stage during the last run.",
+               [(l, e["bytes"]) for l, e in per_stage])
+        metric("stage_errors", "Failed spans per stage during the last run.",
+               [(l, e["errors"]) for l, e in per_stage])
+        metric("stage_rows_per_second", "Throughput per stage during the last run.",
+               [(l, round(e["rows"] / e["seconds"], 1) if e["seconds"] else 0) for l, e in per_stage])
+        metric("duration_seconds", "Wall time of the last run.",
+               [(labels, round(time.perf_counter() - self.started, 6))])
+        metric("warehouse_queries", "Warehouse queries executed during the last run.", [(labels, self.queries)])
+        metric("warehouse_query_seconds", "Time spent in warehouse queries during the last run.",
+               [(labels, round(self.query_seconds, 6))])
+        rss = peak_rss_mb()
+        if rss is not None:
+            metric("peak_rss_bytes", "Peak resident memory of the last run.", [(labels, int(rss * 1024 * 1024))])
+        metric("success", "1 if the last run succeeded.", [(labels, int(success))])
+        metric("timestamp_seconds", "Unix time at the end of the last run.", [(labels, int(time.time()))])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, success: bool = True) -> Path:
+        """Écriture atomique (le collecteur textfile ne doit jamais lire un fichier partiel)."""
+        path = self.prometheus_file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".prom.tmp")
+        tmp_path.write_text(self.prometheus_text(success), encoding="utf-8")
+        os.replace(tmp_path, path)
+        return path
+
+    def report(self):
+        stages = self.by_stage()
+        if not stages:
+            return
+        print(f"\n⏱️ Télémétrie {self.pipeline} ({self.run_id}) :")
+        for stage, entry in sorted(stages.items(), key=lambda item: -item[1]["seconds"]):
+            throughput = ""
+            if entry["seconds"] and entry["rows"]:
+                throughput = f"{entry['rows'] / entry['seconds']:>10.0f} lignes/s"
+            elif entry["seconds"] and entry["bytes"]:
+                throughput = f"{entry['bytes'] / entry['seconds'] / 1024 / 1024:>10.1f} Mo/s"
+            print(f"   {stage:<12} {entry['seconds']:>9.3f}s  {entry['calls']:>5} span(s)  {throughput}")
+        print(f"   requêtes entrepôt : {self.queries} ({self.query_seconds:.3f}s), pic RSS {peak_rss_mb()} Mo")
+
+    def finish(self, success: bool = True, verbose: bool = True):
+        """Fin de run : textfile Prometheus, profils éventuels et résumé."""
+        try:
+            prom = self.write_prometheus(success)
+        except OSError as e:
+            print(f"⚠️ Métriques Prometheus non écrites ({e})")
+            prom = None
+        profiles = self.write_profiles()
+        if verbose:
+            self.report()
+            if prom is not None:
+                print(f"📈 Spans : {self.spans_file} | métriques : {prom}")
+            for path in profiles:
+                print(f"🔬 Profil : {path} (résumé {path.with_suffix('.txt').name})")
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    """Run actif, créé à la première utilisation."""
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = Telemetry()
+        return _telemetry
+
+
+def start_run(pipeline: str = "ingestion", out_dir: Path = None, profile: str = None) -> Telemetry:
+    """Démarre un nouveau run (nouveau run_id, spans remis à zéro)."""
+    global _telemetry
+    with _telemetry_lock:
+        _telemetry = Telemetry(pipeline, out_dir, profile)
+        return _telemetry
+
+
+def span(stage: str, file: str = None, rows: int = None, bytes: int = None, **attrs):
+    return get_telemetry().span(stage, file=file, rows=rows, bytes=bytes, **attrs)
+
+
+def timed_iter(stage: str, iterable, file: str = None, rows=len):
+    return get_telemetry().timed_iter(stage, iterable, file=file, rows=rows)
+
+
+def record_query(query_id: str, seconds: float):
+    get_telemetry().add_query(query_id, seconds)
+
+
+def record_span(stage: str, seconds: float, file: str = None, rows: int = None, bytes: int = None, **attrs):
+    """Span mesuré ailleurs (ex. worker d'un pool de processus), ajouté au run courant."""
+    get_telemetry().record(Span(stage=stage, file=file, rows=rows, bytes=bytes, seconds=seconds, attrs=attrs,
+                                started_at=datetime.now().isoformat(timespec="milliseconds")))
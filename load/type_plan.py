@@ -0,0 +1,100 @@
+# load/type_plan.py
+"""
+Plan de types explicite des colonnes NYC Taxi, appliqué en Arrow avant tout
+chargement (pandas, streaming, stage) : timestamps en microsecondes, identifiants
+en entiers courts. Les colonnes RAW arrivent ainsi typées nativement et le
+staging dbt peut filtrer (et élaguer) directement sur elles.
+Les colonnes absentes du plan gardent leur type source.
+"""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+TIMESTAMP = pa.timestamp("us")
+AMOUNT = pa.float64()
+
+# Colonne (majuscules) -> (type Arrow, type Snowflake)
+TYPE_PLAN = {
+    "VENDORID": (pa.int16(), "SMALLINT"),
+    "TPEP_PICKUP_DATETIME": (TIMESTAMP, "TIMESTAMP_NTZ"),
+    "TPEP_DROPOFF_DATETIME": (TIMESTAMP, "TIMESTAMP_NTZ"),
+    "PASSENGER_COUNT": (pa.int16(), "SMALLINT"),
+    "TRIP_DISTANCE": (pa.float64(), "FLOAT"),
+    "RATECODEID": (pa.int16(), "SMALLINT"),
+    "STORE_AND_FWD_FLAG": (pa.string(), "VARCHAR"),
+    "PULOCATIONID": (pa.int16(), "SMALLINT"),
+    "DOLOCATIONID": (pa.int16(), "SMALLINT"),
+    "PAYMENT_TYPE": (pa.int16(), "SMALLINT"),
+    "FARE_AMOUNT": (AMOUNT, "FLOAT"),
+    "EXTRA": (AMOUNT, "FLOAT"),
+    "MTA_TAX": (AMOUNT, "FLOAT"),
+    "TIP_AMOUNT": (AMOUNT, "FLOAT"),
+    "TOLLS_AMOUNT": (AMOUNT, "FLOAT"),
+    "IMPROVEMENT_SURCHARGE": (AMOUNT, "FLOAT"),
+    "TOTAL_AMOUNT": (AMOUNT, "FLOAT"),
+    "CONGESTION_SURCHARGE": (AMOUNT, "FLOAT"),
+    "AIRPORT_FEE": (AMOUNT, "FLOAT"),
+    "CBD_CONGESTION_FEE": (AMOUNT, "FLOAT"),
+    # Empreinte de la clé métier, ajoutée à l'ingestion (dedup.py)
+    "ROW_FINGERPRINT": (pa.int64(), "BIGINT"),
+    # Fichier source de la ligne, ajouté à l'ingestion (load_strategy.py)
+    "SOURCE_FILE": (pa.string(), "VARCHAR"),
+}
+
+# Entiers Arrow -> dtypes pandas nullables (un entier avec NULL ne doit pas redevenir float)
+PANDAS_TYPES = {
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+}
+
+
+def planned_schema(schema: pa.Schema) -> pa.Schema:
+    """Schéma cible : noms en majuscules, types du plan pour les colonnes connues."""
+    fields = []
+    for field in schema:
+        name = field.name.upper()
+        arrow_type = TYPE_PLAN[name][0] if name in TYPE_PLAN else field.type
+        fields.append(pa.field(name, arrow_type, nullable=True))
+    return pa.schema(fields)
+
+
+def apply_type_plan(data):
+    """
+    Applique le plan à une Table ou un RecordBatch Arrow (cast sûr : une valeur
+    non représentable, ex. 1.5 passager, lève une erreur au lieu d'être tronquée).
+    """
+    target = planned_schema(data.schema)
+    renamed = data.rename_columns(target.names)
+    try:
+        return renamed.cast(target)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"❌ Conversion impossible vers le plan de types : {e}") from e
+
+
+def to_frame(data) -> pd.DataFrame:
+    """Table/RecordBatch typé -> DataFrame (entiers nullables, timestamps en µs)."""
+    return data.to_pandas(types_mapper=PANDAS_TYPES.get)
+
+
+def read_frame(path, transform=None, columns: list = None, row_groups: list = None) -> pd.DataFrame:
+    """
+    Lit un fichier parquet complet en appliquant le plan de types.
+    transform(table) est appliqué à la table typée avant conversion (ex. pré-validation).
+    columns : colonnes lues (projection, noms du fichier), toutes par défaut.
+    row_groups : row groups lus (sélection par plage de prise en charge), tous par défaut.
+    """
+    if row_groups is None:
+        table = pq.read_table(path, columns=columns)
+    else:
+        table = pq.ParquetFile(path).read_row_groups(row_groups, columns=columns)
+    table = apply_type_plan(table)
+    if transform is not None:
+        table = transform(table)
+    return to_frame(table)
+
+
+def snowflake_type(column: str):
+    """Type Snowflake imposé par le plan (None si la colonne n'y figure pas)."""
+    planned = TYPE_PLAN.get(column.upper())
+    return planned[1] if planned else None
@@ -0,0 +1,65 @@
+# nyc_taxi.py
+"""
+Point d'entrée unique du pipeline : nyc-taxi <commande> [options de la commande]
+
+    ./nyc-taxi download --start 2024-01        # extract/download_parquet.py
+    ./nyc-taxi preflight                       # checks/pre_ingestion_check.py
+    ./nyc-taxi ingest --stream                 # load/merge_dynamic.py
+    ./nyc-taxi report export --format csv      # checks/run_history.py
+    ./nyc-taxi ingest --help                   # options d'une commande
+
+Le module d'une commande n'est importé qu'au lancement de cette commande :
+`nyc-taxi --help` ou `nyc-taxi download` n'importent ni pandas, ni pyarrow, ni le
+connecteur Snowflake. Les anciens scripts restent utilisables directement.
+Temps de démarrage mesuré par bench/startup_time.py.
+"""
+import argparse
+import importlib
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+# Modules de load/ importés à plat (comme lorsqu'ils sont lancés en script)
+LOAD_DIR = ROOT / "load"
+
+# commande -> (module, aide)
+COMMANDS = {
+    "download": ("extract.download_parquet", "Téléchargement des fichiers TLC et catalogue partitionné"),
+    "preflight": ("checks.pre_ingestion_check", "Vérification de l'environnement Snowflake avant ingestion"),
+    "ingest": ("merge_dynamic", "Ingestion des fichiers parquet dans l'entrepôt"),
+    "report": ("checks.run_history", "Historique des runs et rapport post-ingestion"),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="nyc-taxi",
+        description="Pipeline NYC Taxi : téléchargement, contrôles, ingestion et rapport",
+        epilog="Options d'une commande : nyc-taxi <commande> --help",
+    )
+    commands = parser.add_subparsers(dest="command", metavar="<commande>", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        # Aide et options propres à chaque commande : transmises à son module
+        commands.add_parser(name, help=help_text, add_help=False)
+    return parser
+
+
+def load_command(name: str):
+    """Module de la commande, importé à la demande."""
+    for path in (ROOT, LOAD_DIR):
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+    return importlib.import_module(COMMANDS[name][0])
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args, command_args = parser.parse_known_args(argv)
+    module = load_command(args.command)
+    # Usage affiché par la commande : "nyc-taxi ingest ..." plutôt que "nyc-taxi ..."
+    sys.argv[0] = f"{parser.prog} {args.command}"
+    return module.main(command_args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
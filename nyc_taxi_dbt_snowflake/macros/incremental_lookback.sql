@@ -0,0 +1,52 @@
+{#
+    First pickup date reprocessed by an incremental run, as a 'YYYY-MM-DD' literal.
+      - full refresh / first build / parsing: none (no filter), checked first so that
+        a --full-refresh with trips_reprocess_from set still rebuilds the whole history
+      - var('trips_reprocess_from') set: that date (targeted backfill)
+      - incremental run: MAX(date_column) of the existing model minus var('trips_lookback_days')
+#}
+{% macro trip_lookback_start(date_column='trip_date') %}
+    {%- if not execute or not is_incremental() -%}
+        {{ return(none) }}
+    {%- endif -%}
+    {%- set reprocess_from = var('trips_reprocess_from', none) -%}
+    {%- if reprocess_from -%}
+        {{ return(reprocess_from | string) }}
+    {%- endif -%}
+
+    {%- set query -%}
+        SELECT TO_VARCHAR(DATEADD('day', -{{ var('trips_lookback_days', 3) }}, MAX({{ date_column }})::DATE), 'YYYY-MM-DD')
+        FROM {{ this }}
+    {%- endset -%}
+    {%- set result = run_query(query) -%}
+    {%- set start = result.columns[0].values()[0] if result.rows | length else none -%}
+    {{ return(start) }}
+{% endmacro %}
+
+
+{#
+    MERGE target pruning for incremental trip models: only the lookback window of the
+    existing table is scanned (clustered on the trip date).
+#}
+{% macro trip_incremental_predicates(lookback_start, date_column='trip_date') %}
+    {%- if lookback_start -%}
+        {{ return(["DBT_INTERNAL_DEST." ~ date_column ~ " >= '" ~ lookback_start ~ "'"]) }}
+    {%- endif -%}
+    {{ return([]) }}
+{% endmacro %}
+
+
+{#
+    Custom incremental strategy `trip_merge`: the default merge, with the target pruned
+    to the lookback window. The predicate is built here, while the MERGE is compiled at
+    run time. config() is rendered at parse time, when trip_lookback_start() returns none,
+    so a predicate passed through incremental_predicates would always be empty.
+    Target date column: meta trip_date_column (default trip_date).
+#}
+{% macro get_incremental_trip_merge_sql(arg_dict) %}
+    {%- set date_column = config.get('meta', {}).get('trip_date_column', 'trip_date') -%}
+    {%- set predicates = (arg_dict['incremental_predicates'] or [])
+                         + trip_incremental_predicates(trip_lookback_start(date_column), date_column) -%}
+    {%- do arg_dict.update({'incremental_predicates': predicates}) -%}
+    {{ return(get_incremental_merge_sql(arg_dict)) }}
+{% endmacro %}
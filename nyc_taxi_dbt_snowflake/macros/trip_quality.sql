@@ -0,0 +1,36 @@
+{#
+    Trip quality rules (var trip_quality_rules in dbt_project.yml), shared with the
+    local ingestion pre-validation (load/prevalidation.py).
+    A rule keeps a row when its column is NOT NULL and within [min, max] (both optional).
+#}
+
+{# Derived rule columns; load/prevalidation.py (DERIVED_COLUMNS) computes the same values. #}
+{% macro trip_rule_column(column) %}
+    {%- set derived = {
+        'TRIP_DURATION_MIN': "DATEDIFF('minute', TPEP_PICKUP_DATETIME, TPEP_DROPOFF_DATETIME)"
+    } -%}
+    {{- derived.get(column, column) -}}
+{% endmacro %}
+
+
+{% macro trip_rule_condition(rule) %}
+    {%- set column = trip_rule_column(rule['column']) -%}
+    {%- if rule.get('min') is not none and rule.get('max') is not none -%}
+        {{ column }} BETWEEN {{ rule['min'] }} AND {{ rule['max'] }}
+    {%- elif rule.get('min') is not none -%}
+        {{ column }} >= {{ rule['min'] }}
+    {%- elif rule.get('max') is not none -%}
+        {{ column }} <= {{ rule['max'] }}
+    {%- else -%}
+        {{ column }} IS NOT NULL
+    {%- endif -%}
+{% endmacro %}
+
+
+{# All rules joined with AND, for a WHERE clause. #}
+{% macro trip_quality_filter(rules=none) %}
+    {%- set rules = rules if rules is not none else var('trip_quality_rules') -%}
+    {%- for rule in rules %}
+      {% if not loop.first %}AND {% endif %}{{ trip_rule_condition(rule) }}  -- {{ rule['name'] }}
+    {%- endfor %}
+{% endmacro %}
@@ -0,0 +1,43 @@
+{%- set lookback_start = trip_lookback_start() -%}
+
+{{ config(
+    materialized='incremental',
+    schema='FINAL',
+    unique_key='trip_date',
+    incremental_strategy='delete+insert',
+    cluster_by=['trip_date'],
+    on_schema_change='append_new_columns'
+) }}
+
+-- Shared pre-aggregate: one row per trip_date × pickup_hour × pickup zone.
+-- Stores additive measures only (counts, sums, sums of squares) so that every
+-- summary model rolls up from it exactly: AVG = SUM(x_sum) / SUM(count),
+-- VARIANCE = SUM(x_sq_sum) / n - AVG².
+-- Incremental: whole days from the lookback start are rebuilt (delete+insert on
+-- trip_date), so a day never mixes old and new rows.
+SELECT
+    trip_date,
+    pickup_hour,
+    pu_location_id,
+
+    COUNT(*)                                        AS trip_count,
+
+    SUM(trip_distance)                              AS distance_sum,
+    SUM(trip_distance * trip_distance)              AS distance_sq_sum,
+
+    SUM(total_amount)                               AS revenue_sum,
+    SUM(total_amount * total_amount)                AS revenue_sq_sum,
+
+    SUM(trip_duration_min)                          AS duration_sum,
+    SUM(trip_duration_min * trip_duration_min)      AS duration_sq_sum,
+
+    -- tip_pct is NULL when fare_amount = 0: averages use its own count
+    COUNT(tip_pct)                                  AS tip_pct_count,
+    SUM(tip_pct)                                    AS tip_pct_sum,
+    SUM(tip_pct * tip_pct)                          AS tip_pct_sq_sum
+
+FROM {{ ref('stg__clean_trips') }}
+{%- if lookback_start %}
+WHERE trip_date >= '{{ lookback_start }}'
+{%- endif %}
+GROUP BY trip_date, pickup_hour, pu_location_id
@@ -2,7 +2,7 @@
 
 WITH dates AS (
     SELECT DISTINCT trip_date
-    FROM {{ ref('stg__clean_trips') }}
+    FROM {{ ref('agg__hourly_zone_cube') }}
 )
 
 SELECT
@@ -1,14 +1,25 @@
-{{ config(materialized='table', schema='FINAL') }}
+{%- set lookback_start = trip_lookback_start() -%}
 
+{{ config(
+    materialized='incremental',
+    schema='FINAL',
+    unique_key='trip_date',
+    incremental_strategy='delete+insert'
+) }}
+
+-- Rolled up from the hourly × zone cube (no scan of trip-level data)
 WITH agg AS (
     SELECT
         trip_date,
-        COUNT(*) AS total_trips,
-        ROUND(AVG(trip_distance), 2) AS avg_distance,
-        ROUND(SUM(total_amount), 2) AS total_revenue,
-        ROUND(AVG(tip_pct), 2) AS avg_tip_pct,
-        ROUND(AVG(trip_duration_min), 2) AS avg_duration_min
-    FROM {{ ref('stg__clean_trips') }}
+        SUM(trip_count) AS total_trips,
+        ROUND(SUM(distance_sum) / SUM(trip_count), 2) AS avg_distance,
+        ROUND(SUM(revenue_sum), 2) AS total_revenue,
+        ROUND(SUM(tip_pct_sum) / NULLIF(SUM(tip_pct_count), 0), 2) AS avg_tip_pct,
+        ROUND(SUM(duration_sum) / SUM(trip_count), 2) AS avg_duration_min
+    FROM {{ ref('agg__hourly_zone_cube') }}
+    {%- if lookback_start %}
+    WHERE trip_date >= '{{ lookback_start }}'
+    {%- endif %}
     GROUP BY trip_date
 )
 
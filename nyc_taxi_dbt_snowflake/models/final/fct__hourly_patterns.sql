@@ -1,24 +1,24 @@
-{{ config(materialized='table', schema='FINAL') }}
+{%- set lookback_start = trip_lookback_start() -%}
 
-WITH aggregated AS (
-    SELECT
-        pickup_hour,
-        trip_date,
-        total_amount,
-        trip_distance,
-        trip_duration_min,
-        tip_pct
-    FROM {{ ref('stg__clean_trips') }}
-)
+{{ config(
+    materialized='incremental',
+    schema='FINAL',
+    unique_key='trip_date',
+    incremental_strategy='delete+insert'
+) }}
 
+-- Rolled up from the hourly × zone cube (no scan of trip-level data)
 SELECT
     pickup_hour,
     trip_date,
-    COUNT(*) AS total_trips,
-    ROUND(SUM(total_amount), 2) AS total_revenue,
-    ROUND(AVG(trip_distance), 2) AS avg_distance,
-    ROUND(AVG(trip_duration_min), 2) AS avg_duration_min,
-    ROUND(AVG(tip_pct), 2) AS avg_tip_pct
-FROM aggregated
+    SUM(trip_count) AS total_trips,
+    ROUND(SUM(revenue_sum), 2) AS total_revenue,
+    ROUND(SUM(distance_sum) / SUM(trip_count), 2) AS avg_distance,
+    ROUND(SUM(duration_sum) / SUM(trip_count), 2) AS avg_duration_min,
+    ROUND(SUM(tip_pct_sum) / NULLIF(SUM(tip_pct_count), 0), 2) AS avg_tip_pct
+FROM {{ ref('agg__hourly_zone_cube') }}
+{%- if lookback_start %}
+WHERE trip_date >= '{{ lookback_start }}'
+{%- endif %}
 GROUP BY pickup_hour, trip_date
 ORDER BY pickup_hour, trip_date
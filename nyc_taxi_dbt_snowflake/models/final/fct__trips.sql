@@ -1,6 +1,18 @@
-{{ config(materialized='table', schema='FINAL') }}
+{%- set lookback_start = trip_lookback_start('date_fk') -%}
+
+{{ config(
+    materialized='incremental',
+    schema='FINAL',
+    unique_key='trip_key',
+    incremental_strategy='trip_merge',
+    meta={'trip_date_column': 'date_fk'},
+    cluster_by=['date_fk'],
+    on_schema_change='append_new_columns'
+) }}
 
 SELECT
+    t.trip_key,
+
     -- Clés étrangères vers les dimensions
     t.trip_date                     AS date_fk,
     t.pu_location_id                AS pu_location_fk,
@@ -29,3 +41,6 @@ SELECT
     t.airport_fee
 
 FROM {{ ref('stg__clean_trips') }} t
+{%- if lookback_start %}
+WHERE t.trip_date >= '{{ lookback_start }}'
+{%- endif %}
@@ -1,30 +1,65 @@
+{%- set lookback_start = trip_lookback_start() -%}
+
 {{ config(
-    materialized='table',
-    schema='STAGING'
+    materialized='incremental',
+    schema='STAGING',
+    unique_key='trip_key',
+    incremental_strategy='trip_merge',
+    cluster_by=['trip_date'],
+    on_schema_change='append_new_columns'
 ) }}
 
+-- RAW timestamps are loaded natively typed (TIMESTAMP_NTZ, microsecond unit) by the
+-- ingestion type plan (load/type_plan.py): filters apply directly to the raw columns,
+-- so Snowflake can prune micro-partitions on their min/max.
+-- Rows loaded before the type plan: run `python load/migrate_timestamps.py` once; the
+-- ingestion refuses to load while inflated timestamps remain in RAW.
+-- Incremental: only pickups from the lookback start are read and merged on trip_key
+-- (var trips_lookback_days, default 3 days before the latest trip_date already built;
+-- var trips_reprocess_from for a targeted backfill; --full-refresh to rebuild everything).
 WITH source AS (
-    SELECT *
-    FROM {{ source('RAW', 'YELLOW_TAXI_TRIPS_V2') }}
-),
-
--- RAW timestamps were stored as microseconds interpreted as seconds by Snowflake COPY INTO.
--- Fix: extract epoch seconds (the inflated µs value) and divide by 1,000,000 to recover real seconds.
-fixed AS (
+    -- Explicit column list: the ingestion only loads the RAW columns referenced by this
+    -- project (load/projection.py); a column used here is therefore always loaded.
     SELECT
-        *,
-        TO_TIMESTAMP_NTZ(DATE_PART('epoch_second', TPEP_PICKUP_DATETIME)  / 1000000) AS pickup_ts,
-        TO_TIMESTAMP_NTZ(DATE_PART('epoch_second', TPEP_DROPOFF_DATETIME) / 1000000) AS dropoff_ts
-    FROM source
+        ROW_FINGERPRINT,
+        VENDORID,
+        TPEP_PICKUP_DATETIME,
+        TPEP_DROPOFF_DATETIME,
+        PASSENGER_COUNT,
+        TRIP_DISTANCE,
+        RATECODEID,
+        PULOCATIONID,
+        DOLOCATIONID,
+        PAYMENT_TYPE,
+        FARE_AMOUNT,
+        EXTRA,
+        MTA_TAX,
+        TIP_AMOUNT,
+        TOLLS_AMOUNT,
+        IMPROVEMENT_SURCHARGE,
+        TOTAL_AMOUNT,
+        CONGESTION_SURCHARGE,
+        AIRPORT_FEE
+    FROM {{ source('RAW', 'YELLOW_TAXI_TRIPS_V2') }}
+    WHERE TPEP_PICKUP_DATETIME >= '2024-01-01'
+      AND TPEP_PICKUP_DATETIME <  '2025-12-01'
+      AND TPEP_DROPOFF_DATETIME > TPEP_PICKUP_DATETIME
+    {%- if lookback_start %}
+      AND TPEP_PICKUP_DATETIME >= '{{ lookback_start }}'
+    {%- endif %}
 ),
 
 cleaned AS (
     SELECT
+        -- Stable trip key: 64-bit fingerprint of the ingestion business key (DEDUP_KEYS),
+        -- computed once per row at ingestion (load/dedup.py) and stored in RAW
+        ROW_FINGERPRINT                                       AS trip_key,
+
         CAST(VENDORID AS INTEGER)                              AS vendor_id,
-        pickup_ts                                              AS pickup_datetime,
-        dropoff_ts                                             AS dropoff_datetime,
+        TPEP_PICKUP_DATETIME                                   AS pickup_datetime,
+        TPEP_DROPOFF_DATETIME                                  AS dropoff_datetime,
 
-        DATEDIFF('minute', pickup_ts, dropoff_ts)             AS trip_duration_min,
+        DATEDIFF('minute', TPEP_PICKUP_DATETIME, TPEP_DROPOFF_DATETIME) AS trip_duration_min,
         TRIP_DISTANCE                                         AS trip_distance,
         TOTAL_AMOUNT                                          AS total_amount,
         TIP_AMOUNT                                            AS tip_amount,
@@ -45,21 +80,16 @@ cleaned AS (
         AIRPORT_FEE                                           AS airport_fee,
 
         -- Temporal dimensions
-        DATE(pickup_ts)                                       AS trip_date,
-        EXTRACT(HOUR FROM pickup_ts)                          AS pickup_hour,
-        EXTRACT(MONTH FROM pickup_ts)                         AS pickup_month,
+        DATE(TPEP_PICKUP_DATETIME)                            AS trip_date,
+        EXTRACT(HOUR FROM TPEP_PICKUP_DATETIME)               AS pickup_hour,
+        EXTRACT(MONTH FROM TPEP_PICKUP_DATETIME)              AS pickup_month,
 
         CURRENT_TIMESTAMP()                                   AS ingestion_ts
 
-    FROM fixed
-    WHERE TOTAL_AMOUNT >= 0
-      AND TRIP_DISTANCE BETWEEN 0.1 AND 100
-      AND dropoff_ts > pickup_ts
-      AND DATEDIFF('minute', pickup_ts, dropoff_ts) BETWEEN 1 AND 1440
-      AND DATE(pickup_ts) BETWEEN '2024-01-01' AND '2025-11-30'
-      AND PULOCATIONID IS NOT NULL
-      AND DOLOCATIONID IS NOT NULL
-      AND PASSENGER_COUNT BETWEEN 1 AND 6
+    FROM source
+    -- Quality rules: var trip_quality_rules, also applied before upload by the
+    -- optional ingestion pre-validation (load/prevalidation.py)
+    WHERE {{ trip_quality_filter() }}
 )
 
 SELECT *
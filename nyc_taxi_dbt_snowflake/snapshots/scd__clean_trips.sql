@@ -16,16 +16,7 @@
 }}
 
 SELECT
-    {{ dbt_utils.generate_surrogate_key([
-        'pickup_datetime',
-        'dropoff_datetime',
-        'vendor_id',
-        'pu_location_id',
-        'do_location_id',
-        'passenger_count',
-        'total_amount',
-        'trip_distance'
-    ]) }} AS trip_key,
+    trip_key,  -- RAW.ROW_FINGERPRINT, computed once at ingestion
 
     vendor_id,
     pickup_datetime,
@@ -0,0 +1,39 @@
+# tests/conftest.py
+"""Entrepôt DuckDB en mémoire et fichiers synthétiques pour les tests du chargement."""
+import pytest
+
+from backends import DuckDBBackend, set_backend
+from generate_trips import write_month
+from snowflake_utils import close_pool, configure_pool, execute_sql
+from telemetry import start_run
+
+
+@pytest.fixture
+def warehouse(tmp_path, monkeypatch):
+    """Backend DuckDB en mémoire (schéma RAW) ; logs et télémétrie du run dans tmp_path."""
+    import merge_dynamic as md
+
+    backend = set_backend(DuckDBBackend(path=":memory:", schema="RAW"))
+    configure_pool(max_size=4)
+    md.schema_registry.invalidate()
+    monkeypatch.setattr(md, "LOG_DIR", tmp_path / "logs")
+    start_run("tests", out_dir=tmp_path / "logs")
+    yield backend
+    close_pool()
+    backend.close()
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    path = tmp_path / "data"
+    path.mkdir()
+    return path
+
+
+def write_trips(data_dir, year: int = 2024, month: int = 1, rows: int = 2_000, seed: int = 0):
+    """Fichier yellow_tripdata synthétique (bench/generate_trips.py), sans doublon ni NULL."""
+    return write_month(data_dir, year, month, rows, duplicate_rate=0.0, null_rate=0.0, seed=seed)
+
+
+def scalar(sql: str):
+    return execute_sql(sql)[0][0]
@@ -0,0 +1,66 @@
+# tests/test_backends.py
+"""Interfaces des entrepôts et moteurs de stage : classes abstraites, durée de vie du stage DuckDB."""
+import pytest
+
+import merge_dynamic as md
+from backends import DuckDBBackend, WarehouseBackend
+from conftest import scalar, write_trips
+from stage_loader import DuckDBStageEngine, StageEngine
+
+
+def test_interfaces_cannot_be_instantiated():
+    with pytest.raises(TypeError):
+        WarehouseBackend()
+    with pytest.raises(TypeError):
+        StageEngine()
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    class NoStageBackend(WarehouseBackend):
+        def connect(self):
+            return None
+
+        def write_frame(self, conn, df, table_name: str, compression: str = None):
+            return True, len(df)
+
+    with pytest.raises(TypeError, match="stage_engine"):
+        NoStageBackend()
+
+
+def test_duckdb_implements_both_interfaces():
+    backend = DuckDBBackend(path=":memory:", schema="RAW")
+    try:
+        assert isinstance(backend, WarehouseBackend)
+        assert isinstance(backend.stage_engine(None), StageEngine)
+        assert isinstance(backend.stage_engine(None), DuckDBStageEngine)
+    finally:
+        backend.close()
+
+
+def test_duckdb_stage_engine_lifetime(warehouse, data_dir, monkeypatch):
+    write_trips(data_dir, rows=2_000)
+    engines, statements = [], []
+    stage_engine = warehouse.stage_engine
+
+    def recording_engine(execute):
+        def recorded(sql):
+            statements.append(sql)
+            return execute(sql)
+
+        engines.append(stage_engine(recorded))
+        return engines[-1]
+
+    monkeypatch.setattr(warehouse, "stage_engine", recording_engine)
+    md.process_parquet_files(backend="stage", data_dir=data_dir)
+    md.process_parquet_files(backend="stage", data_dir=data_dir, force=True)
+
+    # COPY passé par `execute` (connexion du pool rendue) ; chunks purgés du stage après chargement
+    assert any("read_parquet" in sql for sql in statements)
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 2_000
+    stage_dir = engines[0].stage_dir
+    assert {engine.stage_dir for engine in engines} == {stage_dir}
+    assert not list(stage_dir.rglob("*.parquet"))
+
+    # Dossier de stage supprimé à la fermeture du backend
+    warehouse.close()
+    assert not stage_dir.exists()
@@ -0,0 +1,157 @@
+# tests/test_chunked_upload.py
+"""Upload par chunks : relance du seul chunk en échec, abandon, réglages du tuner."""
+import threading
+
+import pandas as pd
+import pytest
+
+import chunked_upload
+import merge_dynamic as md
+import snowflake_utils
+from chunked_upload import ChunkedUploader, UploadTuner
+from conftest import scalar, write_trips
+
+CHUNK_ROWS = 500
+
+
+@pytest.fixture
+def fixed_chunks(warehouse, monkeypatch):
+    """Chunks de CHUNK_ROWS lignes, relances sans attente."""
+    monkeypatch.setattr(chunked_upload, "MIN_CHUNK_ROWS", CHUNK_ROWS)
+    monkeypatch.setattr(chunked_upload, "MAX_CHUNK_ROWS", CHUNK_ROWS)
+    monkeypatch.setattr(chunked_upload, "backoff_delay", lambda attempt: 0.0)
+    return warehouse
+
+
+class FakeWriter:
+    """write_frame simulé : enregistre chaque tentative (première ligne du chunk), échecs choisis."""
+
+    def __init__(self, failures: dict):
+        self.failures = failures    # première ligne du chunk -> nombre d'échecs avant succès
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, conn, df, table_name, compression=None):
+        first = int(df.index[0])
+        with self._lock:
+            self.calls.append(first)
+            attempt = self.calls.count(first)
+        if attempt <= self.failures.get(first, 0):
+            raise ConnectionError(f"connexion perdue (chunk {first})")
+        return True, len(df)
+
+    def attempts(self, first: int) -> int:
+        return self.calls.count(first)
+
+
+def frame(rows: int = 2_000) -> pd.DataFrame:
+    return pd.DataFrame({"ID": range(rows), "AMOUNT": [1.5] * rows})
+
+
+def test_only_the_failed_chunk_is_retried(fixed_chunks, monkeypatch):
+    writer = FakeWriter({1_000: 2})
+    monkeypatch.setattr(chunked_upload, "write_frame", writer)
+
+    result = ChunkedUploader(max_retries=3).upload(frame(), "BUFFER")
+
+    assert result.success and result.error is None
+    assert writer.attempts(1_000) == 3
+    assert all(writer.attempts(first) == 1 for first in (0, 500, 1_500))
+    assert result.retries == 2
+    # Chaque chunk compté une fois, relances comprises
+    assert result.chunks == 4
+    assert result.rows == 2_000
+
+
+def test_upload_gives_up_after_max_retries(fixed_chunks, monkeypatch):
+    writer = FakeWriter({500: 99})
+    monkeypatch.setattr(chunked_upload, "write_frame", writer)
+
+    result = ChunkedUploader(max_retries=2).upload(frame(), "BUFFER")
+
+    assert not result.success
+    assert writer.attempts(500) == 3
+    assert "chunk 1 en échec après 3 tentative(s)" in result.error
+    assert result.retries == 2
+    assert result.rows == CHUNK_ROWS * result.chunks
+
+
+def test_no_chunk_is_submitted_after_a_definitive_failure(fixed_chunks, monkeypatch):
+    writer = FakeWriter({0: 99})
+    monkeypatch.setattr(chunked_upload, "write_frame", writer)
+
+    # Un seul flux : le chunk 0 échoue définitivement avant que le suivant soit lancé
+    result = ChunkedUploader(max_parallel=1, max_retries=1).upload(frame(), "BUFFER")
+
+    assert not result.success
+    assert writer.calls == [0, 0]
+    assert result.rows == 0 and result.chunks == 0
+
+
+def test_flaky_writes_are_deduplicated_by_the_merge(fixed_chunks, data_dir, monkeypatch):
+    """
+    Chaque chunk est inséré mais son acquittement perdu une fois : la relance
+    le charge une seconde fois dans le buffer, le MERGE dédoublonné n'en garde qu'une.
+    """
+    write_trips(data_dir, rows=2_000)
+    acknowledged = set()
+    real_write = snowflake_utils.write_frame
+
+    def flaky_write(conn, df, table_name, compression=None):
+        success, rows = real_write(conn, df, table_name, compression=compression)
+        first = int(df.index[0])
+        if first not in acknowledged:
+            acknowledged.add(first)
+            return False, 0
+        return success, rows
+
+    buffer_rows = []
+    merge_buffer = md.merge_buffer
+
+    def counting_merge(file_name, cols_upper, table_final, table_buffer, **kwargs):
+        buffer_rows.append(scalar(f"SELECT COUNT(*) FROM {table_buffer}"))
+        assert kwargs["dedup_source"]
+        return merge_buffer(file_name, cols_upper, table_final, table_buffer, **kwargs)
+
+    monkeypatch.setattr(chunked_upload, "write_frame", flaky_write)
+    monkeypatch.setattr(md, "merge_buffer", counting_merge)
+    md.process_parquet_files(data_dir=data_dir)
+
+    assert len(acknowledged) == 2_000 // CHUNK_ROWS
+    assert buffer_rows == [4_000]
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 2_000
+    assert scalar(f"SELECT COUNT(DISTINCT {md.FINGERPRINT_COLUMN}) FROM {md.TABLE_FINAL}") == 2_000
+
+
+def test_tuner_keeps_the_fastest_compression():
+    tuner = UploadTuner(bytes_per_row=100, compressions=("gzip", "snappy"))
+
+    assert [tuner.next_compression(), tuner.next_compression()] == ["gzip", "snappy"]
+    tuner.observe(100_000, 2.0, "gzip")
+    tuner.observe(100_000, 1.0, "snappy")
+
+    assert tuner.compression == "snappy"
+    assert tuner.next_compression() == "snappy"
+
+
+def test_tuner_chunk_size_converges_to_the_target_duration():
+    tuner = UploadTuner(bytes_per_row=100, compressions=(None,), target_seconds=5)
+    for _ in range(30):
+        # 20 000 lignes/s par flux : 100 000 lignes en 5 s
+        tuner.observe(20_000, 1.0, None)
+    assert tuner.chunk_rows == pytest.approx(100_000, rel=0.01)
+
+
+def test_tuner_parallelism_grows_then_halves_on_failure():
+    tuner = UploadTuner(bytes_per_row=100, compressions=(None,), max_parallel=8)
+    assert tuner.parallel == 2
+
+    # Premier palier complet (2 chunks) : pas de référence, parallélisme augmenté
+    tuner.observe(10_000, 0.1, None)
+    tuner.observe(10_000, 0.1, None)
+    assert tuner.parallel == 3
+
+    tuner.failed()
+    assert tuner.parallel == 1
+    tuner.failed()
+    assert tuner.parallel == 1
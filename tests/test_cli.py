@@ -0,0 +1,42 @@
+# tests/test_cli.py
+"""Point d'entrée nyc_taxi.py : code de sortie de la commande ingest."""
+import pytest
+
+import merge_dynamic as md
+import nyc_taxi
+from conftest import write_trips
+from telemetry import start_run
+
+
+@pytest.fixture
+def ingest_args(warehouse, tmp_path, monkeypatch):
+    """Run d'ingestion isolé : logs, télémétrie et historique hors du dépôt."""
+    monkeypatch.setattr(md, "configure_logging", lambda: None)
+    monkeypatch.setattr(md, "start_run",
+                        lambda pipeline, profile=None: start_run(pipeline, out_dir=tmp_path / "logs", profile=profile))
+    monkeypatch.setattr(md, "record_run", lambda results: None)
+    monkeypatch.setattr(md, "apply_retention", lambda: None)
+    return ["ingest", "--no-dedup-index", "--ledger", str(tmp_path / "ledger.json"),
+            "--dq-stats", str(tmp_path / "dq_stats.json")]
+
+
+def test_ingest_exits_zero_on_success(ingest_args, monkeypatch):
+    monkeypatch.setattr(md, "process_parquet_files", lambda **kwargs: None)
+    assert nyc_taxi.main(ingest_args) == 0
+
+
+def test_ingest_exits_non_zero_on_failure(ingest_args, monkeypatch):
+    def failing(**kwargs):
+        raise RuntimeError("1 fichier(s) en échec : yellow_tripdata_2024-01.parquet")
+
+    monkeypatch.setattr(md, "process_parquet_files", failing)
+    assert nyc_taxi.main(ingest_args) == 1
+
+
+def test_failed_upload_fails_the_sequential_run(warehouse, data_dir, monkeypatch):
+    write_trips(data_dir, rows=500)
+    monkeypatch.setattr(md, "upload_chunked",
+                        lambda df, table: md.UploadResult(success=False, rows=0, error="connexion perdue"))
+
+    with pytest.raises(RuntimeError, match="1 fichier"):
+        md.process_parquet_files(data_dir=data_dir)
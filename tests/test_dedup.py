@@ -0,0 +1,52 @@
+# tests/test_dedup.py
+"""Empreintes d'un fichier en streaming : doublons entre batches, état par fichier."""
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import merge_dynamic as md
+from conftest import scalar, write_trips
+from dedup import FileFingerprints
+
+
+def test_file_fingerprints_matches_a_set():
+    rng = np.random.default_rng(0)
+    seen, expected = FileFingerprints(), set()
+    for _ in range(50):
+        batch = np.unique(rng.integers(0, 20_000, 300, dtype=np.uint64))
+        found = seen.contains(batch)
+        assert found.tolist() == [int(fp) in expected for fp in batch]
+        new = batch[~found]
+        seen.add(new, np.full(len(new), 648, dtype=np.int64))
+        expected.update(int(fp) for fp in new)
+
+    fingerprints, months = seen.arrays()
+    assert len(seen) == len(expected)
+    assert sorted(fingerprints.tolist()) == sorted(expected)
+    assert (months == 648).all()
+    # Runs fusionnés par taille : au plus log2(n) + 1 tableaux triés
+    assert len(seen._runs) <= int(np.log2(len(seen))) + 1
+    assert all((run[1:] > run[:-1]).all() for run, _ in seen._runs)
+
+
+def test_months_stay_aligned_with_fingerprints():
+    seen = FileFingerprints()
+    seen.add(np.array([30, 10], dtype=np.uint64), np.array([3, 1]))
+    seen.add(np.array([20, 40], dtype=np.uint64), np.array([2, 4]))
+    seen.add(np.array([5], dtype=np.uint64), np.array([0]))
+
+    fingerprints, months = seen.arrays()
+    assert dict(zip(fingerprints.tolist(), months.tolist())) == {30: 3, 10: 1, 20: 2, 40: 4, 5: 0}
+
+
+def test_streaming_removes_duplicates_across_batches(warehouse, data_dir, monkeypatch):
+    source = write_trips(data_dir, rows=2_000)
+    trips = pq.read_table(source)
+    # 300 premières courses répétées en fin de fichier : doublons dans des batches ultérieurs
+    pq.write_table(pa.concat_tables([trips, trips.slice(0, 300)]), source)
+    monkeypatch.setattr(md, "batch_rows_for_budget", lambda *args: 250)
+
+    md.process_parquet_files(data_dir=data_dir, stream=True)
+
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 2_000
+    assert scalar(f"SELECT COUNT(DISTINCT {md.FINGERPRINT_COLUMN}) FROM {md.TABLE_FINAL}") == 2_000
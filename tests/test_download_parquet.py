@@ -0,0 +1,178 @@
+# tests/test_download_parquet.py
+"""Téléchargeur contre un serveur HTTP local : reprise Range, .part renommé, manifest."""
+import hashlib
+import io
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import requests
+
+from extract import download_parquet as dp
+
+FILENAME = "yellow_tripdata_2024-01.parquet"
+
+
+def parquet_bytes(rows: int = 20_000) -> bytes:
+    # Valeurs aléatoires : le fichier reste volumineux une fois compressé
+    table = pa.table({"trip_distance": np.random.default_rng(0).random(rows)})
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression="none")
+    return buffer.getvalue()
+
+
+class TLCHandler(BaseHTTPRequestHandler):
+    """GET avec ETag, Range et If-Range ; server.cut_after tronque la réponse (connexion coupée)."""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        body = server.files.get(self.path.rsplit("/", 1)[-1])
+        if body is None:
+            self.send_error(404)
+            return
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", etag) == etag:
+            start = int(range_header.split("=", 1)[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        payload = body[start:]
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(payload if server.cut_after is None else payload[:server.cut_after])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), TLCHandler)
+    httpd.files, httpd.requests, httpd.cut_after = {}, [], None
+    httpd.base_url = f"http://127.0.0.1:{httpd.server_address[1]}/trip-data"
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def session():
+    with requests.Session() as s:
+        yield s
+
+
+def fetch(session, server, data_dir, retries: int = 1):
+    manifest = dp.DownloadManifest(str(data_dir / dp.MANIFEST_NAME))
+    return dp.fetch_month(session, 2024, 1, str(data_dir), server.base_url, manifest, retries=retries)
+
+
+def test_download_renames_part_and_records_manifest(server, session, tmp_path):
+    body = parquet_bytes()
+    server.files[FILENAME] = body
+
+    assert fetch(session, server, tmp_path) == "downloaded"
+
+    assert (tmp_path / FILENAME).read_bytes() == body
+    assert not (tmp_path / f"{FILENAME}.part").exists()
+    entry = json.loads((tmp_path / dp.MANIFEST_NAME).read_text())[FILENAME]
+    assert entry["status"] == "ok"
+    assert entry["md5"] == hashlib.md5(body).hexdigest()
+    assert entry["size"] == len(body)
+
+
+def test_interrupted_download_keeps_only_part(server, session, tmp_path):
+    body = parquet_bytes()
+    server.files[FILENAME] = body
+    server.cut_after = len(body) // 2
+    manifest = dp.DownloadManifest(str(tmp_path / dp.MANIFEST_NAME))
+
+    with pytest.raises(Exception):
+        dp.download_file(session, f"{server.base_url}/{FILENAME}", str(tmp_path / FILENAME), manifest,
+                         chunk_size=1024)
+
+    # Aucun fichier final tant que le téléchargement n'est pas complet et vérifié
+    assert not (tmp_path / FILENAME).exists()
+    part = (tmp_path / f"{FILENAME}.part").read_bytes()
+    assert 0 < len(part) < len(body)
+    assert body.startswith(part)
+    assert manifest.get(FILENAME)["status"] == "partial"
+
+
+def test_resume_with_range(server, session, tmp_path):
+    body = parquet_bytes()
+    server.files[FILENAME] = body
+    server.cut_after = len(body) // 2
+    manifest = dp.DownloadManifest(str(tmp_path / dp.MANIFEST_NAME))
+    with pytest.raises(Exception):
+        dp.download_file(session, f"{server.base_url}/{FILENAME}", str(tmp_path / FILENAME), manifest,
+                         chunk_size=1024)
+    offset = (tmp_path / f"{FILENAME}.part").stat().st_size
+
+    server.cut_after = None
+    assert fetch(session, server, tmp_path) == "downloaded"
+
+    resumed = server.requests[-1]
+    assert resumed["Range"] == f"bytes={offset}-"
+    assert resumed["If-Range"] == f'"{hashlib.md5(body).hexdigest()}"'
+    assert (tmp_path / FILENAME).read_bytes() == body
+    assert not (tmp_path / f"{FILENAME}.part").exists()
+    # Checksum du fichier complet, partie déjà écrite comprise
+    assert json.loads((tmp_path / dp.MANIFEST_NAME).read_text())[FILENAME]["md5"] == hashlib.md5(body).hexdigest()
+
+
+def test_resume_restarts_when_remote_file_changed(server, session, tmp_path):
+    body = parquet_bytes()
+    server.files[FILENAME] = body
+    (tmp_path / f"{FILENAME}.part").write_bytes(b"stale bytes of an older version")
+    manifest = dp.DownloadManifest(str(tmp_path / dp.MANIFEST_NAME))
+    manifest.update(FILENAME, {"status": "partial", "etag": '"old"', "last_modified": None})
+
+    assert fetch(session, server, tmp_path) == "downloaded"
+
+    # If-Range ne correspond plus : réponse 200 complète, .part réécrit depuis le début
+    assert server.requests[-1]["If-Range"] == '"old"'
+    assert (tmp_path / FILENAME).read_bytes() == body
+
+
+def test_verified_file_is_skipped_without_request(server, session, tmp_path):
+    server.files[FILENAME] = parquet_bytes()
+    assert fetch(session, server, tmp_path) == "downloaded"
+    requests_before = len(server.requests)
+
+    assert fetch(session, server, tmp_path) == "skipped"
+    assert len(server.requests) == requests_before
+
+
+def test_modified_local_file_is_not_skipped(server, session, tmp_path):
+    body = parquet_bytes()
+    server.files[FILENAME] = body
+    assert fetch(session, server, tmp_path) == "downloaded"
+    (tmp_path / FILENAME).write_bytes(b"truncated")
+
+    # Taille différente du manifest : fichier revérifié, corrompu, donc retéléchargé
+    assert fetch(session, server, tmp_path) == "downloaded"
+    assert (tmp_path / FILENAME).read_bytes() == body
+
+
+def test_invalid_parquet_is_discarded(server, session, tmp_path):
+    server.files[FILENAME] = b"<html>not a parquet file</html>"
+
+    assert fetch(session, server, tmp_path) == "failed"
+    assert not (tmp_path / FILENAME).exists()
+    assert not (tmp_path / f"{FILENAME}.part").exists()
+
+
+def test_unpublished_month_is_missing(server, session, tmp_path):
+    assert fetch(session, server, tmp_path) == "missing"
+    assert not (tmp_path / FILENAME).exists()
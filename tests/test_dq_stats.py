@@ -0,0 +1,31 @@
+# tests/test_dq_stats.py
+"""Statistiques post-ingestion : TOTAL_ROWS lu dans la table, ROWS_LOADED cumulé par fichier."""
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import merge_dynamic as md
+from conftest import write_trips
+from dq_stats import DQStatsStore
+from generate_trips import generate_month
+
+
+def test_total_rows_is_the_table_count(warehouse, data_dir, tmp_path):
+    january = write_trips(data_dir, month=1, rows=1_000)
+    # Février contient aussi 100 courses de janvier : mises à jour par le MERGE, pas insérées
+    february = pa.concat_tables([
+        generate_month(2024, 2, 500, duplicate_rate=0.0, null_rate=0.0, seed=2),
+        pq.read_table(january).slice(0, 100),
+    ])
+    pq.write_table(february, data_dir / "yellow_tripdata_2024-02.parquet")
+    dq_store = DQStatsStore(tmp_path / "dq_stats.json")
+
+    md.process_parquet_files(data_dir=data_dir, dq_store=dq_store)
+    stats = md.post_ingestion_stats(dq_store, f"RAW.{md.TABLE_FINAL}")
+
+    assert stats["ROWS_LOADED"] == 1_600
+    assert stats["TOTAL_ROWS"] == 1_500
+
+
+def test_total_rows_before_first_load(warehouse, tmp_path):
+    stats = md.post_ingestion_stats(DQStatsStore(tmp_path / "dq_stats.json"), f"RAW.{md.TABLE_FINAL}")
+    assert stats["TOTAL_ROWS"] == 0
@@ -0,0 +1,58 @@
+# tests/test_fingerprints.py
+"""MERGE sur ROW_FINGERPRINT : rechargement idempotent, refus tant que des lignes n'ont pas d'empreinte."""
+import pytest
+
+import merge_dynamic as md
+from backfill_fingerprints import backfill
+from conftest import scalar, write_trips
+
+MODES = {
+    "pandas": {},
+    "stream": {"stream": True},
+    "stage": {"backend": "stage"},
+    "parallel": {"workers": 2},
+}
+
+
+def distinct_fingerprints() -> int:
+    return scalar(f"SELECT COUNT(DISTINCT {md.FINGERPRINT_COLUMN}) FROM {md.TABLE_FINAL}")
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_reingesting_a_file_is_idempotent(warehouse, data_dir, mode):
+    write_trips(data_dir, rows=2_000)
+
+    md.process_parquet_files(data_dir=data_dir, **MODES[mode])
+    md.process_parquet_files(data_dir=data_dir, **MODES[mode])
+
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 2_000
+    assert distinct_fingerprints() == 2_000
+
+
+def test_ingestion_refuses_rows_without_fingerprint(warehouse, data_dir):
+    write_trips(data_dir, rows=1_000)
+    md.process_parquet_files(data_dir=data_dir)
+    # Lignes chargées avant ROW_FINGERPRINT
+    md.execute_sql(f"UPDATE {md.TABLE_FINAL} SET {md.FINGERPRINT_COLUMN} = NULL WHERE TRIP_DISTANCE < 2")
+    legacy = scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL} WHERE {md.FINGERPRINT_COLUMN} IS NULL")
+    assert legacy > 0
+
+    with pytest.raises(RuntimeError, match="backfill_fingerprints"):
+        md.process_parquet_files(data_dir=data_dir)
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 1_000
+
+    # Après le backfill, le rechargement retrouve chaque ligne
+    backfill(f"RAW.{md.TABLE_FINAL}")
+    md.process_parquet_files(data_dir=data_dir)
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 1_000
+    assert distinct_fingerprints() == 1_000
+
+
+def test_ingestion_refuses_table_without_fingerprint_column(warehouse, data_dir):
+    write_trips(data_dir, rows=500)
+    md.process_parquet_files(data_dir=data_dir)
+    md.execute_sql(f"ALTER TABLE {md.TABLE_FINAL} DROP COLUMN {md.FINGERPRINT_COLUMN}")
+    md.schema_registry.invalidate()
+
+    with pytest.raises(RuntimeError, match="500 ligne"):
+        md.process_parquet_files(data_dir=data_dir)
@@ -0,0 +1,59 @@
+# tests/test_incremental_predicates_check.py
+"""Contrôle du SQL exécuté par dbt : prédicat de lookback dans le MERGE des modèles de courses."""
+from checks import incremental_predicates_check as check
+
+MERGE_SQL = """
+merge into NYC_TAXI_DB_V2.FINAL.fct__trips as DBT_INTERNAL_DEST
+    using NYC_TAXI_DB_V2.FINAL.fct__trips__dbt_tmp as DBT_INTERNAL_SOURCE
+    on ({predicate}) and (
+            DBT_INTERNAL_SOURCE.trip_key = DBT_INTERNAL_DEST.trip_key
+        )
+    when matched then update set trip_key = DBT_INTERNAL_SOURCE.trip_key
+    when not matched then insert (trip_key) values (trip_key)
+"""
+
+
+def write_run_sql(project_dir, model: str, sql: str):
+    path = project_dir / "target" / "run" / "nyc_taxi_dbt_snowflake" / "models" / f"{model}.sql"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(sql, encoding="utf-8")
+
+
+def test_trip_models_use_the_run_time_strategy():
+    assert check.trip_merge_models() == {"fct__trips": "date_fk", "stg__clean_trips": "trip_date"}
+
+
+def test_merge_with_lookback_predicate_passes():
+    sql = MERGE_SQL.format(predicate="DBT_INTERNAL_DEST.date_fk >= '2024-03-28'")
+    ok, message = check.check_model(sql, "date_fk")
+    assert ok and "2024-03-28" in message
+
+
+def test_merge_without_predicate_fails():
+    # Prédicat rendu au parsing : liste vide, MERGE sur toute la table
+    sql = MERGE_SQL.format(predicate="1 = 1")
+    assert check.check_model(sql, "date_fk") == (False, "MERGE without the lookback predicate on date_fk")
+    # Prédicat sur une autre colonne que la date de la cible
+    sql = MERGE_SQL.format(predicate="DBT_INTERNAL_DEST.trip_date >= '2024-03-28'")
+    assert not check.check_model(sql, "date_fk")[0]
+
+
+def test_first_build_is_skipped_and_missing_sql_fails():
+    assert check.check_model("create or replace transient table x as (select 1)", "trip_date")[0]
+    assert not check.check_model(None, "trip_date")[0]
+
+
+def test_main_reads_the_executed_sql(tmp_path):
+    models = tmp_path / "models"
+    models.mkdir()
+    (models / "stg.sql").write_text("{{ config(materialized='incremental', incremental_strategy='trip_merge') }}")
+    (models / "fct.sql").write_text(
+        "{{ config(incremental_strategy='trip_merge', meta={'trip_date_column': 'date_fk'}) }}")
+    (models / "dim.sql").write_text("{{ config(materialized='table') }}")
+    write_run_sql(tmp_path, "stg", MERGE_SQL.format(predicate="DBT_INTERNAL_DEST.trip_date >= '2024-03-28'"))
+    write_run_sql(tmp_path, "fct", MERGE_SQL.format(predicate="DBT_INTERNAL_DEST.date_fk >= '2024-03-28'"))
+
+    assert check.main(["--project-dir", str(tmp_path)]) == 0
+
+    write_run_sql(tmp_path, "fct", MERGE_SQL.format(predicate="1 = 1"))
+    assert check.main(["--project-dir", str(tmp_path)]) == 1
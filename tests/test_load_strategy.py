@@ -0,0 +1,71 @@
+# tests/test_load_strategy.py
+"""Stratégie replace : seules les lignes de la fenêtre chargées par le fichier sont remplacées."""
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import merge_dynamic as md
+from conftest import scalar, write_trips
+from generate_trips import generate_month
+from load_strategy import SOURCE_COLUMN
+
+OUTLIER_PICKUP = datetime(2024, 1, 15, 8, 30)
+
+
+def write_february_with_january_outlier(data_dir, rows: int = 500):
+    """Fichier de février dont une course est prise en charge en janvier (fichier multi-mois)."""
+    df = generate_month(2024, 2, rows, duplicate_rate=0.0, null_rate=0.0, seed=2).to_pandas()
+    df.loc[0, "tpep_pickup_datetime"] = OUTLIER_PICKUP
+    df.loc[0, "tpep_dropoff_datetime"] = OUTLIER_PICKUP + timedelta(minutes=20)
+    path = data_dir / "yellow_tripdata_2024-02.parquet"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+    return path
+
+
+def january_rows() -> int:
+    return scalar(f"""
+        SELECT COUNT(*) FROM {md.TABLE_FINAL}
+        WHERE TPEP_PICKUP_DATETIME >= '2024-01-01' AND TPEP_PICKUP_DATETIME < '2024-02-01'
+    """)
+
+
+def test_replace_keeps_rows_loaded_from_other_files(warehouse, data_dir):
+    february = write_february_with_january_outlier(data_dir)
+    january = write_trips(data_dir, month=1, rows=1_000)
+
+    md.process_parquet_files(data_dir=data_dir, strategy=md.REPLACE, months=["2024-02"])
+    md.process_parquet_files(data_dir=data_dir, strategy=md.REPLACE, months=["2024-01"])
+
+    # Janvier remplacé après le MERGE de février : la course hors mois de février survit
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 1_500
+    assert january_rows() == 1_001
+    assert scalar(f"""
+        SELECT {SOURCE_COLUMN} FROM {md.TABLE_FINAL}
+        WHERE TPEP_PICKUP_DATETIME = '{OUTLIER_PICKUP:%Y-%m-%d %H:%M:%S}'
+    """) == february.name
+    assert scalar(f"SELECT COUNT(DISTINCT {SOURCE_COLUMN}) FROM {md.TABLE_FINAL}") == 2
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL} WHERE {SOURCE_COLUMN} = '{january.name}'") == 1_000
+
+
+def test_replace_removes_rows_dropped_from_republished_file(warehouse, data_dir):
+    january = write_trips(data_dir, month=1, rows=1_000)
+    md.process_parquet_files(data_dir=data_dir, strategy=md.REPLACE)
+
+    # Nouvelle version publiée du fichier : 400 courses retirées
+    pq.write_table(pq.read_table(january).slice(0, 600), january)
+    md.process_parquet_files(data_dir=data_dir, strategy=md.REPLACE)
+
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 600
+
+
+def test_replace_does_not_duplicate_rows_without_provenance(warehouse, data_dir):
+    january = write_trips(data_dir, month=1, rows=1_000)
+    md.process_parquet_files(data_dir=data_dir, strategy=md.REPLACE)
+    # Lignes chargées avant la colonne SOURCE_FILE
+    md.execute_sql(f"UPDATE {md.TABLE_FINAL} SET {SOURCE_COLUMN} = NULL")
+
+    md.process_parquet_files(data_dir=data_dir, strategy=md.REPLACE)
+
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 1_000
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL} WHERE {SOURCE_COLUMN} = '{january.name}'") == 1_000
@@ -0,0 +1,42 @@
+# tests/test_migrate_timestamps.py
+"""Garde de l'ingestion : refus tant que des timestamps gonflés restent dans la table finale."""
+import pytest
+
+import merge_dynamic as md
+from conftest import scalar, write_trips
+from ingestion_ledger import IngestionLedger
+from migrate_timestamps import count_inflated, inflated_columns
+
+
+@pytest.fixture
+def loaded(warehouse, data_dir, tmp_path):
+    write_trips(data_dir, month=1, rows=1_000)
+    ledger = IngestionLedger(tmp_path / "ledger.json")
+    md.process_parquet_files(data_dir=data_dir, ledger=ledger)
+    return ledger
+
+
+def inflate_one_row():
+    # DuckDB ne stocke pas l'an 54 millions : toute date au-delà du seuil (an 5138) suffit
+    md.execute_sql(f"""
+        UPDATE {md.TABLE_FINAL} SET TPEP_DROPOFF_DATETIME = TIMESTAMP '6000-01-01 00:00:00'
+        WHERE {md.FINGERPRINT_COLUMN} = (SELECT MIN({md.FINGERPRINT_COLUMN}) FROM {md.TABLE_FINAL})
+    """)
+
+
+def test_migrated_table_passes(loaded):
+    assert inflated_columns(md.TABLE_FINAL) == []
+    assert count_inflated(md.TABLE_FINAL) == {"TPEP_PICKUP_DATETIME": 0, "TPEP_DROPOFF_DATETIME": 0}
+
+
+def test_ingestion_refuses_inflated_timestamps(loaded, data_dir):
+    inflate_one_row()
+    assert inflated_columns(md.TABLE_FINAL) == ["TPEP_DROPOFF_DATETIME"]
+    assert count_inflated(md.TABLE_FINAL)["TPEP_DROPOFF_DATETIME"] == 1
+
+    write_trips(data_dir, month=2, rows=500, seed=1)
+    with pytest.raises(RuntimeError, match="migrate_timestamps"):
+        md.process_parquet_files(data_dir=data_dir, ledger=loaded)
+
+    # Rien n'est chargé : le refus précède l'upload
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 1_000
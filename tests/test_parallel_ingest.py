@@ -0,0 +1,41 @@
+# tests/test_parallel_ingest.py
+"""Ingestion parallèle : buffers par worker supprimés en fin de run, succès ou échec."""
+import pytest
+
+import merge_dynamic as md
+from conftest import scalar, write_trips
+from ingestion_ledger import FAILED, MERGED, IngestionLedger
+
+
+def worker_buffers() -> int:
+    return scalar(f"""
+        SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_NAME LIKE '{md.TABLE_BUFFER}_W%'
+    """)
+
+
+def test_parallel_ingest_drops_worker_buffers(warehouse, data_dir, tmp_path):
+    files = [write_trips(data_dir, month=month, rows=800, seed=month) for month in (1, 2, 3)]
+    ledger = IngestionLedger(tmp_path / "ledger.json")
+
+    md.process_parquet_files(data_dir=data_dir, ledger=ledger, workers=2, upload_concurrency=2)
+
+    assert {ledger.entries[f.name]["state"] for f in files} == {MERGED}
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 2_400
+    assert worker_buffers() == 0
+
+
+def test_failed_parallel_ingest_drops_worker_buffers(warehouse, data_dir, tmp_path, monkeypatch):
+    source = write_trips(data_dir, rows=800)
+    ledger = IngestionLedger(tmp_path / "ledger.json")
+
+    def failing_merge(*args, **kwargs):
+        raise RuntimeError("MERGE interrompu")
+
+    monkeypatch.setattr(md, "merge_buffer", failing_merge)
+
+    with pytest.raises(RuntimeError, match="1 fichier"):
+        md.process_parquet_files(data_dir=data_dir, ledger=ledger, workers=2, upload_concurrency=2)
+
+    assert ledger.entries[source.name]["state"] == FAILED
+    assert worker_buffers() == 0
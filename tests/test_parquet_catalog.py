@@ -0,0 +1,140 @@
+# tests/test_parquet_catalog.py
+"""Catalogue parquet : réécriture triée, index des row groups, sélection d'une plage, dérive de schéma."""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pytest
+
+import merge_dynamic as md
+from conftest import scalar, write_trips
+from ingestion_ledger import IngestionLedger
+from load_strategy import PickupWindow
+from parquet_catalog import ParquetCatalog, build_catalog
+from type_plan import apply_type_plan
+
+ROW_GROUP_ROWS = 250
+# Du 10 au 12 janvier inclus : quelques row groups au milieu du mois
+WINDOW = PickupWindow(pd.Timestamp("2024-01-10"), pd.Timestamp("2024-01-12 23:59:59"))
+
+
+@pytest.fixture
+def catalogued(data_dir):
+    source = write_trips(data_dir, rows=2_000)
+    catalog = ParquetCatalog(data_dir)
+    entry = catalog.add(source, row_group_rows=ROW_GROUP_ROWS)
+    return catalog, data_dir / entry["path"]
+
+
+def pickups(path) -> pd.Series:
+    return pq.read_table(path, columns=["tpep_pickup_datetime"]).column(0).to_pandas()
+
+
+def rows_in_window(path) -> int:
+    values = pickups(path)
+    return int(((values >= WINDOW.first) & (values <= WINDOW.last)).sum())
+
+
+def test_add_rewrites_sorted_partition_and_indexes_row_groups(catalogued, data_dir):
+    catalog, path = catalogued
+    entry = catalog.entries["yellow_tripdata_2024-01.parquet"]
+
+    assert path == data_dir / "catalog" / "year=2024" / "month=01" / "yellow_tripdata_2024-01.parquet"
+    assert not (data_dir / "yellow_tripdata_2024-01.parquet").exists()
+    assert entry["rows"] == 2_000 and entry["month"] == "2024-01"
+    assert len(entry["row_groups"]) == 2_000 // ROW_GROUP_ROWS
+    assert pickups(path).is_monotonic_increasing
+    # Plages de row groups disjointes et croissantes : élagables
+    ranges = [(pd.Timestamp(g["pickup_min"]), pd.Timestamp(g["pickup_max"])) for g in entry["row_groups"]]
+    assert all(last < next_first for (_, last), (next_first, _) in zip(ranges, ranges[1:]))
+    assert catalog.files() == [path]
+    # Index relu depuis _catalog.json
+    assert ParquetCatalog(data_dir).entries == catalog.entries
+
+
+def test_keep_source_is_not_catalogued_twice(data_dir):
+    write_trips(data_dir, rows=500)
+    build_catalog(data_dir, keep_source=True, row_group_rows=ROW_GROUP_ROWS)
+    catalog = ParquetCatalog(data_dir)
+
+    assert catalog.is_current(data_dir / "yellow_tripdata_2024-01.parquet")
+    assert len(catalog.files()) == 1
+
+
+def test_select_prunes_row_groups_outside_the_window(catalogued):
+    catalog, path = catalogued
+    selection = catalog.select(path, WINDOW)
+
+    assert 0 < len(selection.row_groups) < selection.total_row_groups
+    parquet_file = pq.ParquetFile(path)
+    selected = apply_type_plan(parquet_file.read_row_groups(selection.row_groups))
+    skipped = [i for i in range(parquet_file.num_row_groups) if i not in selection.row_groups]
+    skipped_pickups = parquet_file.read_row_groups(skipped, columns=["tpep_pickup_datetime"]).column(0).to_pandas()
+    # Les row groups écartés n'ont aucune course dans la plage, le filtre garde exactement la plage
+    assert not ((skipped_pickups >= WINDOW.first) & (skipped_pickups <= WINDOW.last)).any()
+    assert selection.filter(selected).num_rows == rows_in_window(path)
+
+
+def test_select_skips_a_file_outside_the_window(catalogued):
+    catalog, path = catalogued
+    february = PickupWindow(pd.Timestamp("2024-02-01"), pd.Timestamp("2024-02-29 23:59:59"))
+    assert catalog.select(path, february) is None
+
+
+def test_reload_pickup_window_loads_only_the_window(warehouse, catalogued, data_dir):
+    _, path = catalogued
+    md.process_parquet_files(data_dir=data_dir, pickup_window=WINDOW)
+
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == rows_in_window(path)
+    assert scalar(f"""
+        SELECT COUNT(*) FROM {md.TABLE_FINAL}
+        WHERE TPEP_PICKUP_DATETIME < '{WINDOW.first}' OR TPEP_PICKUP_DATETIME > '{WINDOW.last}'
+    """) == 0
+
+
+def test_entry_is_refreshed_when_the_file_changes(catalogued):
+    catalog, path = catalogued
+    pq.write_table(pq.read_table(path).slice(0, 100), path)
+
+    entry = catalog.entry(path)
+    assert entry["rows"] == 100
+    assert len(entry["row_groups"]) == 1
+
+
+def test_schema_drift_between_months(data_dir):
+    write_trips(data_dir, month=1, rows=300)
+    february = write_trips(data_dir, month=2, rows=300, seed=1)
+    table = pq.read_table(february)
+    table = table.append_column("cbd_congestion_fee", pa.array([0.75] * table.num_rows))
+    table = table.set_column(table.column_names.index("passenger_count"), "passenger_count",
+                             pc.cast(table.column("passenger_count"), pa.float64()))
+    pq.write_table(table.drop_columns(["Airport_fee"]), february)
+
+    catalog = build_catalog(data_dir)
+
+    [(month, added, removed, retyped)] = catalog.schema_drift()
+    assert month == "2024-02"
+    assert added == ["CBD_CONGESTION_FEE"]
+    assert removed == ["AIRPORT_FEE"]
+    assert len(retyped) == 1 and retyped[0].startswith("PASSENGER_COUNT ")
+
+
+def test_ledger_carries_over_files_ingested_before_cataloguing(warehouse, data_dir, tmp_path, monkeypatch):
+    write_trips(data_dir, rows=1_000)
+    ledger = IngestionLedger(tmp_path / "ledger.json")
+    md.process_parquet_files(data_dir=data_dir, ledger=ledger)
+
+    build_catalog(data_dir, row_group_rows=ROW_GROUP_ROWS)
+    loaded = []
+    monkeypatch.setattr(md, "ingest_file", lambda f, *args, **kwargs: loaded.append(f.name) or True)
+    md.process_parquet_files(data_dir=data_dir, ledger=ledger)
+
+    # Fichier réécrit déjà fusionné : repris sous sa nouvelle identité, pas rechargé
+    assert loaded == []
+    assert ledger.status(ParquetCatalog(data_dir).files()[0]) == (False, "déjà fusionné")
+
+    # Nouveau contenu publié pour le même mois : rechargé
+    write_trips(data_dir, rows=1_200, seed=5)
+    build_catalog(data_dir, row_group_rows=ROW_GROUP_ROWS)
+    md.process_parquet_files(data_dir=data_dir, ledger=ledger)
+    assert loaded == ["yellow_tripdata_2024-01.parquet"]
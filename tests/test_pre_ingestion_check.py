@@ -0,0 +1,56 @@
+# tests/test_pre_ingestion_check.py
+"""Preflight : évaluation des contrôles à partir de lignes Snowflake simulées."""
+from datetime import datetime
+
+from checks import pre_ingestion_check as check
+
+CREATED = datetime(2024, 1, 1)
+
+
+def grant(privilege: str, granted_on: str, name: str) -> tuple:
+    # Colonnes de SHOW GRANTS TO ROLE : created_on, privilege, granted_on, name, granted_to, grantee_name, ...
+    return (CREATED, privilege, granted_on, name, "ROLE", check.SNOWFLAKE_ROLE, "N", "SYSADMIN")
+
+
+def results(grants) -> dict:
+    catalog = [("SCHEMA", schema, None) for schema in check.SCHEMAS]
+    catalog += [("TABLE", check.RAW_SCHEMA, table) for table in check.RAW_TABLES]
+    return {
+        "warehouses": ([(CREATED, check.SNOWFLAKE_WAREHOUSE, "STARTED")], 0.01),
+        "catalog": (catalog, 0.02),
+        "grants": (grants, 0.01),
+    }
+
+
+def grants_check(checks: list) -> check.CheckResult:
+    return next(c for c in checks if c.name.startswith("grants"))
+
+
+def test_all_checks_pass():
+    checks = check.evaluate(results([grant("USAGE", "WAREHOUSE", check.SNOWFLAKE_WAREHOUSE)]))
+    assert all(c.ok for c in checks)
+    assert len(checks) == 3 + len(check.SCHEMAS) + len(check.RAW_TABLES)
+
+
+def test_grants_are_read_from_the_name_column():
+    # Le nom est en colonne 3 ; la colonne 2 contient le type d'objet
+    checks = check.evaluate(results([
+        grant("USAGE", "DATABASE", check.SNOWFLAKE_DATABASE),
+        grant("OWNERSHIP", "TABLE", check.SNOWFLAKE_WAREHOUSE),
+    ]))
+    grants = grants_check(checks)
+    assert not grants.ok and not grants.blocking
+    assert check.SNOWFLAKE_WAREHOUSE in grants.message
+
+
+def test_missing_objects_and_failed_queries_are_reported():
+    rows = results([grant("USAGE", "WAREHOUSE", check.SNOWFLAKE_WAREHOUSE)])
+    rows["catalog"] = ([("SCHEMA", check.RAW_SCHEMA, None)], 0.02)
+    rows["warehouses"] = (RuntimeError("warehouse inaccessible"), 0.01)
+
+    failed = {c.name for c in check.evaluate(rows) if not c.ok}
+
+    assert f"warehouse {check.SNOWFLAKE_WAREHOUSE}" in failed
+    assert f"schema {check.STAGING_SCHEMA}" in failed
+    assert {f"table {check.RAW_SCHEMA}.{t}" for t in check.RAW_TABLES} <= failed
+    assert f"schema {check.RAW_SCHEMA}" not in failed
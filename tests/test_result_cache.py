@@ -0,0 +1,81 @@
+# tests/test_result_cache.py
+"""Cache de résultats : tables sources de la clé, requêtes non cacheables."""
+import pytest
+
+import snowflake_utils
+from result_cache import ResultCache, source_tables
+
+
+@pytest.mark.parametrize("sql, tables", [
+    ("SELECT * FROM RAW.A", ["RAW.A"]),
+    ("SELECT * FROM RAW.A a, RAW.B b WHERE a.id = b.id", ["RAW.A", "RAW.B"]),
+    ("SELECT * FROM RAW.A AS a, RAW.B AS b, RAW.C", ["RAW.A", "RAW.B", "RAW.C"]),
+    ('SELECT * FROM "RAW"."A" a LEFT OUTER JOIN RAW.B b ON a.id = b.id CROSS JOIN RAW.C', ["RAW.A", "RAW.B", "RAW.C"]),
+    ("SELECT * FROM RAW.A JOIN RAW.B USING (id), RAW.C ORDER BY 1", ["RAW.A", "RAW.B", "RAW.C"]),
+    ("SELECT COUNT(*) FROM RAW.A; -- FROM RAW.COMMENT", ["RAW.A"]),
+    ("SELECT 'FROM RAW.LITERAL' AS s FROM RAW.A", ["RAW.A"]),
+    ("SELECT * FROM RAW.A WHERE x IS NOT DISTINCT FROM y", ["RAW.A"]),
+])
+def test_full_from_list(sql, tables):
+    assert source_tables(sql) == tables
+
+
+def test_ctes_are_not_sources():
+    sql = """
+        WITH recent AS (SELECT * FROM RAW.TRIPS WHERE x > 0),
+             zones AS (SELECT * FROM RAW.ZONES)
+        SELECT * FROM recent r, zones z, RAW.VENDORS v
+    """
+    assert source_tables(sql) == ["RAW.TRIPS", "RAW.ZONES", "RAW.VENDORS"]
+
+
+def test_extract_is_not_a_source():
+    sql = """
+        SELECT EXTRACT(YEAR FROM TPEP_PICKUP_DATETIME) AS y, TRIM(BOTH ' ' FROM VENDOR) AS v
+        FROM RAW.TRIPS
+    """
+    assert source_tables(sql) == ["RAW.TRIPS"]
+
+
+def test_subqueries_are_read():
+    sql = """
+        SELECT * FROM (SELECT * FROM RAW.A) s, RAW.B b
+        WHERE b.id IN (SELECT id FROM RAW.C)
+          AND EXISTS (SELECT 1 FROM RAW.D d JOIN RAW.E e ON d.id = e.id)
+          AND b.total > COALESCE((SELECT MAX(total) FROM RAW.F), 0)
+    """
+    assert sorted(source_tables(sql)) == ["RAW.A", "RAW.B", "RAW.C", "RAW.D", "RAW.E", "RAW.F"]
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT 1",
+    "DELETE FROM RAW.A",
+    "SELECT * FROM read_parquet('trips.parquet')",
+    "SELECT * FROM RAW.A, LATERAL FLATTEN(input => a.tags)",
+    "SELECT * FROM TABLE(RESULT_SCAN(LAST_QUERY_ID()))",
+    "SELECT * FROM (RAW.A JOIN RAW.B ON a.id = b.id)",
+    "SELECT * FROM RAW.A PIVOT (SUM(x) FOR y IN (1, 2))",
+    "SELECT * FROM RAW.A SAMPLE (10)",
+    "SELECT * FROM @%BUFFER",
+])
+def test_unsupported_from_is_not_cacheable(sql):
+    assert source_tables(sql) == []
+
+
+def test_cache_key_depends_on_every_comma_joined_table(monkeypatch):
+    versions = {"RAW.A": 1, "RAW.B": 1}
+
+    class Backend:
+        def last_altered(self, execute, tables):
+            return {table: versions.get(table) for table in tables}
+
+    monkeypatch.setattr(snowflake_utils, "get_backend", lambda: Backend())
+    cache = ResultCache()
+    sql = "SELECT * FROM RAW.A a, RAW.B b"
+
+    before = snowflake_utils._cache_key(cache, sql)
+    versions["RAW.B"] = 2
+    assert snowflake_utils._cache_key(cache, sql) != before
+    # Source de version inconnue ou FROM non analysable : pas de mise en cache
+    assert snowflake_utils._cache_key(cache, "SELECT * FROM RAW.A, RAW.UNKNOWN") is None
+    assert snowflake_utils._cache_key(cache, "SELECT * FROM RAW.A, LATERAL FLATTEN(x)") is None
@@ -0,0 +1,60 @@
+# tests/test_resume.py
+"""Reprise après un run interrompu : le buffer partagé est vidé avant tout chargement."""
+import pytest
+
+import merge_dynamic as md
+from conftest import scalar, write_trips
+from ingestion_ledger import FAILED, MERGED, PENDING, IngestionLedger
+
+
+def fail_first_merge(monkeypatch):
+    """Le premier MERGE échoue (buffer déjà chargé), les suivants passent."""
+    real = md.execute_in_transaction
+    calls = []
+
+    def flaky(statements, *args, **kwargs):
+        calls.append(statements)
+        if len(calls) == 1:
+            raise RuntimeError("MERGE interrompu")
+        return real(statements, *args, **kwargs)
+
+    monkeypatch.setattr(md, "execute_in_transaction", flaky)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_rerun_after_failed_merge_does_not_duplicate(warehouse, data_dir, tmp_path, monkeypatch, stream):
+    source = write_trips(data_dir, rows=2_000)
+    ledger = IngestionLedger(tmp_path / "ledger.json")
+    fail_first_merge(monkeypatch)
+
+    with pytest.raises(RuntimeError, match="MERGE interrompu"):
+        md.process_parquet_files(stream=stream, data_dir=data_dir, ledger=ledger)
+    assert ledger.entries[source.name]["state"] == FAILED
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_BUFFER}") == 2_000
+
+    md.process_parquet_files(stream=stream, data_dir=data_dir, ledger=ledger)
+
+    assert ledger.entries[source.name]["state"] == MERGED
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 2_000
+    assert scalar(f"SELECT COUNT(DISTINCT {md.FINGERPRINT_COLUMN}) FROM {md.TABLE_FINAL}") == 2_000
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_BUFFER}") == 0
+
+
+def test_rerun_after_crash_discards_stale_buffer(warehouse, data_dir, tmp_path):
+    january = write_trips(data_dir, month=1, rows=1_000)
+    ledger = IngestionLedger(tmp_path / "ledger.json")
+    md.process_parquet_files(data_dir=data_dir, ledger=ledger)
+
+    # Run tué entre l'upload et le MERGE de février : buffer rempli, fichier resté pending
+    february = write_trips(data_dir, month=2, rows=1_500, seed=1)
+    md.execute_sql(f"INSERT INTO {md.TABLE_BUFFER} SELECT * FROM {md.TABLE_FINAL}")
+    md.execute_sql(f"UPDATE {md.TABLE_BUFFER} SET TRIP_DISTANCE = -1")
+    ledger.mark(february, PENDING)
+
+    md.process_parquet_files(data_dir=data_dir, ledger=ledger)
+
+    assert ledger.entries[january.name]["state"] == MERGED
+    assert ledger.entries[february.name]["state"] == MERGED
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 2_500
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL} WHERE TRIP_DISTANCE = -1") == 0
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_BUFFER}") == 0
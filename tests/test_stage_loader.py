@@ -0,0 +1,75 @@
+# tests/test_stage_loader.py
+"""Chargement par stage : COPY forcé, et lot en échec si un chunk n'est pas chargé en entier."""
+import pyarrow.parquet as pq
+import pytest
+
+import merge_dynamic as md
+from conftest import scalar, write_trips
+from ingestion_ledger import FAILED, MERGED, IngestionLedger
+from stage_loader import (
+    DuckDBStageEngine, FileLoadResult, SnowflakeStageEngine, checked_results, write_stage_chunks,
+)
+
+
+@pytest.fixture
+def chunks(data_dir, tmp_path):
+    source = write_trips(data_dir, rows=3_000)
+    # Petite taille cible : plusieurs chunks
+    return write_stage_chunks(source, tmp_path / "chunks", target_chunk_mb=0.02, fingerprint_keys=md.DEDUP_KEYS)
+
+
+def test_snowflake_copy_forces_reload_of_known_files(chunks):
+    statements = []
+    engine = SnowflakeStageEngine(lambda sql: statements.append(sql) or [])
+    engine.copy_into("BUFFER", chunks)
+    assert "FORCE = TRUE" in statements[0]
+
+
+def test_chunks_skipped_by_copy_fail_the_batch(chunks):
+    assert len(chunks) > 1
+    # Réponse de Snowflake quand les métadonnées de chargement écartent tous les fichiers
+    engine = SnowflakeStageEngine(lambda sql: [("Copy executed with 0 files processed.",)])
+    results = checked_results(chunks, engine.copy_into("BUFFER", chunks))
+    assert [r.chunk for r in results] == [c.name for c in chunks]
+    assert {r.status for r in results} == {"NOT_LOADED"}
+
+
+def test_partial_load_fails_the_batch(chunks):
+    results = []
+    for chunk in chunks:
+        rows = pq.ParquetFile(chunk).metadata.num_rows
+        results.append(FileLoadResult("src.parquet", chunk.name, "LOADED", rows, rows))
+    results[0].rows_loaded -= 1
+    checked = checked_results(chunks, results)
+    assert checked[0].status == "PARTIALLY_LOADED"
+    assert {r.status for r in checked[1:]} == {"LOADED"}
+
+
+class SkippingEngine(DuckDBStageEngine):
+    """COPY qui ne charge rien et ne renvoie aucune ligne de résultat (fichiers déjà connus)."""
+
+    def copy_into(self, table: str, chunks: list) -> list:
+        return []
+
+
+def test_staged_ingest_marks_skipped_batch_failed(warehouse, data_dir, tmp_path, monkeypatch):
+    source = write_trips(data_dir, rows=2_000)
+    monkeypatch.setattr(warehouse, "stage_engine", lambda execute: SkippingEngine(None, tmp_path / "stage"))
+    ledger = IngestionLedger(tmp_path / "ledger.json")
+
+    with pytest.raises(RuntimeError, match="1 fichier"):
+        md.process_parquet_files(backend="stage", data_dir=data_dir, ledger=ledger)
+
+    assert ledger.entries[source.name]["state"] == FAILED
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 0
+
+
+def test_staged_ingest_loads_every_row(warehouse, data_dir, tmp_path):
+    source = write_trips(data_dir, rows=2_000)
+    ledger = IngestionLedger(tmp_path / "ledger.json")
+
+    md.process_parquet_files(backend="stage", data_dir=data_dir, ledger=ledger)
+
+    assert ledger.entries[source.name]["state"] == MERGED
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_FINAL}") == 2_000
+    assert scalar(f"SELECT COUNT(*) FROM {md.TABLE_BUFFER}") == 0